@@ -8,6 +8,7 @@ createApp({
             error: null,
             selectedDate: this.getTodayString(),
             availableDates: [],
+            manifestEntries: {},
             currentDate: new Date().toLocaleDateString('es-ES', {
                 weekday: 'long',
                 year: 'numeric',
@@ -20,20 +21,26 @@ createApp({
             chart: null,
             lastUpdate: null,
             updateStatus: null,
-            isUpdating: false
+            isUpdating: false,
+            liveStream: null,
+            liveConnected: false,
+            liveState: null,
+            reloadingForDeltas: false
         }
     },
 
     mounted() {
         this.initializeDarkMode();
-        this.loadAvailableDates();
         this.loadAnalysis();
         this.loadLastUpdate();
         this.setupTimeframeButtons();
+        this.connectLiveStream();
         
-        // Actualizar el timestamp cada minuto
+        // Actualizar el timestamp cada minuto (solo si no hay stream en vivo)
         setInterval(() => {
-            this.loadLastUpdate();
+            if (!this.liveConnected) {
+                this.loadLastUpdate();
+            }
         }, 60000);
     },
 
@@ -45,20 +52,20 @@ createApp({
 
         async loadAvailableDates() {
             try {
-                // Simular carga de fechas disponibles
-                // En producción, esto vendría de un endpoint que liste los archivos JSON
-                const dates = [];
-                const today = new Date();
-
-                // Generar fechas de los últimos 30 días como ejemplo
-                for (let i = 0; i < 30; i++) {
-                    const date = new Date(today);
-                    date.setDate(date.getDate() - i);
-                    const dateString = date.toISOString().split('T')[0].replace(/-/g, '');
-                    dates.push(dateString);
+                // El manifiesto lo genera el analizador en cada guardado
+                const response = await fetch('./data/manifest.json', { cache: 'no-cache' });
+                if (!response.ok) {
+                    throw new Error(`Error ${response.status}: ${response.statusText}`);
                 }
 
-                this.availableDates = dates;
+                const manifest = await response.json();
+                this.manifestEntries = {};
+                manifest.days.forEach(entry => {
+                    this.manifestEntries[entry.date.replace(/-/g, '')] = entry;
+                });
+
+                // Fechas ordenadas de más reciente a más antigua
+                this.availableDates = manifest.days.map(entry => entry.date.replace(/-/g, ''));
             } catch (error) {
                 console.error('Error cargando fechas disponibles:', error);
             }
@@ -69,8 +76,14 @@ createApp({
             this.error = null;
 
             try {
+                // Refrescar el manifiesto para disponer de los hashes vigentes
+                await this.loadAvailableDates();
+
                 const dateString = this.selectedDate.replace(/-/g, '');
-                const response = await fetch(`./data/${dateString}.json`);
+                // Con el hash del manifiesto la URL cambia solo cuando cambia el contenido
+                const entry = this.manifestEntries[dateString];
+                const url = entry ? `./data/${dateString}.json?v=${entry.sha256.slice(0, 12)}` : `./data/${dateString}.json`;
+                const response = await fetch(url);
 
                 if (!response.ok) {
                     if (response.status === 404) {
@@ -80,6 +93,7 @@ createApp({
                 }
 
                 this.analysis = await response.json();
+                this.overlayLiveState();
 
                 // Initialize chart with 1m timeframe after loading
                 this.$nextTick(() => {
@@ -103,11 +117,9 @@ createApp({
 
         async loadLastUpdate() {
             try {
-                const response = await fetch('./data/last_update.json');
+                const response = await fetch('./data/last_update.json', { cache: 'no-cache' });
                 if (response.ok) {
-                    const data = await response.json();
-                    this.lastUpdate = new Date(data.last_update);
-                    this.updateStatus = data.status;
+                    await this.handleLastUpdate(await response.json());
                 } else {
                     this.lastUpdate = null;
                     this.updateStatus = null;
@@ -119,6 +131,180 @@ createApp({
             }
         },
 
+        async handleLastUpdate(data) {
+            this.lastUpdate = new Date(data.last_update);
+            this.updateStatus = data.status;
+
+            // Si hay snapshots nuevos del día mostrado, pedir solo los deltas que faltan
+            const dateString = this.selectedDate.replace(/-/g, '');
+            if (!this.analysis || !this.analysis.snapshot_version || data.day !== dateString) return;
+
+            // Registro reiniciado (p. ej. caché perdida): la numeración de la copia local no vale
+            if (data.snapshot_epoch && data.snapshot_epoch !== this.analysis.snapshot_epoch) {
+                if (!this.reloadingForDeltas) {
+                    this.reloadingForDeltas = true;
+                    try {
+                        await this.loadAnalysis();
+                    } finally {
+                        this.reloadingForDeltas = false;
+                    }
+                }
+                return;
+            }
+            if (data.snapshot_version > this.analysis.snapshot_version) {
+                await this.applyPendingDeltas(dateString, data.snapshot_epoch, data.snapshot_version);
+            }
+        },
+
+        connectLiveStream() {
+            // /events solo existe con src/analysis_server.py; en hosting estático se sigue con el polling
+            if (!window.EventSource) return;
+
+            const source = new EventSource('./events');
+            source.onopen = () => {
+                this.liveConnected = true;
+            };
+            source.onerror = () => {
+                // EventSource reintenta solo; si la conexión queda cerrada se vuelve al polling
+                this.liveConnected = false;
+                if (source.readyState === EventSource.CLOSED) {
+                    this.liveStream = null;
+                }
+            };
+            source.addEventListener('live_state', event => this.applyLiveState(JSON.parse(event.data)));
+            source.addEventListener('delta', event => this.applyLiveDelta(JSON.parse(event.data)));
+            source.addEventListener('snapshot', event => this.handleLastUpdate(JSON.parse(event.data)));
+            source.addEventListener('resync', () => this.resyncLiveStream());
+            this.liveStream = source;
+        },
+
+        resyncLiveStream() {
+            // Una conexión nueva (sin Last-Event-ID) recibe primero el estado completo vigente
+            this.liveState = null;
+            if (this.liveStream) {
+                this.liveStream.close();
+                this.liveStream = null;
+            }
+            this.connectLiveStream();
+            this.loadAnalysis();
+        },
+
+        applyLiveState(payload) {
+            // Estado del stream independiente del archivo diario: los deltas en vivo se calculan sobre él
+            this.liveState = payload;
+            this.overlayLiveState();
+            this.$nextTick(() => {
+                this.updateChart();
+            });
+        },
+
+        applyLiveDelta(payload) {
+            if (!this.liveState || payload.day !== this.liveState.day) {
+                this.resyncLiveStream();
+                return;
+            }
+            // Ya incluido en el estado recibido al conectar
+            if (payload.seq <= this.liveState.seq) return;
+            // Delta calculado sobre otra versión del estado: aplicarlo corrompería las barras
+            if (payload.base !== this.liveState.seq) {
+                this.resyncLiveStream();
+                return;
+            }
+
+            this.applyDelta(this.liveState.state, payload.delta);
+            this.liveState.seq = payload.seq;
+            this.overlayLiveState();
+            this.$nextTick(() => {
+                this.updateChart();
+            });
+        },
+
+        overlayLiveState() {
+            // Las barras y los indicadores en vivo sustituyen a los del archivo o los snapshots del mismo día
+            const dateString = this.selectedDate.replace(/-/g, '');
+            if (!this.analysis || !this.liveState || this.liveState.day !== dateString) return;
+
+            Object.entries(this.liveState.state).forEach(([section, timeframes]) => {
+                this.analysis[section] = this.analysis[section] || {};
+                Object.entries(timeframes).forEach(([timeframe, value]) => {
+                    this.analysis[section][timeframe] = JSON.parse(JSON.stringify(value));
+                });
+            });
+        },
+
+        async applyPendingDeltas(dateString, epoch, targetVersion) {
+            // Demasiados deltas pendientes: resulta más barato recargar el archivo completo
+            if (targetVersion - this.analysis.snapshot_version > 20) {
+                await this.loadAnalysis();
+                return;
+            }
+
+            try {
+                const state = JSON.parse(JSON.stringify(this.analysis));
+                for (let version = state.snapshot_version + 1; version <= targetVersion; version++) {
+                    const response = await fetch(`./data/deltas/${dateString}/${epoch}/v${version}.json`);
+                    if (!response.ok) {
+                        throw new Error(`Delta v${version} no disponible`);
+                    }
+                    const payload = await response.json();
+                    this.applyDelta(state, payload.delta);
+                    state.snapshot_version = payload.to_version;
+                }
+
+                this.analysis = state;
+                this.overlayLiveState();
+                this.$nextTick(() => {
+                    this.updateChart();
+                });
+            } catch (error) {
+                // El archivo diario es un punto de control: si tras recargarlo sigue faltando un delta,
+                // quedarse en esa versión hasta el próximo sondeo en lugar de recargar en bucle
+                if (this.reloadingForDeltas) {
+                    console.warn('Delta no disponible tras recargar; se mantiene el punto de control:', error);
+                    return;
+                }
+                console.warn('Error aplicando deltas, recargando análisis completo:', error);
+                this.reloadingForDeltas = true;
+                try {
+                    await this.loadAnalysis();
+                } finally {
+                    this.reloadingForDeltas = false;
+                }
+            }
+        },
+
+        applyDelta(state, delta) {
+            // Mismo formato que snapshot_log.apply_delta en el lado Python
+            (delta.set || []).forEach(([path, value]) => {
+                let target = state;
+                path.slice(0, -1).forEach(key => {
+                    if (typeof target[key] !== 'object' || target[key] === null) {
+                        target[key] = {};
+                    }
+                    target = target[key];
+                });
+                target[path[path.length - 1]] = value;
+            });
+
+            (delta.unset || []).forEach(path => {
+                let target = state;
+                path.slice(0, -1).forEach(key => {
+                    target = (target && target[key]) || {};
+                });
+                delete target[path[path.length - 1]];
+            });
+
+            Object.entries(delta.bars || {}).forEach(([section, timeframes]) => {
+                state[section] = state[section] || {};
+                Object.entries(timeframes).forEach(([timeframe, barDelta]) => {
+                    const rows = state[section][timeframe] || [];
+                    state[section][timeframe] = rows.slice(0, barDelta.from).concat(barDelta.rows);
+                });
+            });
+
+            return state;
+        },
+
         async manualUpdate() {
             if (this.isUpdating) return;
             
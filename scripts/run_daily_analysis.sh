@@ -50,14 +50,13 @@ if [ $PYTHON_EXIT_CODE -eq 0 ]; then
         FILE_SIZE=$(ls -lh "$TODAY_FILE" | awk '{print $5}')
         echo "📊 Tamaño del archivo: $FILE_SIZE"
         
-        # Crear archivo de timestamp para el frontend
-        TIMESTAMP_FILE="data/last_update.json"
-        echo "{\"last_update\": \"$(date -u +%Y-%m-%dT%H:%M:%S.000Z)\", \"status\": \"success\"}" > "$TIMESTAMP_FILE"
-        echo "📅 Timestamp actualizado: $TIMESTAMP_FILE"
+        # El analizador actualiza data/last_update.json y data/manifest.json al guardar
         
         # Copiar archivos al directorio public/data para despliegue
         mkdir -p public/data
         cp data/*.json public/data/ 2>/dev/null || true
+        rm -rf public/data/deltas
+        cp -r data/deltas public/data/ 2>/dev/null || true
         echo "📁 Archivos copiados a public/data para despliegue"
     else
         echo "⚠️  ADVERTENCIA: No se encontró el archivo de datos del día"
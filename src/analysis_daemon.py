@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modo daemon del análisis NASDAQ 100
+Mantiene el proceso residente con cachés de barras, modelos y sesiones HTTP calientes
+y ejecuta el análisis con una planificación consciente del horario de mercado
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import signal
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+import schedule
+
+from nasdaq_analyzer import NasdaqAnalyzer
+from market_calendar import MARKET_TZ, nyse_session
+
+logger = logging.getLogger(__name__)
+
+
+def market_phase(now: Optional[datetime] = None) -> str:
+    """Fase del mercado estadounidense: 'regular', 'extended' o 'closed' (festivos de NYSE incluidos)"""
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    session = nyse_session(now.date())
+    if session is None:
+        return 'closed'
+    if session[0] <= now < session[1]:
+        return 'regular'
+    minutes = now.hour * 60 + now.minute
+    if 4 * 60 <= minutes < 20 * 60:
+        return 'extended'
+    return 'closed'
+
+
+class AnalysisDaemon:
+    """Proceso residente que reutiliza un único NasdaqAnalyzer entre ejecuciones"""
+
+    def __init__(self, analyzer: Optional[NasdaqAnalyzer] = None, interval_minutes: int = 30,
+                 offhours_interval_minutes: int = 120, publish_dir: Optional[str] = None):
+        self.analyzer = analyzer or NasdaqAnalyzer()
+        self.interval = timedelta(minutes=interval_minutes)
+        self.offhours_interval = timedelta(minutes=offhours_interval_minutes)
+        self.publish_dir = publish_dir
+        self.last_run = None
+        self.running = False
+
+        # Las barras siguen vigentes casi todo el intervalo; así los reintentos no vuelven a descargar
+        self.analyzer.bar_cache_ttl = max(60, interval_minutes * 60 - 60)
+
+    def is_due(self, now: Optional[datetime] = None) -> bool:
+        """Decidir si toca ejecutar según la fase del mercado y la última ejecución"""
+        now = now or datetime.now(MARKET_TZ)
+        phase = market_phase(now)
+        if phase == 'closed':
+            return False
+        if self.last_run is None:
+            return True
+        interval = self.interval if phase == 'regular' else self.offhours_interval
+        return now - self.last_run >= interval
+
+    def publish(self):
+        """Copiar los artefactos a la carpeta pública igual que run_daily_analysis.sh"""
+        if not self.publish_dir:
+            return
+        os.makedirs(self.publish_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(self.analyzer.data_dir, '*.json')):
+            shutil.copy2(path, self.publish_dir)
+        public_deltas = os.path.join(self.publish_dir, 'deltas')
+        if os.path.isdir(public_deltas):
+            shutil.rmtree(public_deltas)
+        if os.path.isdir(self.analyzer.delta_dir):
+            shutil.copytree(self.analyzer.delta_dir, public_deltas)
+
+    def run_once(self) -> bool:
+        """Ejecutar un análisis completo con el estado caliente del proceso"""
+        started = time.perf_counter()
+        self.last_run = datetime.now(MARKET_TZ)
+        success = self.analyzer.run_daily_analysis()
+        if success and self.analyzer.last_save_changed:
+            self.publish()
+        logger.info(f"Ejecución del daemon ({market_phase(self.last_run)}) en {time.perf_counter() - started:.1f}s")
+        return success
+
+    def tick(self):
+        """Comprobación periódica invocada por el planificador"""
+        if self.is_due():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Error en la ejecución del daemon: {e}")
+
+    def stop(self, *args):
+        """Detener el bucle principal al terminar la ejecución en curso"""
+        logger.info("Deteniendo daemon de análisis...")
+        self.running = False
+
+    def run_forever(self, run_now: bool = True):
+        """Bucle principal: comprobar cada minuto si toca ejecutar"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        schedule.every(1).minutes.at(":00").do(self.tick)
+        self.running = True
+        logger.info(f"Daemon iniciado: cada {self.interval} en horario regular, "
+                    f"cada {self.offhours_interval} en pre/post-mercado")
+
+        if run_now:
+            self.tick()
+
+        while self.running:
+            schedule.run_pending()
+            time.sleep(1)
+        schedule.clear()
+
+
+def main():
+    """Función principal del daemon"""
+    parser = argparse.ArgumentParser(description='Daemon residente del análisis NASDAQ 100')
+    parser.add_argument('--interval', type=int, default=30,
+                        help='Minutos entre ejecuciones en horario regular (por defecto 30)')
+    parser.add_argument('--offhours-interval', type=int, default=120,
+                        help='Minutos entre ejecuciones en pre/post-mercado (por defecto 120)')
+    parser.add_argument('--publish-dir', default=None,
+                        help='Carpeta a la que copiar los artefactos tras cada ejecución (p. ej. public/data)')
+    parser.add_argument('--no-run-now', action='store_true',
+                        help='No ejecutar inmediatamente al arrancar')
+    args = parser.parse_args()
+
+    daemon = AnalysisDaemon(interval_minutes=args.interval,
+                            offhours_interval_minutes=args.offhours_interval,
+                            publish_dir=args.publish_dir)
+    daemon.run_forever(run_now=not args.no_run_now)
+
+
+if __name__ == "__main__":
+    main()
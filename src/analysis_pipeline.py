@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline unificado de análisis
+Una sola pasada de descarga y cálculo produce el informe estándar (YYYYMMDD.json) y el
+mejorado (YYYYMMDD_enhanced.json): las barras se descargan una vez en la caché del analizador
+estándar y cada etapa calcula las secciones de ambos informes
+"""
+
+import argparse
+import os
+import sys
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterable
+
+from lazy_imports import lazy_import
+yf = lazy_import('yfinance')
+
+from nasdaq_analyzer import NasdaqAnalyzer, INTRADAY_TIMEFRAMES
+from enhanced_analyzer import EnhancedNasdaqAnalyzer
+from run_metrics import RunMetrics, measure, append_metrics_log
+from storage import write_last_update
+from stage_cache import stage_cache_dir
+
+logger = logging.getLogger(__name__)
+
+REPORTS = ('standard', 'enhanced')
+
+# Ventanas diarias por defecto de get_market_data en cada analizador; la mayor se descarga
+# una sola vez y la menor se recorta de ella
+STANDARD_DAYS = 45
+ENHANCED_DAYS = 60
+
+# Sufijo del informe mejorado para que no sobrescriba el estándar del mismo día
+ENHANCED_SUFFIX = '_enhanced'
+
+# Durante una ejecución del pipeline las barras descargadas en 'fetch' deben seguir vigentes
+# hasta 'serialize', aunque el cálculo tarde más que el TTL normal de la caché
+PIPELINE_BAR_TTL = 300
+
+
+class AnalysisPipeline:
+    """Ejecuta las etapas comunes una vez y compone los informes pedidos"""
+
+    def __init__(self, reports: Iterable[str] = REPORTS, data_dir: str = "data"):
+        self.reports = [report for report in REPORTS if report in set(reports)]
+        self.standard = NasdaqAnalyzer()
+        self.enhanced = EnhancedNasdaqAnalyzer()
+        self.use_data_dir(data_dir)
+        self.standard.bar_cache_ttl = max(self.standard.bar_cache_ttl, PIPELINE_BAR_TTL)
+        # El analizador mejorado pide sus barras a la caché del estándar
+        self.enhanced.bar_source = self.standard.get_cached_history
+        self.enhanced.report_suffix = ENHANCED_SUFFIX
+        self.freshness_gate = True
+        self.metrics = None
+        self.metrics_listeners = []
+        self.last_save_changed = True
+        self.saved = {}
+
+    def use_data_dir(self, data_dir: str):
+        """Dirigir las escrituras de ambos analizadores a ``data_dir``"""
+        self.data_dir = data_dir
+        for analyzer in (self.standard, self.enhanced):
+            analyzer.data_dir = data_dir
+            analyzer.metrics_dir = os.path.join(data_dir, "metrics")
+            analyzer.ensure_data_directory()
+        self.standard.snapshot_dir = os.path.join(data_dir, "snapshots")
+        self.standard.delta_dir = os.path.join(data_dir, "deltas")
+        if self.standard.stage_cache is not None:
+            self.standard.stage_cache.cache_dir = stage_cache_dir(data_dir)
+
+    def fetch(self) -> Dict[str, Any]:
+        """Etapa 'fetch': todas las descargas de barras de la ejecución
+
+        Las diarias de la ventana mayor sirven a ambos informes; la ventana del informe estándar
+        se recorta de ellas y se deja en la caché con su propia clave.
+        """
+        daily = self.enhanced.get_market_data(ENHANCED_DAYS)
+        if daily.empty:
+            return {'daily': daily, 'market': daily}
+
+        # ticker.history(start=...) excluye la barra del primer día si start cae a mitad de día
+        start_date = (datetime.now() - timedelta(days=STANDARD_DAYS)).date()
+        market = daily[daily.index.date > start_date]
+        self.standard.prime_history((self.standard.symbol, 'market', STANDARD_DAYS), market)
+
+        # VIX de 5 días: lo usan el sentimiento del informe mejorado y las noticias del estándar
+        self.standard.get_cached_history(("^VIX", "1d", "5d"), lambda: yf.Ticker("^VIX").history(period="5d"))
+        if 'standard' in self.reports:
+            for timeframe in INTRADAY_TIMEFRAMES:
+                self.standard.get_intraday_data(timeframe)
+        return {'daily': daily, 'market': self.standard.get_market_data(STANDARD_DAYS)}
+
+    def run(self) -> bool:
+        """Ejecutar el pipeline completo y guardar los informes pedidos"""
+        standard, enhanced = self.standard, self.enhanced
+        if self.freshness_gate and 'standard' in self.reports and standard.stored_analysis_is_current():
+            self.last_save_changed = False
+            logger.info("Mercados cerrados desde la última barra guardada; se reutilizan los informes existentes")
+            return True
+
+        logger.info(f"Iniciando pipeline unificado: {', '.join(self.reports)}")
+        self.metrics = RunMetrics('pipeline', self.metrics_listeners)
+        standard.metrics = enhanced.metrics = self.metrics
+        if standard.stage_cache is not None:
+            standard.stage_cache.reset_stats()
+        std, enh = {}, {}
+
+        with measure(self.metrics, 'fetch'):
+            frames = self.fetch()
+        daily, market = frames['daily'], frames['market']
+        if daily.empty or market.empty:
+            logger.error("No se pudieron obtener datos de mercado")
+            write_last_update(self.data_dir, 'error', 'Falló la descarga del pipeline unificado')
+            return False
+
+        with measure(self.metrics, 'indicators'):
+            if 'standard' in self.reports:
+                std['technical_indicators'] = standard.with_percentile_ranks(standard.memoized(
+                    'indicators', standard.calculate_technical_indicators, market), market)
+                std['yesterday_data'] = standard.summarize_yesterday(market)
+                std['probabilistic_analysis'] = standard.memoized(
+                    'probabilistic', standard.calculate_probabilistic_analysis, market, std['technical_indicators'])
+                std['similar_days'] = standard.find_similar_days(std['technical_indicators'])
+                std['vix_detailed_analysis'] = standard.get_vix_detailed_analysis()
+                std['tick_index_analysis'] = standard.get_tick_index_approximation()
+                std['tape_trading_metrics'] = standard.calculate_tape_trading_metrics()
+                std['vwap_multi_timeframe'] = standard.calculate_vwap_multi_timeframe()
+                std['intraday_analysis'], std['chart_data'] = standard.calculate_intraday_timeframes()
+                std['volume_profile'] = standard.calculate_volume_profiles()
+            if 'enhanced' in self.reports:
+                # Los indicadores de ventana fija del informe estándar (calculados sobre la cola de
+                # las mismas barras) no se recalculan; solo los que dependen de toda la serie
+                enh['technical_indicators'] = enhanced.calculate_advanced_indicators(
+                    daily, std.get('technical_indicators'))
+                enh['yesterday_data'] = enhanced.summarize_yesterday(daily, enh['technical_indicators'])
+                enh['market_sentiment'] = enhanced.get_market_sentiment()
+                enh['economic_events'] = enhanced.get_economic_calendar()
+
+        with measure(self.metrics, 'levels'):
+            if 'standard' in self.reports:
+                std['daily_levels'] = standard.memoized(
+                    'levels', standard.predict_daily_levels, market, std['technical_indicators'],
+                    std['volume_profile'])
+            if 'enhanced' in self.reports:
+                enh['daily_levels'] = enhanced.predict_daily_levels_advanced(daily, enh['technical_indicators'])
+
+        with measure(self.metrics, 'trend'):
+            if 'standard' in self.reports:
+                std['trend_analysis'] = standard.memoized('trend', standard.analyze_trend, std['technical_indicators'])
+            if 'enhanced' in self.reports:
+                enh['trend_analysis'] = enhanced.analyze_trend_advanced(
+                    enh['technical_indicators'], enh['market_sentiment'])
+
+        if 'enhanced' in self.reports:
+            with measure(self.metrics, 'signals'):
+                enh['trading_signals'] = enhanced.generate_trading_signals(
+                    enh['technical_indicators'], enh['trend_analysis'])
+            with measure(self.metrics, 'risk'):
+                enh['risk_assessment'] = enhanced.assess_risk(
+                    enh['technical_indicators'], enh['market_sentiment'], enh['trend_analysis'])
+
+        # Las noticias reales solo las obtiene el analizador estándar; el informe mejorado
+        # las reutiliza y conserva sus entradas fijas si no hay ninguna
+        with measure(self.metrics, 'news'):
+            news = standard.get_market_news() if 'standard' in self.reports else []
+            std['news'] = news
+            enh['news'] = news or enhanced.get_market_news()
+
+        # save_analysis mide sus propias etapas de serialización y escritura
+        changed = []
+        if 'enhanced' in self.reports:
+            self.saved['enhanced'] = enhanced.save_analysis(enhanced.build_analysis(enh), record_metrics=False)
+            changed.append(enhanced.last_save_changed)
+        if 'standard' in self.reports:
+            with measure(self.metrics, 'summary'):
+                analysis = standard.build_analysis(std)
+            self.saved['standard'] = standard.save_analysis(analysis, record_metrics=False)
+            changed.append(standard.last_save_changed)
+        self.last_save_changed = any(changed)
+        self.record_run_metrics()
+
+        if not all(self.saved.get(report) for report in self.reports):
+            logger.error("No se pudieron guardar todos los informes del pipeline")
+            write_last_update(self.data_dir, 'error', 'Falló el guardado del pipeline unificado')
+            return False
+        return True
+
+    def record_run_metrics(self):
+        """Una sola entrada en el histórico de métricas para toda la ejecución"""
+        try:
+            entry = self.metrics.as_dict()
+            entry['changed'] = self.last_save_changed
+            entry['reports'] = self.reports
+            if self.standard.stage_cache is not None:
+                entry['stage_cache'] = self.standard.stage_cache.stats()
+            append_metrics_log(self.standard.metrics_dir, entry)
+            total = entry['total']
+            logger.info(f"Pipeline medido: {total['wall_ms'] / 1000:.1f}s, CPU {total['cpu_ms'] / 1000:.1f}s, "
+                        f"{total['bytes_fetched'] / 1024:.0f} KB descargados, pico {total['peak_rss_mb']} MB")
+        except Exception as e:
+            logger.warning(f"No se pudieron registrar las métricas del pipeline: {e}")
+
+
+def parse_reports(value: str) -> list:
+    """Lista de informes separados por comas"""
+    reports = [report.strip() for report in value.split(',') if report.strip()]
+    unknown = set(reports) - set(REPORTS)
+    if unknown or not reports:
+        raise argparse.ArgumentTypeError(f"Informes válidos: {', '.join(REPORTS)}")
+    return reports
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description='Informes estándar y mejorado del NASDAQ 100 en una sola pasada')
+    parser.add_argument('--reports', type=parse_reports, default=list(REPORTS),
+                        help='Informes a generar, separados por comas (por defecto standard,enhanced)')
+    parser.add_argument('--data-dir', default='data', help='Directorio de salida')
+    parser.add_argument('--force', action='store_true',
+                        help='Ejecutar aunque los mercados sigan cerrados desde el último análisis')
+    args = parser.parse_args()
+
+    pipeline = AnalysisPipeline(args.reports, args.data_dir)
+    pipeline.freshness_gate = not args.force
+    if not pipeline.run():
+        print("❌ Error en el pipeline unificado")
+        sys.exit(1)
+
+    for report, filepath in pipeline.saved.items():
+        print(f"📄 {report}: {filepath}")
+    if pipeline.last_save_changed:
+        print("✅ Pipeline unificado completado")
+    else:
+        print("✅ Pipeline unificado completado (sin cambios de mercado, no se reescribe)")
+
+
+if __name__ == "__main__":
+    main()
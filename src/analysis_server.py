@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servidor HTTP local del análisis NASDAQ 100
+Sirve el dashboard y los archivos diarios y ejecuta los análisis en un worker en segundo plano,
+agrupando las peticiones concurrentes de actualización en un único trabajo en curso.
+También expone ``/events``, un stream SSE con las barras de 1m y los indicadores intradía en vivo
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from typing import Dict, Any, Optional, Tuple
+
+from live_stream import Broadcaster, LiveBarPoller, KEEPALIVE_FRAME
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_TYPES = ('standard', 'enhanced')
+
+
+class AnalysisJobManager:
+    """Ejecuta análisis en un único worker y evita estampidas de peticiones
+
+    - Si ya hay un trabajo del mismo tipo en curso, las peticiones nuevas esperan ese mismo trabajo.
+    - Si el último resultado tiene menos de ``cache_seconds``, se devuelve sin recalcular.
+    """
+
+    def __init__(self, cache_seconds: int = 300):
+        self.cache_seconds = cache_seconds
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analysis')
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._results = {}
+        self._analyzers = {}
+        self.listeners = []
+
+    def get_analyzer(self, analysis_type: str):
+        """Instancia residente de cada analizador (se crea en el worker la primera vez)"""
+        if analysis_type not in self._analyzers:
+            if analysis_type == 'enhanced':
+                from enhanced_analyzer import EnhancedNasdaqAnalyzer
+                self._analyzers[analysis_type] = EnhancedNasdaqAnalyzer()
+            else:
+                from nasdaq_analyzer import NasdaqAnalyzer
+                self._analyzers[analysis_type] = NasdaqAnalyzer()
+        return self._analyzers[analysis_type]
+
+    def _run_job(self, analysis_type: str) -> Dict[str, Any]:
+        started = time.time()
+        analyzer = self.get_analyzer(analysis_type)
+        if analysis_type == 'enhanced':
+            success = analyzer.run_enhanced_analysis()
+        else:
+            success = analyzer.run_daily_analysis()
+        result = {
+            'type': analysis_type,
+            'success': bool(success),
+            'changed': bool(success and getattr(analyzer, 'last_save_changed', True)),
+            'finished_at': datetime.now().isoformat(),
+            'duration_seconds': round(time.time() - started, 2)
+        }
+        for listener in list(self.listeners):
+            try:
+                listener(analysis_type, result)
+            except Exception as e:
+                logger.warning(f"Error notificando fin de análisis: {e}")
+        return result
+
+    def _on_done(self, analysis_type: str, future):
+        with self._lock:
+            self._inflight.pop(analysis_type, None)
+            # Solo se reutilizan los análisis que terminaron bien: un fallo se reintenta en la siguiente petición
+            if future.exception() is None and future.result().get('success'):
+                self._results[analysis_type] = (time.time(), future.result())
+
+    def submit(self, analysis_type: str) -> Tuple[Any, str]:
+        """Obtener un resultado reciente o el trabajo (nuevo o ya en curso) que lo producirá
+
+        Devuelve (resultado o future, modo) con modo 'cached', 'coalesced' o 'started'.
+        """
+        with self._lock:
+            cached = self._results.get(analysis_type)
+            if cached and time.time() - cached[0] < self.cache_seconds:
+                return cached[1], 'cached'
+
+            future = self._inflight.get(analysis_type)
+            if future is not None:
+                return future, 'coalesced'
+
+            future = self._executor.submit(self._run_job, analysis_type)
+            self._inflight[analysis_type] = future
+        # Fuera del lock: si el trabajo ya terminó, el callback se ejecuta aquí mismo y toma el lock
+        future.add_done_callback(lambda f: self._on_done(analysis_type, f))
+        return future, 'started'
+
+    def status(self) -> Dict[str, Any]:
+        """Estado de los trabajos para diagnóstico"""
+        with self._lock:
+            return {
+                'running': sorted(self._inflight),
+                'last_results': {kind: result for kind, (_, result) in self._results.items()},
+                'cache_seconds': self.cache_seconds
+            }
+
+
+class AnalysisRequestHandler(SimpleHTTPRequestHandler):
+    """Archivos estáticos de ``public/``, archivos diarios de ``data/`` y API de análisis"""
+
+    server_version = 'EconomeJuiceAnalysis/1.0'
+
+    def translate_path(self, path):
+        # /data/* se sirve directamente desde el directorio de datos del analizador
+        if path.split('?', 1)[0].startswith('/data/'):
+            directory = self.directory
+            self.directory = self.server.data_dir
+            try:
+                return super().translate_path(path[len('/data'):])
+            finally:
+                self.directory = directory
+        return super().translate_path(path)
+
+    def end_headers(self):
+        if self.path.startswith('/data/'):
+            self.send_header('Cache-Control', 'no-cache')
+        super().end_headers()
+
+    def send_json(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length).decode('utf-8'))
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        route = self.path.split('?', 1)[0]
+        if route == '/run-analysis/status':
+            self.send_json(200, self.server.jobs.status())
+            return
+        if route == '/events':
+            self.stream_events()
+            return
+        super().do_GET()
+
+    def stream_events(self):
+        """Mantener abierta la conexión SSE y volcar los eventos de la cola del suscriptor"""
+        broadcaster = self.server.broadcaster
+        if broadcaster is None:
+            self.send_json(404, {'error': 'Stream en vivo desactivado'})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Accel-Buffering', 'no')
+        self.end_headers()
+        self.close_connection = True
+
+        subscriber = broadcaster.subscribe(self.headers.get('Last-Event-ID'))
+        try:
+            self.wfile.write(b'retry: 3000\n\n')
+            self.wfile.flush()
+            while not self.server.shutting_down:
+                frame = subscriber.next_frame(timeout=self.server.keepalive_seconds)
+                self.wfile.write(frame or KEEPALIVE_FRAME)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            pass
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    def do_POST(self):
+        if self.path.split('?', 1)[0] != '/run-analysis':
+            self.send_json(404, {'error': 'Ruta no encontrada'})
+            return
+
+        body = self.read_json_body()
+        analysis_type = body.get('type', 'standard')
+        if analysis_type not in ANALYSIS_TYPES:
+            self.send_json(400, {'error': f'Tipo de análisis no válido: {analysis_type}'})
+            return
+
+        outcome, mode = self.server.jobs.submit(analysis_type)
+        if mode == 'cached':
+            result = outcome
+        else:
+            try:
+                result = outcome.result(timeout=self.server.request_timeout)
+            except FutureTimeoutError:
+                self.send_json(202, {'success': True, 'status': 'running', 'mode': mode,
+                                     'message': 'Análisis en curso'})
+                return
+            except Exception as e:
+                logger.error(f"Error ejecutando análisis {analysis_type}: {e}")
+                self.send_json(500, {'error': 'Error ejecutando análisis', 'details': str(e)})
+                return
+
+        status = 200 if result.get('success') else 500
+        self.send_json(status, {
+            'success': result.get('success'),
+            'message': 'Análisis ejecutado exitosamente' if result.get('success') else 'Falló el análisis',
+            'mode': mode,
+            'result': result
+        })
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s" % (self.address_string(), format % args))
+
+
+class AnalysisServer(ThreadingHTTPServer):
+    """Servidor HTTP con un gestor de trabajos compartido entre todas las peticiones"""
+
+    daemon_threads = True
+
+    def __init__(self, address, jobs: AnalysisJobManager, public_dir: str, data_dir: str,
+                 request_timeout: int = 120, broadcaster: Optional[Broadcaster] = None,
+                 keepalive_seconds: float = 15.0):
+        self.jobs = jobs
+        self.data_dir = os.path.abspath(data_dir)
+        self.request_timeout = request_timeout
+        self.broadcaster = broadcaster
+        self.keepalive_seconds = keepalive_seconds
+        self.shutting_down = False
+        public_dir = os.path.abspath(public_dir)
+
+        if broadcaster is not None:
+            jobs.listeners.append(self.announce_snapshot)
+
+        def handler(*args, **kwargs):
+            return AnalysisRequestHandler(*args, directory=public_dir, **kwargs)
+
+        super().__init__(address, handler)
+
+    def announce_snapshot(self, analysis_type: str, result: Dict[str, Any]):
+        """Avisar a los suscriptores de un nuevo snapshot con el contenido de last_update.json"""
+        if not result.get('changed'):
+            return
+        try:
+            with open(os.path.join(self.data_dir, 'last_update.json'), 'r', encoding='utf-8') as f:
+                self.broadcaster.publish('snapshot', json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudo anunciar el nuevo snapshot: {e}")
+
+    def server_close(self):
+        self.shutting_down = True
+        super().server_close()
+
+
+def main():
+    """Función principal del servidor"""
+    parser = argparse.ArgumentParser(description='Servidor HTTP local del análisis NASDAQ 100')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--public-dir', default='public')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--cache-seconds', type=int, default=300,
+                        help='Segundos durante los que se reutiliza el último resultado (por defecto 300)')
+    parser.add_argument('--request-timeout', type=int, default=120,
+                        help='Segundos que una petición espera al análisis antes de responder 202')
+    parser.add_argument('--no-live', action='store_true',
+                        help='Desactivar el stream en vivo /events')
+    parser.add_argument('--poll-seconds', type=float, default=5.0,
+                        help='Segundos entre consultas de barras de 1m mientras haya suscriptores (por defecto 5)')
+    parser.add_argument('--max-queue', type=int, default=64,
+                        help='Eventos pendientes por cliente antes de pedirle resincronizar (por defecto 64)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    jobs = AnalysisJobManager(cache_seconds=args.cache_seconds)
+    broadcaster = None if args.no_live else Broadcaster(max_queue=args.max_queue)
+    server = AnalysisServer((args.host, args.port), jobs, args.public_dir, args.data_dir,
+                            request_timeout=args.request_timeout, broadcaster=broadcaster)
+    if broadcaster is not None:
+        LiveBarPoller(broadcaster, poll_seconds=args.poll_seconds).start()
+
+    logger.info(f"Servidor ejecutándose en http://{args.host}:{args.port}")
+    logger.info("  GET  / - Dashboard principal")
+    logger.info("  GET  /data/<archivo> - Archivos de datos")
+    logger.info("  POST /run-analysis - Ejecutar análisis ({\"type\": \"standard\"|\"enhanced\"})")
+    logger.info("  GET  /run-analysis/status - Estado de los trabajos")
+    if broadcaster is not None:
+        logger.info("  GET  /events - Stream SSE de barras de 1m e indicadores intradía")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
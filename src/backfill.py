@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Recalcular archivos diarios de fechas pasadas (backfill)
+Indicadores, tendencia y niveles se calculan con las barras disponibles al cierre de cada día,
+repartiendo los días entre varios procesos y escribiendo cada archivo de forma atómica
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, Optional, Tuple, Any
+
+from lazy_imports import lazy_import
+pd = lazy_import('pandas')
+yf = lazy_import('yfinance')
+
+from nasdaq_analyzer import NasdaqAnalyzer, STAGE_SECTIONS
+from storage import write_json_atomic, update_history_manifest, market_content_hash
+from market_calendar import nyse_session
+from stages import carry_over_sections
+from stage_cache import StageCache, stage_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Misma ventana que NasdaqAnalyzer.get_market_data (días naturales hasta el cierre)
+LOOKBACK_DAYS = 45
+
+_worker_analyzer = None
+
+
+def bars_cache_path(bars_dir: str, symbol: str) -> str:
+    """Archivo CSV con las barras diarias almacenadas de un símbolo"""
+    name = symbol.lstrip('^').replace('=', '_')
+    return os.path.join(bars_dir, f"{name}_1d.csv")
+
+
+def load_daily_bars(symbol: str, start: date, end: date, bars_dir: str, refresh: bool = False) -> pd.DataFrame:
+    """Barras diarias que cubren [start - LOOKBACK_DAYS, end]; se descargan una sola vez y se guardan en CSV"""
+    first_needed = start - timedelta(days=LOOKBACK_DAYS)
+    path = bars_cache_path(bars_dir, symbol)
+
+    if os.path.exists(path) and not refresh:
+        bars = pd.read_csv(path, index_col=0, parse_dates=True)
+        if not bars.empty and bars.index[0].date() <= first_needed and bars.index[-1].date() >= end:
+            logger.info(f"Usando {len(bars)} barras almacenadas en {path}")
+            return bars
+
+    logger.info(f"Descargando barras diarias de {symbol} desde {first_needed} hasta {end}")
+    bars = yf.Ticker(symbol).history(start=first_needed - timedelta(days=7), end=end + timedelta(days=1), interval='1d')
+    if bars.empty:
+        raise RuntimeError(f"No se pudieron obtener barras diarias de {symbol}")
+
+    # Un índice de fechas sin zona horaria basta para barras diarias
+    bars.index = pd.to_datetime([ts.date() for ts in bars.index])
+    bars = bars[['Open', 'High', 'Low', 'Close', 'Volume']]
+
+    os.makedirs(bars_dir, exist_ok=True)
+    tmp_path = path + '.tmp'
+    bars.to_csv(tmp_path)
+    os.replace(tmp_path, path)
+    return bars
+
+
+def window_as_of(bars: pd.DataFrame, day: date) -> pd.DataFrame:
+    """Barras que el análisis en vivo habría tenido al cierre de ``day``"""
+    dates = bars.index.date
+    return bars[(dates > day - timedelta(days=LOOKBACK_DAYS)) & (dates <= day)]
+
+
+def _init_worker(data_dir: str, symbol: str):
+    """Un analizador por proceso, reutilizado para todos sus días
+
+    El historial de percentiles se lee tal como quedó antes de repartir los días y no se
+    sincroniza: los archivos que reescriben otros procesos no cambian los percentiles de este.
+    """
+    global _worker_analyzer
+    logging.getLogger().setLevel(logging.WARNING)
+    _worker_analyzer = NasdaqAnalyzer()
+    _worker_analyzer.data_dir = data_dir
+    _worker_analyzer.symbol = symbol
+    _worker_analyzer.stage_cache = StageCache(stage_cache_dir(data_dir))
+    _worker_analyzer.percentile_sync = False
+
+
+def backfill_day(task: Tuple[str, pd.DataFrame]) -> Tuple[str, Optional[str], Optional[str]]:
+    """Recalcular un día. Devuelve (día, archivo escrito o None si no cambió, error)"""
+    day_iso, window = task
+    day = date.fromisoformat(day_iso)
+    analyzer = _worker_analyzer
+    filepath = os.path.join(analyzer.data_dir, f"{day.strftime('%Y%m%d')}.json")
+
+    try:
+        previous = {}
+        if os.path.exists(filepath):
+            with open(filepath, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+
+        # Solo la etapa 'indicators' puede reconstruirse; intradía, VIX, noticias, etc. se conservan.
+        # El perfil de volumen guardado aporta POC, área de valor y nodos a los niveles del día
+        sections = analyzer.calculate_indicator_sections(window, previous.get('volume_profile'))
+        carry_over_sections(sections, previous, STAGE_SECTIONS, {'indicators'})
+
+        # Hora local sin zona, como el datetime.now() de una ejecución en vivo al cierre
+        as_of = nyse_session(day)[1].astimezone().replace(tzinfo=None)
+        analysis = analyzer.clean_nan_values(analyzer.build_analysis(sections, as_of=as_of))
+        analysis['market_hash'] = market_content_hash(analysis)
+        if analysis['market_hash'] == previous.get('market_hash'):
+            return day_iso, None, None
+
+        write_json_atomic(filepath, analysis)
+        return day_iso, filepath, None
+    except Exception as e:
+        return day_iso, None, str(e)
+
+
+def run_backfill(start: date, end: date, data_dir: str = 'data', symbol: str = '^NDX',
+                 workers: Optional[int] = None, refresh_bars: bool = False) -> Dict[str, Any]:
+    """Recalcular todos los días de negociación entre ``start`` y ``end`` (ambos incluidos)"""
+    # El día en curso lo gestiona el análisis en vivo (snapshots y deltas)
+    end = min(end, date.today() - timedelta(days=1))
+    if end < start:
+        raise ValueError("El rango no contiene días ya cerrados")
+
+    started = time.perf_counter()
+    bars = load_daily_bars(symbol, start, end, os.path.join(data_dir, 'bars'), refresh_bars)
+    days = sorted({d for d in bars.index.date if start <= d <= end and nyse_session(d)})
+    tasks = [(d.isoformat(), window_as_of(bars, d)) for d in days]
+
+    # Historial de percentiles construido una vez, antes de que los procesos reescriban archivos
+    history_builder = NasdaqAnalyzer()
+    history_builder.data_dir = data_dir
+    history_builder.symbol = symbol
+    history_builder.percentile_history()
+
+    workers = workers or os.cpu_count() or 1
+    written, unchanged, errors = [], [], {}
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data_dir, symbol)) as pool:
+        for day_iso, filepath, error in pool.map(backfill_day, tasks, chunksize=chunksize):
+            if error:
+                errors[day_iso] = error
+                logger.error(f"Error recalculando {day_iso}: {error}")
+            elif filepath:
+                written.append(filepath)
+            else:
+                unchanged.append(day_iso)
+
+    # Un único escritor para el manifiesto
+    if written:
+        update_history_manifest(data_dir, refresh=[os.path.basename(path) for path in written])
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Backfill: {len(written)} escritos, {len(unchanged)} sin cambios, "
+                f"{len(errors)} errores en {elapsed:.1f}s con {workers} procesos")
+    return {'written': written, 'unchanged': unchanged, 'errors': errors, 'seconds': elapsed}
+
+
+def main():
+    """Herramienta de línea de comandos del backfill"""
+    parser = argparse.ArgumentParser(description='Recalcular archivos diarios de fechas pasadas')
+    parser.add_argument('--start', required=True, type=date.fromisoformat, help='Primer día (YYYY-MM-DD)')
+    parser.add_argument('--end', type=date.fromisoformat, default=date.today() - timedelta(days=1),
+                        help='Último día (YYYY-MM-DD, por defecto ayer)')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--symbol', default='^NDX')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Procesos en paralelo (por defecto uno por CPU)')
+    parser.add_argument('--refresh-bars', action='store_true',
+                        help='Volver a descargar las barras aunque estén almacenadas')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    result = run_backfill(args.start, args.end, args.data_dir, args.symbol, args.workers, args.refresh_bars)
+    print(f"✅ {len(result['written'])} días recalculados, {len(result['unchanged'])} sin cambios "
+          f"({result['seconds']:.1f}s)")
+    if result['errors']:
+        print(f"❌ {len(result['errors'])} días con errores")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
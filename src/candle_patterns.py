@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Patrones de velas y de estructura de swings
+Cada patrón es una expresión booleana sobre los arrays OHLC completos (sin bucles por barra):
+envolventes, martillo, estrella fugaz, doji, barras interiores y exteriores, estrellas de la
+mañana y de la tarde y giros de tres barras, más máximos/mínimos crecientes o decrecientes y
+dobles techos y suelos a partir de los swings. Devuelve una máscara por patrón y barra (para
+los gráficos) y el estado de las últimas barras (para la tendencia y el resumen)
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Dict, List, Optional, Any
+
+from lazy_imports import lazy_import
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+from anchored_vwap import swing_positions
+
+logger = logging.getLogger(__name__)
+
+CANDLE_PATTERNS = ('doji', 'hammer', 'shooting_star', 'bullish_engulfing', 'bearish_engulfing',
+                   'inside_bar', 'outside_bar', 'morning_star', 'evening_star',
+                   'three_bar_reversal_bull', 'three_bar_reversal_bear')
+STRUCTURE_PATTERNS = ('swing_high', 'swing_low', 'higher_high', 'lower_high', 'higher_low', 'lower_low',
+                      'double_top', 'double_bottom')
+
+PATTERN_DIRECTIONS = {
+    'doji': 'neutral', 'hammer': 'bullish', 'shooting_star': 'bearish',
+    'bullish_engulfing': 'bullish', 'bearish_engulfing': 'bearish',
+    'inside_bar': 'neutral', 'outside_bar': 'neutral',
+    'morning_star': 'bullish', 'evening_star': 'bearish',
+    'three_bar_reversal_bull': 'bullish', 'three_bar_reversal_bear': 'bearish',
+    'swing_high': 'neutral', 'swing_low': 'neutral',
+    'higher_high': 'bullish', 'higher_low': 'bullish', 'lower_high': 'bearish', 'lower_low': 'bearish',
+    'double_top': 'bearish', 'double_bottom': 'bullish'
+}
+
+# Proporciones de las velas respecto a su rango (máximo - mínimo)
+DOJI_BODY_RATIO = 0.1
+HAMMER_WICK_RATIO = 2.0    # mecha larga frente al cuerpo
+SMALL_WICK_RATIO = 0.25    # mecha corta frente al rango
+LONG_BODY_RATIO = 0.5      # primera vela de una estrella
+STAR_BODY_RATIO = 0.3      # cuerpo de la estrella frente al de la primera vela
+
+# Barras a cada lado que confirman un swing
+SWING_BARS = 3
+# Dobles techos/suelos: picos a menos de 0,5 rangos medios y valle de al menos 2 rangos medios
+RANGE_BARS = 14
+DOUBLE_TOLERANCE_RANGES = 0.5
+DOUBLE_DEPTH_RANGES = 2.0
+
+# Barras finales en las que un patrón cuenta como reciente
+RECENT_BARS = 5
+
+
+def candle_masks(open_: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> Dict[str, np.ndarray]:
+    """Máscara booleana de cada patrón de velas en cada barra
+
+    Los patrones de dos y tres barras se evalúan sobre vistas desplazadas de los mismos arrays
+    (barra actual, anterior y la de antes), sin copias; las primeras barras quedan en False.
+    """
+    n = len(close)
+    masks = {name: np.zeros(n, dtype=bool) for name in CANDLE_PATTERNS}
+    body = np.abs(close - open_)
+    span = high - low
+    upper = high - np.maximum(open_, close)
+    lower = np.minimum(open_, close) - low
+    bullish = close > open_
+    bearish = close < open_
+    has_range = span > 0
+
+    masks['doji'] = has_range & (body <= DOJI_BODY_RATIO * span)
+    masks['hammer'] = has_range & (lower >= HAMMER_WICK_RATIO * body) & (upper <= SMALL_WICK_RATIO * span)
+    masks['shooting_star'] = has_range & (upper >= HAMMER_WICK_RATIO * body) & (lower <= SMALL_WICK_RATIO * span)
+
+    if n > 1:
+        now, before = slice(1, None), slice(None, -1)
+        larger = body[now] > body[before]
+        masks['bullish_engulfing'][now] = (bullish[now] & bearish[before] & larger
+                                           & (open_[now] <= close[before]) & (close[now] >= open_[before]))
+        masks['bearish_engulfing'][now] = (bearish[now] & bullish[before] & larger
+                                           & (open_[now] >= close[before]) & (close[now] <= open_[before]))
+        masks['inside_bar'][now] = (high[now] < high[before]) & (low[now] > low[before])
+        masks['outside_bar'][now] = (high[now] > high[before]) & (low[now] < low[before])
+
+    if n > 2:
+        now, middle, first = slice(2, None), slice(1, -1), slice(None, -2)
+        # Vela larga, estrella de cuerpo pequeño y cierre más allá de la mitad de la primera
+        star = (body[first] >= LONG_BODY_RATIO * span[first]) & (body[middle] <= STAR_BODY_RATIO * body[first])
+        midpoint = (open_[first] + close[first]) / 2
+        masks['morning_star'][now] = star & bearish[first] & bullish[now] & (close[now] > midpoint)
+        masks['evening_star'][now] = star & bullish[first] & bearish[now] & (close[now] < midpoint)
+        # La barra central marca el extremo y la última cierra más allá de ella
+        masks['three_bar_reversal_bull'][now] = ((low[middle] < low[first]) & (low[middle] < low[now])
+                                                 & (close[now] > high[middle]))
+        masks['three_bar_reversal_bear'][now] = ((high[middle] > high[first]) & (high[middle] > high[now])
+                                                 & (close[now] < low[middle]))
+    return masks
+
+
+def mean_range(high: np.ndarray, low: np.ndarray, bars: int = RANGE_BARS) -> np.ndarray:
+    """Rango medio de las últimas ``bars`` barras (de las disponibles, al principio)"""
+    sums = np.concatenate(([0.0], np.cumsum(high - low)))
+    positions = np.arange(1, len(high) + 1)
+    starts = np.maximum(positions - bars, 0)
+    return (sums[positions] - sums[starts]) / (positions - starts)
+
+
+def structure_masks(data: pd.DataFrame, swing_bars: int = SWING_BARS) -> Dict[str, np.ndarray]:
+    """Swings y estructuras entre swings consecutivos, marcadas en la barra del segundo swing
+
+    Un swing solo existe con ``swing_bars`` barras a cada lado, así que las marcas de las
+    últimas barras aparecen con ese retraso.
+    """
+    high = data['High'].to_numpy(dtype=float)
+    low = data['Low'].to_numpy(dtype=float)
+    masks = {name: np.zeros(len(data), dtype=bool) for name in STRUCTURE_PATTERNS}
+    swings = swing_positions(data, swing_bars)
+    masks['swing_high'][swings['high']] = True
+    masks['swing_low'][swings['low']] = True
+    ranges = mean_range(high, low)
+
+    for side, prices, extreme in (('high', high, np.minimum), ('low', low, np.maximum)):
+        positions = swings[side]
+        if len(positions) < 2:
+            continue
+        first, second = positions[:-1], positions[1:]
+        rising = prices[second] > prices[first]
+        falling = prices[second] < prices[first]
+        masks[f'higher_{side}'][second[rising]] = True
+        masks[f'lower_{side}'][second[falling]] = True
+        # Valle entre dos máximos (o cresta entre dos mínimos) con reduceat sobre los tramos
+        between = extreme.reduceat(low if side == 'high' else high, positions)[:-1]
+        peak = np.maximum(prices[first], prices[second]) if side == 'high' else np.minimum(prices[first], prices[second])
+        close_enough = np.abs(prices[second] - prices[first]) <= DOUBLE_TOLERANCE_RANGES * ranges[second]
+        deep_enough = np.abs(peak - between) >= DOUBLE_DEPTH_RANGES * ranges[second]
+        masks['double_top' if side == 'high' else 'double_bottom'][second[close_enough & deep_enough]] = True
+    return masks
+
+
+def scan_patterns(data: pd.DataFrame, swing_bars: int = SWING_BARS) -> pd.DataFrame:
+    """Una columna booleana por patrón y una fila por barra"""
+    if data is None or data.empty:
+        return pd.DataFrame(columns=list(CANDLE_PATTERNS + STRUCTURE_PATTERNS), dtype=bool)
+    masks = candle_masks(*(data[column].to_numpy(dtype=float) for column in ('Open', 'High', 'Low', 'Close')))
+    masks.update(structure_masks(data, swing_bars))
+    # Un único bloque booleano (patrones × barras, que es como pandas lo guarda): construir el
+    # DataFrame desde el diccionario consolida y copia columna a columna
+    names = list(CANDLE_PATTERNS + STRUCTURE_PATTERNS)
+    return pd.DataFrame(np.vstack([masks[name] for name in names]).T, index=data.index, columns=names)
+
+
+def bar_patterns(patterns: pd.DataFrame) -> List[List[str]]:
+    """Nombres de los patrones de cada barra (listas vacías en las barras sin ninguno)"""
+    names = list(patterns.columns)
+    rows, columns = np.nonzero(patterns.to_numpy(dtype=bool))
+    result = [[] for _ in range(len(patterns))]
+    for row, column in zip(rows, columns):
+        result[row].append(names[column])
+    return result
+
+
+def _double_pattern(data: pd.DataFrame, patterns: pd.DataFrame, name: str) -> Optional[Dict[str, Any]]:
+    """Último doble techo/suelo: barras desde el segundo pico, nivel y línea de cuello"""
+    hits = np.flatnonzero(patterns[name].to_numpy())
+    if not len(hits):
+        return None
+    side, column = ('swing_high', 'High') if name == 'double_top' else ('swing_low', 'Low')
+    position = int(hits[-1])
+    previous = np.flatnonzero(patterns[side].to_numpy()[:position])[-1]
+    prices = data[column].to_numpy(dtype=float)
+    opposite = data['Low' if column == 'High' else 'High'].to_numpy(dtype=float)[previous:position]
+    return {
+        'bars_ago': len(data) - 1 - position,
+        'level': round(float(max(prices[previous], prices[position]) if column == 'High'
+                             else min(prices[previous], prices[position])), 2),
+        'neckline': round(float(opposite.min() if column == 'High' else opposite.max()), 2)
+    }
+
+
+def latest_patterns(data: pd.DataFrame, patterns: Optional[pd.DataFrame] = None,
+                    recent_bars: int = RECENT_BARS, swing_bars: int = SWING_BARS) -> Dict[str, Any]:
+    """Estado de los patrones en las últimas barras
+
+    ``recent`` da las barras transcurridas desde la última aparición de cada patrón reciente.
+    Los de velas cuentan en las últimas ``recent_bars`` barras; los de swings, en las
+    ``recent_bars`` anteriores a la última barra en la que se puede confirmar un swing.
+    """
+    if data is None or data.empty:
+        return {}
+    if patterns is None:
+        patterns = scan_patterns(data, swing_bars)
+    values = patterns.to_numpy(dtype=bool)
+    last_bar = len(data) - 1
+
+    recent = {}
+    for column, name in enumerate(patterns.columns):
+        if name in ('swing_high', 'swing_low'):
+            continue
+        hits = np.flatnonzero(values[:, column])
+        window = recent_bars + (swing_bars if name in STRUCTURE_PATTERNS else 0)
+        if len(hits) and last_bar - hits[-1] < window:
+            recent[name] = int(last_bar - hits[-1])
+
+    on_last_bar = [name for name in CANDLE_PATTERNS if patterns[name].iloc[-1]]
+    bullish = sum(PATTERN_DIRECTIONS[name] == 'bullish' for name in on_last_bar)
+    bearish = sum(PATTERN_DIRECTIONS[name] == 'bearish' for name in on_last_bar)
+
+    # Estructura: dirección de los dos últimos máximos y de los dos últimos mínimos de swing
+    swing_highs = data['High'].to_numpy(dtype=float)[patterns['swing_high'].to_numpy()]
+    swing_lows = data['Low'].to_numpy(dtype=float)[patterns['swing_low'].to_numpy()]
+    structure = None
+    if len(swing_highs) > 1 and len(swing_lows) > 1:
+        highs_direction = np.sign(swing_highs[-1] - swing_highs[-2])
+        lows_direction = np.sign(swing_lows[-1] - swing_lows[-2])
+        structure = ('uptrend' if highs_direction > 0 and lows_direction > 0
+                     else 'downtrend' if highs_direction < 0 and lows_direction < 0 else 'range')
+
+    return {
+        'last_bar': on_last_bar,
+        'bias': 'bullish' if bullish > bearish else 'bearish' if bearish > bullish else 'neutral',
+        'recent': recent,
+        'structure': structure,
+        'last_swing_high': round(float(swing_highs[-1]), 2) if len(swing_highs) else None,
+        'last_swing_low': round(float(swing_lows[-1]), 2) if len(swing_lows) else None,
+        'double_top': _double_pattern(data, patterns, 'double_top'),
+        'double_bottom': _double_pattern(data, patterns, 'double_bottom')
+    }
@@ -5,33 +5,90 @@ Enhanced NASDAQ 100 Technical Analysis Script
 Versión mejorada con múltiples fuentes de datos y análisis avanzado
 """
 
+from __future__ import annotations
+
 import json
 import os
-import requests
 from datetime import datetime, timedelta
-import yfinance as yf
-import pandas as pd
-import numpy as np
-from bs4 import BeautifulSoup
 import time
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Set
 import warnings
 warnings.filterwarnings('ignore')
 
+# Dependencias pesadas: se cargan en la primera etapa que las usa, no al importar el módulo
+from lazy_imports import lazy_import
+requests = lazy_import('requests')
+yf = lazy_import('yfinance')
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+bs4 = lazy_import('bs4')
+
+from storage import (write_json_atomic, update_history_manifest, write_last_update,
+                     market_content_hash, previous_market_hash, stored_market_hash, news_content_hash)
+from stages import resolve_stages, load_previous_analysis, carry_over_sections, build_stage_parser
+from market_calendar import new_bars_possible, stored_data_as_of
+from run_metrics import RunMetrics, measure, append_metrics_log
+from volatility import volatility_summary, level_widths
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Etapas seleccionables con --only/--skip y secciones que produce cada una.
+# Tendencia, señales, resumen y riesgo se recalculan siempre a partir de ellas.
+STAGE_SECTIONS = {
+    'indicators': ('yesterday_data', 'technical_indicators', 'daily_levels'),
+    'vix': ('market_sentiment',),
+    'calendar': ('economic_events',),
+    'news': ('news',)
+}
+
+# Indicadores de ventana fija que el informe estándar calcula con la misma fórmula
+# (clave del informe mejorado -> clave del estándar); ver calculate_advanced_indicators
+SHARED_INDICATORS = {
+    'rsi': 'rsi', 'sma_10': 'sma_10', 'sma_20': 'sma_20',
+    'bb_upper': 'bb_upper', 'bb_middle': 'bb_middle', 'bb_lower': 'bb_lower',
+    'stochastic_k': 'stoch_k', 'stochastic_d': 'stoch_d', 'williams_r': 'williams_r', 'atr': 'atr',
+    'volume_sma_20': 'average_volume', 'volume_ratio': 'rvol',
+    'last_close': 'last_close', 'last_high': 'last_high', 'last_low': 'last_low', 'last_volume': 'last_volume',
+    'daily_change': 'daily_change_pct'
+}
+
 class EnhancedNasdaqAnalyzer:
     def __init__(self):
         self.symbol = "^NDX"  # NASDAQ 100 Index
         self.data_dir = "data"
+        self.metrics_dir = os.path.join(self.data_dir, "metrics")
+        self.last_save_changed = True
         self.ensure_data_directory()
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+        self._session = None
+        # Con el mercado cerrado desde el último análisis guardado no se vuelve a descargar nada
+        self.freshness_gate = True
+        # Métricas por etapa de la ejecución en curso (ver run_metrics.py)
+        self.metrics = None
+        self.metrics_listeners = []
+        # Origen alternativo de barras: callable (clave, descarga) -> DataFrame, p. ej. la caché
+        # del analizador estándar cuando ambos informes comparten ejecución (analysis_pipeline.py)
+        self.bar_source = None
+        # Sufijo del archivo diario; con '' se escribe YYYYMMDD.json y se publica en el dashboard
+        self.report_suffix = ''
+
+    @property
+    def session(self):
+        """Sesión HTTP reutilizable; se crea (e importa requests) en el primer uso"""
+        if self._session is None:
+            self._session = requests.Session()
+            self._session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            })
+            self._session.hooks['response'].append(self._count_response_bytes)
+        return self._session
+
+    def _count_response_bytes(self, response, *args, **kwargs):
+        """Sumar el cuerpo de cada respuesta HTTP a la etapa en curso"""
+        if self.metrics is not None:
+            self.metrics.add_bytes(len(response.content))
 
     def ensure_data_directory(self):
         """Crear directorio data si no existe"""
@@ -39,6 +96,15 @@ class EnhancedNasdaqAnalyzer:
             os.makedirs(self.data_dir)
             logger.info(f"Directorio {self.data_dir} creado")
 
+    def fetch_history(self, cache_key: tuple, fetch) -> pd.DataFrame:
+        """Descargar barras con ``fetch`` o pedirlas a ``bar_source`` si está configurado"""
+        if self.bar_source is not None:
+            return self.bar_source(cache_key, fetch)
+        data = fetch()
+        if self.metrics is not None:
+            self.metrics.add_frame(data)
+        return data
+
     def get_market_data(self, days_back: int = 60) -> pd.DataFrame:
         """Obtener datos históricos del NASDAQ 100 con manejo de errores mejorado"""
         try:
@@ -49,7 +115,9 @@ class EnhancedNasdaqAnalyzer:
             # Intentar obtener datos con reintentos
             for attempt in range(3):
                 try:
-                    data = ticker.history(start=start_date, end=end_date, interval='1d')
+                    data = self.fetch_history(
+                        (self.symbol, 'market', days_back),
+                        lambda: ticker.history(start=start_date, end=end_date, interval='1d'))
                     if not data.empty:
                         logger.info(f"Datos obtenidos para {len(data)} días")
                         return data
@@ -64,28 +132,32 @@ class EnhancedNasdaqAnalyzer:
             logger.error(f"Error obteniendo datos de mercado: {e}")
             return pd.DataFrame()
 
-    def calculate_advanced_indicators(self, data: pd.DataFrame) -> Dict[str, Any]:
-        """Calcular indicadores técnicos avanzados"""
+    def calculate_advanced_indicators(self, data: pd.DataFrame,
+                                      shared: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Calcular indicadores técnicos avanzados
+
+        Con ``shared`` (indicadores del informe estándar calculados sobre una cola de ``data`` de
+        al menos 20 barras) los indicadores de ventana fija se toman de ahí y solo se calculan los
+        que dependen de toda la serie (EMA, MACD, volatilidad) o de su longitud (SMA 50/200).
+        """
         if data.empty:
             return {}
 
         try:
-            indicators = {}
-
-            # RSI (Relative Strength Index)
-            delta = data['Close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-            rs = gain / loss
-            rsi = 100 - (100 / (1 + rs))
-            indicators['rsi'] = float(rsi.iloc[-1]) if not rsi.empty else None
+            if shared:
+                indicators = {name: shared.get(source) for name, source in SHARED_INDICATORS.items()}
+            else:
+                indicators = self.calculate_window_indicators(data)
 
-            # Medias móviles múltiples
-            for period in [10, 20, 50, 200]:
+            # Medias móviles largas: solo si la serie alcanza el periodo
+            for period in [50, 200]:
                 if len(data) >= period:
                     sma = data['Close'].rolling(window=period).mean()
                     indicators[f'sma_{period}'] = float(sma.iloc[-1]) if not sma.empty else None
 
+            # Medias exponenciales: dependen de toda la serie, no solo de las últimas barras
+            for period in [10, 20, 50, 200]:
+                if len(data) >= period:
                     ema = data['Close'].ewm(span=period).mean()
                     indicators[f'ema_{period}'] = float(ema.iloc[-1]) if not ema.empty else None
 
@@ -100,59 +172,9 @@ class EnhancedNasdaqAnalyzer:
             indicators['macd_signal'] = float(macd_signal.iloc[-1]) if not macd_signal.empty else None
             indicators['macd_histogram'] = float(macd_histogram.iloc[-1]) if not macd_histogram.empty else None
 
-            # Bandas de Bollinger
-            bb_period = 20
-            bb_middle = data['Close'].rolling(window=bb_period).mean()
-            bb_std = data['Close'].rolling(window=bb_period).std()
-            bb_upper = bb_middle + (bb_std * 2)
-            bb_lower = bb_middle - (bb_std * 2)
-
-            indicators['bb_upper'] = float(bb_upper.iloc[-1]) if not bb_upper.empty else None
-            indicators['bb_middle'] = float(bb_middle.iloc[-1]) if not bb_middle.empty else None
-            indicators['bb_lower'] = float(bb_lower.iloc[-1]) if not bb_lower.empty else None
-
-            # Estocástico
-            if len(data) >= 14:
-                low_14 = data['Low'].rolling(window=14).min()
-                high_14 = data['High'].rolling(window=14).max()
-                k_percent = 100 * ((data['Close'] - low_14) / (high_14 - low_14))
-                d_percent = k_percent.rolling(window=3).mean()
-
-                indicators['stochastic_k'] = float(k_percent.iloc[-1]) if not k_percent.empty else None
-                indicators['stochastic_d'] = float(d_percent.iloc[-1]) if not d_percent.empty else None
-
-            # Williams %R
-            if len(data) >= 14:
-                high_14 = data['High'].rolling(window=14).max()
-                low_14 = data['Low'].rolling(window=14).min()
-                williams_r = -100 * ((high_14 - data['Close']) / (high_14 - low_14))
-                indicators['williams_r'] = float(williams_r.iloc[-1]) if not williams_r.empty else None
-
-            # ATR (Average True Range)
-            if len(data) >= 14:
-                high_low = data['High'] - data['Low']
-                high_close = np.abs(data['High'] - data['Close'].shift())
-                low_close = np.abs(data['Low'] - data['Close'].shift())
-                true_range = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-                atr = true_range.rolling(window=14).mean()
-                indicators['atr'] = float(atr.iloc[-1]) if not atr.empty else None
-
-            # Volumen promedio
-            if 'Volume' in data.columns:
-                vol_sma_20 = data['Volume'].rolling(window=20).mean()
-                indicators['volume_sma_20'] = float(vol_sma_20.iloc[-1]) if not vol_sma_20.empty else None
-                indicators['volume_ratio'] = float(data['Volume'].iloc[-1] / vol_sma_20.iloc[-1]) if not vol_sma_20.empty and vol_sma_20.iloc[-1] > 0 else None
-
-            # Datos del último día
-            indicators['last_close'] = float(data['Close'].iloc[-1])
-            indicators['last_high'] = float(data['High'].iloc[-1])
-            indicators['last_low'] = float(data['Low'].iloc[-1])
-            indicators['last_volume'] = int(data['Volume'].iloc[-1]) if 'Volume' in data.columns else 0
-
-            # Cambio porcentual
-            if len(data) >= 2:
-                prev_close = data['Close'].iloc[-2]
-                indicators['daily_change'] = float((data['Close'].iloc[-1] - prev_close) / prev_close * 100)
+            # Volatilidad realizada (Parkinson, Garman-Klass, Rogers-Satchell, Yang-Zhang); las
+            # ventanas publicadas dependen de la longitud de la serie
+            indicators['volatility_estimators'] = volatility_summary(data, '1d')
 
             return indicators
 
@@ -160,6 +182,80 @@ class EnhancedNasdaqAnalyzer:
             logger.error(f"Error calculando indicadores técnicos: {e}")
             return {}
 
+    def calculate_window_indicators(self, data: pd.DataFrame) -> Dict[str, Any]:
+        """Indicadores de ventana fija: su último valor solo depende de las últimas 20 barras"""
+        indicators = {}
+
+        # RSI (Relative Strength Index)
+        delta = data['Close'].diff()
+        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+        rs = gain / loss
+        rsi = 100 - (100 / (1 + rs))
+        indicators['rsi'] = float(rsi.iloc[-1]) if not rsi.empty else None
+
+        # Medias móviles cortas
+        for period in [10, 20]:
+            if len(data) >= period:
+                sma = data['Close'].rolling(window=period).mean()
+                indicators[f'sma_{period}'] = float(sma.iloc[-1]) if not sma.empty else None
+
+        # Bandas de Bollinger
+        bb_period = 20
+        bb_middle = data['Close'].rolling(window=bb_period).mean()
+        bb_std = data['Close'].rolling(window=bb_period).std()
+        bb_upper = bb_middle + (bb_std * 2)
+        bb_lower = bb_middle - (bb_std * 2)
+
+        indicators['bb_upper'] = float(bb_upper.iloc[-1]) if not bb_upper.empty else None
+        indicators['bb_middle'] = float(bb_middle.iloc[-1]) if not bb_middle.empty else None
+        indicators['bb_lower'] = float(bb_lower.iloc[-1]) if not bb_lower.empty else None
+
+        # Estocástico
+        if len(data) >= 14:
+            low_14 = data['Low'].rolling(window=14).min()
+            high_14 = data['High'].rolling(window=14).max()
+            k_percent = 100 * ((data['Close'] - low_14) / (high_14 - low_14))
+            d_percent = k_percent.rolling(window=3).mean()
+
+            indicators['stochastic_k'] = float(k_percent.iloc[-1]) if not k_percent.empty else None
+            indicators['stochastic_d'] = float(d_percent.iloc[-1]) if not d_percent.empty else None
+
+        # Williams %R
+        if len(data) >= 14:
+            high_14 = data['High'].rolling(window=14).max()
+            low_14 = data['Low'].rolling(window=14).min()
+            williams_r = -100 * ((high_14 - data['Close']) / (high_14 - low_14))
+            indicators['williams_r'] = float(williams_r.iloc[-1]) if not williams_r.empty else None
+
+        # ATR (Average True Range)
+        if len(data) >= 14:
+            high_low = data['High'] - data['Low']
+            high_close = np.abs(data['High'] - data['Close'].shift())
+            low_close = np.abs(data['Low'] - data['Close'].shift())
+            true_range = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
+            atr = true_range.rolling(window=14).mean()
+            indicators['atr'] = float(atr.iloc[-1]) if not atr.empty else None
+
+        # Volumen promedio
+        if 'Volume' in data.columns:
+            vol_sma_20 = data['Volume'].rolling(window=20).mean()
+            indicators['volume_sma_20'] = float(vol_sma_20.iloc[-1]) if not vol_sma_20.empty else None
+            indicators['volume_ratio'] = float(data['Volume'].iloc[-1] / vol_sma_20.iloc[-1]) if not vol_sma_20.empty and vol_sma_20.iloc[-1] > 0 else None
+
+        # Datos del último día
+        indicators['last_close'] = float(data['Close'].iloc[-1])
+        indicators['last_high'] = float(data['High'].iloc[-1])
+        indicators['last_low'] = float(data['Low'].iloc[-1])
+        indicators['last_volume'] = int(data['Volume'].iloc[-1]) if 'Volume' in data.columns else 0
+
+        # Cambio porcentual
+        if len(data) >= 2:
+            prev_close = data['Close'].iloc[-2]
+            indicators['daily_change'] = float((data['Close'].iloc[-1] - prev_close) / prev_close * 100)
+
+        return indicators
+
     def get_market_sentiment(self) -> Dict[str, Any]:
         """Obtener indicadores de sentimiento del mercado"""
         sentiment = {
@@ -170,8 +266,7 @@ class EnhancedNasdaqAnalyzer:
 
         try:
             # Obtener VIX (índice de volatilidad)
-            vix_ticker = yf.Ticker("^VIX")
-            vix_data = vix_ticker.history(period="5d")
+            vix_data = self.fetch_history(("^VIX", "1d", "5d"), lambda: yf.Ticker("^VIX").history(period="5d"))
             if not vix_data.empty:
                 vix_current = float(vix_data['Close'].iloc[-1])
                 sentiment['vix_level'] = vix_current
@@ -381,15 +476,18 @@ class EnhancedNasdaqAnalyzer:
             recent_high = recent_data['High'].max()
             recent_low = recent_data['Low'].min()
 
+            # Anchura de los niveles secundarios: 2σ y 4σ diarias; sin estimador, 2 % y 5 %
+            widths = level_widths((indicators.get('volatility_estimators') or {}).get('bar_sigma')) or (0.02, 0.05)
+
             # Resistencias múltiples
             levels['resistance_1'] = recent_high
-            levels['resistance_2'] = recent_high * 1.02
-            levels['resistance_3'] = recent_high * 1.05
+            levels['resistance_2'] = recent_high * (1 + widths[0])
+            levels['resistance_3'] = recent_high * (1 + widths[1])
 
             # Soportes múltiples
             levels['support_1'] = recent_low
-            levels['support_2'] = recent_low * 0.98
-            levels['support_3'] = recent_low * 0.95
+            levels['support_2'] = recent_low * (1 - widths[0])
+            levels['support_3'] = recent_low * (1 - widths[1])
 
             # Niveles de retroceso de Fibonacci
             price_range = recent_high - recent_low
@@ -497,36 +595,80 @@ class EnhancedNasdaqAnalyzer:
 
         return signals
 
-    def generate_enhanced_analysis(self) -> Dict[str, Any]:
-        """Generar análisis completo mejorado"""
+    def generate_enhanced_analysis(self, stages: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """Generar análisis completo mejorado
+
+        Con ``stages`` solo se ejecutan esas etapas; las demás conservan los valores del
+        archivo diario existente.
+        """
         logger.info("Iniciando análisis mejorado del NASDAQ 100")
+        self.metrics = RunMetrics('enhanced', self.metrics_listeners)
+
+        stages = set(stages or STAGE_SECTIONS)
+        previous = {}
+        if stages != set(STAGE_SECTIONS):
+            previous = load_previous_analysis(self.data_dir, datetime.now().strftime('%Y%m%d'))
+            if previous:
+                logger.info(f"Etapas seleccionadas: {', '.join(sorted(stages))}; el resto conserva los valores previos")
+            else:
+                logger.warning("No hay análisis previo del que conservar valores; se ejecutan todas las etapas")
+                stages = set(STAGE_SECTIONS)
+
+        sections = {}
+        if 'indicators' in stages:
+            # Obtener datos de mercado
+            with measure(self.metrics, 'fetch_market'):
+                market_data = self.get_market_data()
+            if market_data.empty:
+                logger.error("No se pudieron obtener datos de mercado")
+                return {}
+
+            # Calcular indicadores técnicos avanzados
+            with measure(self.metrics, 'indicators'):
+                indicators = self.calculate_advanced_indicators(market_data)
+                sections['technical_indicators'] = indicators
+
+            # Predicción de niveles avanzada
+            with measure(self.metrics, 'levels'):
+                sections['daily_levels'] = self.predict_daily_levels_advanced(market_data, indicators)
+
+            # Datos del día anterior
+            sections['yesterday_data'] = self.summarize_yesterday(market_data, indicators)
 
-        # Obtener datos de mercado
-        market_data = self.get_market_data()
-        if market_data.empty:
-            logger.error("No se pudieron obtener datos de mercado")
-            return {}
+        # Obtener sentimiento del mercado
+        if 'vix' in stages:
+            with measure(self.metrics, 'vix'):
+                sections['market_sentiment'] = self.get_market_sentiment()
 
-        # Calcular indicadores técnicos avanzados
-        indicators = self.calculate_advanced_indicators(market_data)
+        # Obtener calendario económico
+        if 'calendar' in stages:
+            with measure(self.metrics, 'calendar'):
+                sections['economic_events'] = self.get_economic_calendar()
 
-        # Obtener sentimiento del mercado
-        sentiment = self.get_market_sentiment()
+        if 'news' in stages:
+            with measure(self.metrics, 'news'):
+                sections['news'] = self.get_market_news()
 
-        # Análisis de tendencia avanzado
-        trend_analysis = self.analyze_trend_advanced(indicators, sentiment)
+        carry_over_sections(sections, previous, STAGE_SECTIONS, stages)
+        indicators = sections['technical_indicators']
+        sentiment = sections['market_sentiment']
 
-        # Predicción de niveles avanzada
-        daily_levels = self.predict_daily_levels_advanced(market_data, indicators)
+        # Análisis de tendencia avanzado
+        with measure(self.metrics, 'trend'):
+            sections['trend_analysis'] = self.analyze_trend_advanced(indicators, sentiment)
 
         # Generar señales de trading
-        trading_signals = self.generate_trading_signals(indicators, trend_analysis)
+        with measure(self.metrics, 'signals'):
+            sections['trading_signals'] = self.generate_trading_signals(indicators, sections['trend_analysis'])
 
-        # Obtener calendario económico
-        economic_events = self.get_economic_calendar()
+        with measure(self.metrics, 'risk'):
+            sections['risk_assessment'] = self.assess_risk(indicators, sentiment, sections['trend_analysis'])
+
+        return self.build_analysis(sections)
 
-        # Datos del día anterior
-        yesterday_data = {
+    def summarize_yesterday(self, market_data: pd.DataFrame, indicators: Dict[str, Any]) -> Dict[str, Any]:
+        """Datos de la última barra diaria con la variación calculada en los indicadores"""
+        return {
             'high': float(market_data['High'].iloc[-1]),
             'low': float(market_data['Low'].iloc[-1]),
             'close': float(market_data['Close'].iloc[-1]),
@@ -534,25 +676,28 @@ class EnhancedNasdaqAnalyzer:
             'change': indicators.get('daily_change', 0)
         }
 
-        # Compilar análisis completo
-        analysis = {
+    def build_analysis(self, sections: Dict[str, Any]) -> Dict[str, Any]:
+        """Compilar el análisis completo a partir de las secciones calculadas"""
+        trend_analysis = sections['trend_analysis']
+        daily_levels = sections['daily_levels']
+        indicators = sections['technical_indicators']
+        sentiment = sections['market_sentiment']
+        return {
             'date': datetime.now().strftime('%Y-%m-%d'),
             'timestamp': datetime.now().isoformat(),
             'symbol': self.symbol,
-            'yesterday_data': yesterday_data,
+            'yesterday_data': sections['yesterday_data'],
             'technical_indicators': indicators,
             'market_sentiment': sentiment,
             'trend_analysis': trend_analysis,
             'daily_levels': daily_levels,
-            'trading_signals': trading_signals,
-            'economic_events': economic_events,
-            'news': self.get_market_news(),
+            'trading_signals': sections['trading_signals'],
+            'economic_events': sections['economic_events'],
+            'news': sections['news'],
             'summary': self.generate_enhanced_summary(trend_analysis, daily_levels, indicators, sentiment),
-            'risk_assessment': self.assess_risk(indicators, sentiment, trend_analysis)
+            'risk_assessment': sections['risk_assessment']
         }
 
-        return analysis
-
     def get_market_news(self) -> List[Dict[str, str]]:
         """Obtener noticias del mercado (versión mejorada)"""
         news = []
@@ -635,6 +780,21 @@ class EnhancedNasdaqAnalyzer:
                 risk_factors.append('Baja volatilidad - posible complacencia')
                 risk_score += 10
 
+        # Factor de volatilidad realizada (Yang-Zhang anualizada de 20 y 40 días)
+        yang_zhang = ((indicators.get('volatility_estimators') or {}).get('estimators') or {}).get('yang_zhang', {})
+        realized_short = yang_zhang.get('20')
+        realized_long = yang_zhang.get('40')
+        if realized_short:
+            if realized_short > 30:
+                risk_factors.append(f'Volatilidad realizada alta ({realized_short:.0f}% anual)')
+                risk_score += 15
+            elif realized_short < 12:
+                risk_factors.append('Volatilidad realizada muy baja - posible expansión')
+                risk_score += 5
+            if realized_long and realized_short > realized_long * 1.25:
+                risk_factors.append('Volatilidad realizada en expansión')
+                risk_score += 10
+
         # Factor de tendencia
         trend_strength = trend_analysis.get('strength')
         if trend_strength == 'weak':
@@ -664,6 +824,7 @@ class EnhancedNasdaqAnalyzer:
             'risk_level': risk_level,
             'risk_score': min(100, max(0, risk_score)),
             'risk_factors': risk_factors,
+            'realized_volatility': {'yang_zhang_20': realized_short, 'yang_zhang_40': realized_long},
             'recommendation': self.get_risk_recommendation(risk_level)
         }
 
@@ -678,31 +839,96 @@ class EnhancedNasdaqAnalyzer:
         }
         return recommendations.get(risk_level, 'Evaluar cuidadosamente antes de invertir.')
 
-    def save_analysis(self, analysis: Dict[str, Any]) -> str:
-        """Guardar análisis en archivo JSON"""
+    def save_analysis(self, analysis: Dict[str, Any], skip_unchanged: bool = True,
+                      record_metrics: bool = True) -> str:
+        """Guardar análisis en archivo JSON (no reescribe si los datos de mercado no cambiaron,
+        salvo con ``skip_unchanged=False``; con ``record_metrics=False`` no toca el histórico de métricas)"""
         if not analysis:
             logger.error("No hay análisis para guardar")
             return ""
 
-        filename = f"{datetime.now().strftime('%Y%m%d')}.json"
+        filename = f"{datetime.now().strftime('%Y%m%d')}{self.report_suffix}.json"
         filepath = os.path.join(self.data_dir, filename)
 
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(analysis, f, indent=2, ensure_ascii=False)
-
-            logger.info(f"Análisis guardado en {filepath}")
+            with measure(self.metrics, 'serialize'):
+                analysis['market_hash'] = market_content_hash(analysis)
+            # Los archivos con sufijo no están en el manifiesto: el hash se lee del propio archivo
+            if self.report_suffix:
+                previous_hash = stored_market_hash(filepath)
+            else:
+                previous_hash = previous_market_hash(self.data_dir, filename)
+            if skip_unchanged and analysis['market_hash'] == previous_hash:
+                self.last_save_changed = False
+                logger.info(f"Sin cambios en los datos de mercado; {filepath} no se reescribe")
+                if record_metrics:
+                    self.record_run_metrics()
+                return filepath
+            self.last_save_changed = True
+
+            # La escritura en sí solo consta en el histórico de métricas
+            if self.metrics is not None:
+                analysis['run_metrics'] = self.metrics.as_dict()
+            with measure(self.metrics, 'write'):
+                write_json_atomic(filepath, analysis)
+                logger.info(f"Análisis guardado en {filepath}")
+
+                # Mantener el manifiesto del histórico y el timestamp del dashboard (solo el
+                # archivo diario sin sufijo es el que lee el dashboard)
+                if not self.report_suffix:
+                    update_history_manifest(self.data_dir, filepath, analysis)
+                    write_last_update(self.data_dir, 'success')
+            if record_metrics:
+                self.record_run_metrics()
             return filepath
         except Exception as e:
             logger.error(f"Error guardando análisis: {e}")
             return ""
 
-    def run_enhanced_analysis(self):
-        """Ejecutar análisis mejorado completo"""
+    def record_run_metrics(self):
+        """Añadir las métricas de la ejecución al histórico rodante ``data/metrics``"""
+        if self.metrics is None:
+            return
         try:
-            analysis = self.generate_enhanced_analysis()
+            entry = self.metrics.as_dict()
+            entry['changed'] = self.last_save_changed
+            append_metrics_log(self.metrics_dir, entry)
+        except Exception as e:
+            logger.warning(f"No se pudieron registrar las métricas de la ejecución: {e}")
+
+    def keep_unchanged_news(self, analysis: Dict[str, Any]) -> bool:
+        """True si las noticias descargadas son las del archivo del día (se conservan las guardadas)"""
+        filepath = os.path.join(self.data_dir, f"{datetime.now().strftime('%Y%m%d')}{self.report_suffix}.json")
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                previous_news = json.load(f).get('news')
+        except (OSError, ValueError):
+            return False
+        if previous_news is None or news_content_hash(previous_news) != news_content_hash(analysis.get('news')):
+            return False
+        analysis['news'] = previous_news
+        logger.info("Las noticias no han cambiado desde el último guardado")
+        return True
+
+    def run_enhanced_analysis(self, stages: Optional[Set[str]] = None):
+        """Ejecutar análisis mejorado completo o solo las etapas indicadas"""
+        try:
+            if stages is None and self.freshness_gate:
+                previous = load_previous_analysis(self.data_dir, datetime.now().strftime('%Y%m%d'))
+                as_of = stored_data_as_of(previous) if previous else None
+                if as_of is not None and not new_bars_possible(as_of):
+                    self.last_save_changed = False
+                    logger.info("Mercados cerrados desde el último análisis guardado; se reutiliza el existente")
+                    return True
+
+            analysis = self.generate_enhanced_analysis(stages)
             if analysis:
-                filepath = self.save_analysis(analysis)
+                # Las noticias no forman parte del hash de mercado: si se piden expresamente, guardar
+                # solo si cambiaron los titulares (la hora de obtención de cada uno no cuenta)
+                news_refresh = stages is not None and 'news' in stages and set(stages) != set(STAGE_SECTIONS)
+                if news_refresh:
+                    news_refresh = not self.keep_unchanged_news(analysis)
+                filepath = self.save_analysis(analysis, skip_unchanged=not news_refresh)
                 if filepath:
                     logger.info("✅ Análisis mejorado completado exitosamente")
 
@@ -728,8 +954,16 @@ class EnhancedNasdaqAnalyzer:
 
 def main():
     """Función principal"""
+    parser = build_stage_parser('Análisis mejorado del NASDAQ 100', STAGE_SECTIONS)
+    args = parser.parse_args()
+    try:
+        stages = resolve_stages(STAGE_SECTIONS, args.only, args.skip)
+    except ValueError as e:
+        parser.error(str(e))
+
     analyzer = EnhancedNasdaqAnalyzer()
-    success = analyzer.run_enhanced_analysis()
+    analyzer.freshness_gate = not args.force
+    success = analyzer.run_enhanced_analysis(None if stages == set(STAGE_SECTIONS) else stages)
 
     if success:
         print("\n✅ Análisis mejorado completado exitosamente")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Perfil de importación y presupuesto de arranque en frío
+Ejecuta ``python -X importtime`` en un proceso limpio, muestra el coste de cada módulo y
+comprueba que los módulos de entrada no cargan dependencias pesadas al importarse
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Any
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos de entrada cuyo arranque en frío se vigila
+DEFAULT_TARGETS = ('nasdaq_analyzer', 'enhanced_analyzer', 'analysis_daemon', 'analysis_server')
+
+# Dependencias que solo deben cargarse en la etapa que las usa
+HEAVY_MODULES = ('pandas', 'numpy', 'yfinance', 'requests', 'bs4', 'sklearn', 'scipy')
+
+# Presupuesto del import acumulado de cada módulo de entrada (milisegundos)
+DEFAULT_BUDGET_MS = 150.0
+
+
+def profile_import(module: str, python: str = sys.executable) -> List[Dict[str, Any]]:
+    """Importar ``module`` en un proceso nuevo con -X importtime y devolver una entrada por módulo"""
+    result = subprocess.run(
+        [python, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SRC_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Error importando {module}: {result.stderr.strip().splitlines()[-1:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        entries.append({
+            'module': name.strip(),
+            'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000
+        })
+    return entries
+
+
+def measure_cold_start(module: str, repeat: int = 5, python: str = sys.executable) -> float:
+    """Mediana del tiempo de pared de ``python -c 'import module'`` (incluye el arranque del intérprete)"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([python, '-c', f'import {module}'], cwd=SRC_DIR, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def analyze_target(module: str, budget_ms: float, repeat: int) -> Dict[str, Any]:
+    """Perfil, dependencias pesadas cargadas y veredicto del presupuesto para un módulo"""
+    entries = profile_import(module)
+    target = next((e for e in reversed(entries) if e['module'] == module), None)
+    import_ms = target['cumulative_ms'] if target else 0.0
+    eager_heavy = sorted({e['module'].split('.')[0] for e in entries} & set(HEAVY_MODULES))
+    return {
+        'module': module,
+        'import_ms': import_ms,
+        'cold_start_ms': measure_cold_start(module, repeat) if repeat else None,
+        'eager_heavy': eager_heavy,
+        'within_budget': import_ms <= budget_ms and not eager_heavy,
+        'entries': entries
+    }
+
+
+def print_report(report: Dict[str, Any], budget_ms: float, top: int):
+    """Mostrar los módulos más costosos y el veredicto del presupuesto"""
+    status = '✅' if report['within_budget'] else '❌'
+    cold = f", arranque en frío {report['cold_start_ms']:.0f} ms" if report['cold_start_ms'] is not None else ''
+    print(f"{status} {report['module']}: import {report['import_ms']:.1f} ms (presupuesto {budget_ms:.0f} ms){cold}")
+    if report['eager_heavy']:
+        print(f"   Dependencias pesadas cargadas al importar: {', '.join(report['eager_heavy'])}")
+
+    entries = sorted(report['entries'], key=lambda e: e['self_ms'], reverse=True)[:top]
+    print(f"   {'propio ms':>10} {'acumulado ms':>13}  módulo")
+    for entry in entries:
+        print(f"   {entry['self_ms']:>10.1f} {entry['cumulative_ms']:>13.1f}  {entry['module']}")
+    print()
+
+
+def main():
+    """Herramienta de línea de comandos del perfil de importación"""
+    parser = argparse.ArgumentParser(description='Perfil de importación y presupuesto de arranque en frío')
+    parser.add_argument('modules', nargs='*', default=list(DEFAULT_TARGETS),
+                        help='Módulos a perfilar (por defecto los módulos de entrada)')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help=f'Presupuesto del import acumulado por módulo (por defecto {DEFAULT_BUDGET_MS:.0f} ms)')
+    parser.add_argument('--top', type=int, default=10, help='Módulos más costosos a mostrar')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Repeticiones para medir el arranque en frío (0 para omitirlo)')
+    parser.add_argument('--check', action='store_true',
+                        help='Salir con código 1 si algún módulo supera el presupuesto')
+    args = parser.parse_args()
+
+    reports = [analyze_target(module, args.budget_ms, args.repeat) for module in args.modules]
+    for report in reports:
+        print_report(report, args.budget_ms, args.top)
+
+    if args.check and not all(report['within_budget'] for report in reports):
+        print("❌ Presupuesto de arranque en frío superado")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
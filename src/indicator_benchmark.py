@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks de las funciones de indicadores y niveles
+Genera barras OHLCV sintéticas deterministas de varios tamaños, mide cada función con
+calentamiento y repeticiones y compara contra una línea base guardada en local
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+from lazy_imports import lazy_import
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+from market_calendar import MARKET_TZ
+
+logger = logging.getLogger(__name__)
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(SRC_DIR), 'benchmarks', 'indicator_baseline.json')
+
+DEFAULT_SIZES = (30, 1_000, 100_000, 1_000_000)
+DEFAULT_SEED = 42
+
+# Una regresión es un mejor tiempo más de un 20 % por encima del de la línea base
+DEFAULT_TOLERANCE = 0.20
+
+
+def synthetic_ohlcv(bars: int, seed: int = DEFAULT_SEED, freq: str = '1min') -> pd.DataFrame:
+    """Barras OHLCV deterministas: paseo aleatorio geométrico con mechas y volumen aleatorios"""
+    rng = np.random.default_rng(seed)
+    close = 20000 * np.exp(np.cumsum(rng.normal(0, 0.0008, bars)))
+    open_ = np.empty(bars)
+    open_[0] = close[0]
+    open_[1:] = close[:-1] * (1 + rng.normal(0, 0.0002, bars - 1))
+    wick = np.abs(rng.normal(0, 0.0006, (2, bars))) * close
+    index = pd.date_range('2020-01-02 09:30', periods=bars, freq=freq, tz=MARKET_TZ)
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) + wick[0],
+        'Low': np.minimum(open_, close) - wick[1],
+        'Close': close,
+        'Volume': rng.integers(100, 5000, bars)
+    }, index=index)
+
+
+def build_cases() -> Dict[str, Tuple[Callable[[pd.DataFrame], Any], Callable[[pd.DataFrame], Any]]]:
+    """Funciones medidas: nombre -> (preparación sin medir, llamada medida)
+
+    La preparación recibe las barras y devuelve el argumento de la llamada medida.
+    """
+    from nasdaq_analyzer import NasdaqAnalyzer
+    from enhanced_analyzer import EnhancedNasdaqAnalyzer
+    from candle_patterns import scan_patterns
+
+    analyzer = NasdaqAnalyzer()
+    enhanced = EnhancedNasdaqAnalyzer()
+
+    def same(data):
+        return data
+
+    def with_indicators(data):
+        # Los niveles solo leen los valores finales de los indicadores: basta con la cola
+        return data, analyzer.calculate_technical_indicators(data.tail(1000))
+
+    return {
+        'calculate_technical_indicators': (same, analyzer.calculate_technical_indicators),
+        'calculate_intraday_indicators': (same, lambda data: analyzer.calculate_intraday_indicators(data, '1m')),
+        'predict_daily_levels': (with_indicators, lambda args: analyzer.predict_daily_levels(*args)),
+        'calculate_tape_trading_metrics': (same, analyzer.calculate_tape_trading_metrics),
+        'calculate_vwap_multi_timeframe': (same, lambda data: analyzer.calculate_vwap_multi_timeframe(data, data, data, data)),
+        'calculate_advanced_indicators': (same, enhanced.calculate_advanced_indicators),
+        'scan_patterns': (same, scan_patterns),
+    }
+
+
+def time_call(func: Callable[[Any], Any], argument: Any, warmup: int, repeat: int,
+              max_seconds: float) -> Dict[str, Any]:
+    """Medir ``func(argument)`` tras ``warmup`` llamadas; las repeticiones se recortan para no
+    superar ``max_seconds`` por caso"""
+    result = None
+    timings = []
+    for _ in range(warmup):
+        started = time.perf_counter()
+        result = func(argument)
+        elapsed = time.perf_counter() - started
+        if elapsed > max_seconds:
+            # Una sola llamada ya agota el tiempo: el calentamiento sirve de medida
+            timings, repeat = [elapsed * 1000], 0
+            break
+        if elapsed * repeat > max_seconds:
+            repeat = max(1, int(max_seconds / max(elapsed, 1e-9)))
+
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(argument)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    # Las funciones del analizador capturan sus excepciones y devuelven {'error': ...}
+    error = result.get('error') if isinstance(result, dict) else None
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'repeat': len(timings),
+        'error': error
+    }
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, names: Optional[List[str]] = None, warmup: int = 1,
+                   repeat: int = 5, max_seconds: float = 10.0, seed: int = DEFAULT_SEED) -> Dict[str, Dict[str, Any]]:
+    """Ejecutar todos los casos para todos los tamaños; clave ``función@barras``"""
+    cases = build_cases()
+    unknown = set(names or []) - set(cases)
+    if unknown:
+        raise ValueError(f"Funciones desconocidas: {', '.join(sorted(unknown))}. Disponibles: {', '.join(cases)}")
+
+    results = {}
+    too_slow = set()
+    for bars in sorted(sizes):
+        data = synthetic_ohlcv(bars, seed)
+        for name, (prepare, func) in cases.items():
+            if names and name not in names:
+                continue
+            key = f"{name}@{bars}"
+            if name in too_slow:
+                # Si ya superó el tiempo máximo con menos barras, con más solo tardaría más
+                results[key] = {'median_ms': None, 'min_ms': None, 'repeat': 0, 'error': None, 'skipped': True}
+                continue
+            results[key] = time_call(func, prepare(data), warmup, repeat, max_seconds)
+            if results[key]['median_ms'] > max_seconds * 1000:
+                too_slow.add(name)
+            logger.info(f"{key}: {results[key]['median_ms']:.2f} ms")
+    return results
+
+
+def machine_info() -> Dict[str, str]:
+    """Datos de la máquina para no comparar líneas base de equipos distintos sin saberlo"""
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': str(os.cpu_count()),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__
+    }
+
+
+def save_baseline(path: str, results: Dict[str, Dict[str, Any]]):
+    """Guardar (o ampliar) la línea base local"""
+    baseline = load_baseline(path) or {'results': {}}
+    baseline['results'].update(results)
+    baseline['machine'] = machine_info()
+    baseline['updated_at'] = datetime.now().isoformat()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2, ensure_ascii=False)
+
+
+def load_baseline(path: str) -> Optional[Dict[str, Any]]:
+    """Línea base guardada o None si no existe"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any],
+            tolerance: float = DEFAULT_TOLERANCE) -> List[Dict[str, Any]]:
+    """Relación entre el mejor tiempo actual y el de la línea base para cada caso medido
+
+    Se compara el mínimo de las repeticiones, que es mucho menos sensible a la carga de la
+    máquina que la mediana.
+    """
+    rows = []
+    for key, current in results.items():
+        previous = baseline.get('results', {}).get(key)
+        ratio = None
+        if current['min_ms'] and previous and previous.get('min_ms'):
+            ratio = current['min_ms'] / previous['min_ms']
+        rows.append({
+            'case': key,
+            'min_ms': current['min_ms'],
+            'baseline_ms': previous['min_ms'] if previous else None,
+            'ratio': ratio,
+            'regression': ratio is not None and ratio > 1 + tolerance
+        })
+    return rows
+
+
+def print_report(results: Dict[str, Dict[str, Any]], comparison: Optional[List[Dict[str, Any]]] = None):
+    """Tabla de resultados, con la comparación contra la línea base si la hay"""
+    by_case = {row['case']: row for row in comparison or []}
+    print(f"{'caso':<45} {'mediana ms':>11} {'mín ms':>10} {'rep':>4} {'base mín':>10} {'ratio':>7}")
+    for key, result in results.items():
+        row = by_case.get(key, {})
+        if result.get('skipped'):
+            print(f"{key:<45} {'omitido (demasiado lento con menos barras)':>40}")
+            continue
+        base = f"{row['baseline_ms']:.2f}" if row.get('baseline_ms') is not None else '-'
+        ratio = f"{row['ratio']:.2f}x" if row.get('ratio') is not None else '-'
+        flag = ' ❌' if row.get('regression') else ''
+        error = f"  ⚠️  {result['error']}" if result['error'] else ''
+        print(f"{key:<45} {result['median_ms']:>11.2f} {result['min_ms']:>10.2f} {result['repeat']:>4} "
+              f"{base:>10} {ratio:>7}{flag}{error}")
+
+
+def main():
+    """Herramienta de línea de comandos de los micro-benchmarks"""
+    parser = argparse.ArgumentParser(description='Micro-benchmarks de indicadores y niveles sobre OHLCV sintético')
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')],
+                        default=list(DEFAULT_SIZES), help='Tamaños en barras, separados por comas (por defecto 30,1000,100000,1000000)')
+    parser.add_argument('--only', action='append', metavar='FUNCIONES',
+                        help='Medir solo estas funciones, separadas por comas')
+    parser.add_argument('--warmup', type=int, default=1, help='Llamadas de calentamiento por caso')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeticiones medidas por caso')
+    parser.add_argument('--max-seconds', type=float, default=10.0,
+                        help='Tiempo máximo por caso; se recortan las repeticiones de los casos lentos')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Archivo de línea base')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Guardar los resultados como nueva línea base')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Empeoramiento tolerado frente a la línea base (0.2 = 20 %%)')
+    parser.add_argument('--check', action='store_true',
+                        help='Salir con código 1 si algún caso empeora más de la tolerancia')
+    args = parser.parse_args()
+
+    # Los analizadores registran cada paso en INFO; aquí solo interesan los avisos
+    # (configurarlo antes de importarlos hace que su basicConfig no tenga efecto)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    names = [name.strip() for value in args.only or [] for name in value.split(',') if name.strip()]
+    try:
+        results = run_benchmarks(args.sizes, names, args.warmup, args.repeat, args.max_seconds, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+
+    baseline = load_baseline(args.baseline)
+    comparison = compare(results, baseline, args.tolerance) if baseline else None
+    if baseline and baseline.get('machine') != machine_info():
+        print("⚠️  La línea base se guardó en otra máquina o con otras versiones; la comparación es orientativa")
+    print_report(results, comparison)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"💾 Línea base guardada en {args.baseline}")
+
+    if args.check and comparison and any(row['regression'] for row in comparison):
+        print(f"❌ Hay casos más de un {args.tolerance:.0%} más lentos que la línea base")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
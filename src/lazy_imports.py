@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Importaciones diferidas para las dependencias pesadas (pandas, numpy, yfinance, requests, bs4)
+El módulo se registra al importar, pero su código solo se ejecuta con el primer acceso a un atributo
+"""
+
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Devolver el módulo ``name`` sin ejecutarlo hasta que se use
+
+    Si ya estaba importado se devuelve tal cual. Las anotaciones de tipo que lo mencionan
+    no cuentan como uso siempre que el módulo llamante use ``from __future__ import annotations``.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
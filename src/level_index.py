@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice de confluencia de soportes y resistencias
+Agrupa los niveles candidatos de todas las fuentes (Bollinger, máximos y mínimos, Fibonacci,
+pivots, ATR, medias, VWAP, perfil de volumen...) en clusters de precio con una tolerancia
+proporcional al ATR, puntúa cada cluster por el número de fuentes que coinciden y responde
+"los N niveles más cercanos por encima o por debajo del precio" con búsqueda binaria
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Dict, Iterable, List, Optional, Any
+
+from lazy_imports import lazy_import
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+# Dos niveles a menos de una décima de ATR se consideran el mismo
+DEFAULT_ATR_TOLERANCE = 0.1
+
+# Tolerancia cuando no hay ATR: fracción del precio (0.05 %)
+FALLBACK_PRICE_TOLERANCE = 0.0005
+
+
+def level_tolerance(atr: Optional[float], price: float, atr_fraction: float = DEFAULT_ATR_TOLERANCE) -> float:
+    """Distancia máxima entre niveles consecutivos de un mismo cluster"""
+    if atr and atr > 0:
+        return float(atr) * atr_fraction
+    return abs(float(price)) * FALLBACK_PRICE_TOLERANCE
+
+
+class LevelIndex:
+    """Clusters de niveles ordenados por precio
+
+    Los candidatos se ordenan una vez; un salto mayor que ``tolerance`` entre dos niveles
+    consecutivos abre un cluster nuevo. El precio del cluster es la media de sus niveles y su
+    puntuación el número de fuentes distintas que contiene (varias líneas de Fibonacci del mismo
+    rango cuentan como una fuente). Las consultas son O(log n + N) sobre los centros ordenados.
+    """
+
+    def __init__(self, prices: Iterable[float], sources: Iterable[str], tolerance: float):
+        prices = np.asarray(list(prices), dtype=float)
+        sources = np.asarray(list(sources), dtype=object)
+        valid = np.isfinite(prices) & (prices > 0)
+        prices, sources = prices[valid], sources[valid]
+        self.tolerance = tolerance
+
+        order = np.argsort(prices, kind='stable')
+        prices, sources = prices[order], sources[order]
+        if len(prices):
+            cluster_ids = np.concatenate(([0], np.cumsum(np.diff(prices) > tolerance)))
+        else:
+            cluster_ids = np.array([], dtype=int)
+        starts = np.flatnonzero(np.diff(cluster_ids, prepend=-1))
+        counts = np.diff(np.append(starts, len(prices)))
+
+        self.centers = np.add.reduceat(prices, starts) / counts if len(prices) else np.array([])
+        self.low = prices[starts] if len(prices) else np.array([])
+        self.high = prices[starts + counts - 1] if len(prices) else np.array([])
+        # Fuentes distintas por cluster: pares (cluster, fuente) únicos
+        source_codes, source_names = self._encode(sources)
+        pairs = np.unique(np.stack((cluster_ids, source_codes)), axis=1) if len(prices) else np.empty((2, 0), dtype=int)
+        self.scores = np.bincount(pairs[0], minlength=len(starts)) if len(prices) else np.array([], dtype=int)
+        self.members = counts
+        # np.unique deja los pares ordenados por cluster: se parten por sus fronteras
+        boundaries = np.cumsum(self.scores)[:-1] if len(prices) else []
+        self._sources = [[source_names[code] for code in codes] for codes in np.split(pairs[1], boundaries)]
+
+    @staticmethod
+    def _encode(sources: np.ndarray):
+        """Códigos enteros de las fuentes (para agrupar con numpy)"""
+        if not len(sources):
+            return np.array([], dtype=int), []
+        names, codes = np.unique(sources.astype(str), return_inverse=True)
+        return codes, [str(name) for name in names]
+
+    @classmethod
+    def from_sources(cls, levels: Dict[str, Iterable[Optional[float]]], tolerance: float) -> 'LevelIndex':
+        """Índice a partir de {fuente: niveles}; los niveles vacíos o nulos se ignoran"""
+        prices, sources = [], []
+        for source, values in levels.items():
+            for value in values:
+                if value:
+                    prices.append(float(value))
+                    sources.append(source)
+        return cls(prices, sources, tolerance)
+
+    def __len__(self) -> int:
+        return len(self.centers)
+
+    def cluster(self, position: int) -> Dict[str, Any]:
+        """Descripción serializable de un cluster"""
+        return {
+            'price': round(float(self.centers[position]), 2),
+            'low': round(float(self.low[position]), 2),
+            'high': round(float(self.high[position]), 2),
+            'score': int(self.scores[position]),
+            'members': int(self.members[position]),
+            'sources': self._sources[position]
+        }
+
+    def above(self, price: float, count: int = 3) -> List[Dict[str, Any]]:
+        """Los ``count`` clusters más cercanos con centro por encima de ``price``"""
+        start = int(np.searchsorted(self.centers, price, side='right'))
+        return [self.cluster(position) for position in range(start, min(start + count, len(self)))]
+
+    def below(self, price: float, count: int = 3) -> List[Dict[str, Any]]:
+        """Los ``count`` clusters más cercanos con centro por debajo de ``price`` (del más cercano al más lejano)"""
+        end = int(np.searchsorted(self.centers, price, side='left'))
+        return [self.cluster(position) for position in range(end - 1, max(end - count, 0) - 1, -1)]
+
+    def strongest(self, count: int = 5) -> List[Dict[str, Any]]:
+        """Clusters con más fuentes coincidentes (a igualdad, más niveles)"""
+        order = np.lexsort((-self.members, -self.scores))[:count]
+        return [self.cluster(int(position)) for position in order]
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Canal de actualizaciones en vivo (Server-Sent Events) para el dashboard
+Publica las barras de 1m nuevas o revisadas y los cambios de ``intraday_analysis['1m']``
+con el mismo formato de delta que el registro de snapshots
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from snapshot_log import diff_states
+from candle_patterns import scan_patterns
+
+logger = logging.getLogger(__name__)
+
+RESYNC_FRAME = b'event: resync\ndata: {}\n\n'
+STATE_EVENT = 'live_state'
+KEEPALIVE_FRAME = b': ping\n\n'
+
+
+class Subscriber:
+    """Cola acotada de eventos ya serializados para un cliente conectado"""
+
+    def __init__(self, max_queue: int):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def offer(self, frame: bytes) -> bool:
+        """Encolar sin bloquear; si el cliente no da abasto se vacía su cola y se le pide resincronizar"""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put_nowait(RESYNC_FRAME)
+            return False
+
+    def next_frame(self, timeout: float) -> Optional[bytes]:
+        """Siguiente evento o None si no llegó nada en ``timeout`` segundos"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Broadcaster:
+    """Difunde eventos a muchos suscriptores sin que un cliente lento frene al productor
+
+    Cada evento se serializa una sola vez. Se guardan los últimos ``history`` eventos para
+    que un cliente que se reconecta con ``Last-Event-ID`` reciba solo lo que se perdió; el
+    resto de clientes recibe primero el estado completo vigente (``live_state``), sobre el que
+    se encadenan los deltas siguientes.
+    """
+
+    def __init__(self, max_queue: int = 64, history: int = 256):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._history = deque(maxlen=history)
+        self._next_id = 1
+        self._current = None
+        self.active = threading.Event()
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def _current_frame(self) -> bytes:
+        """Estado completo vigente como evento sin ``id`` (no altera el Last-Event-ID del cliente)"""
+        payload = json.dumps(self._current, ensure_ascii=False, separators=(',', ':'))
+        return f"event: {STATE_EVENT}\ndata: {payload}\n\n".encode('utf-8')
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscriber:
+        """Registrar un cliente; si se reconecta, reenviar los eventos que se perdió
+
+        Si no puede reanudarse desde el historial recibe el estado completo vigente o, si aún
+        no lo hay, una petición de resincronizar.
+        """
+        subscriber = Subscriber(self.max_queue)
+        with self._lock:
+            resume = None
+            if last_event_id:
+                try:
+                    last_id = int(last_event_id)
+                except ValueError:
+                    last_id = None
+                missed = [frame for event_id, frame in self._history if last_id is not None and event_id > last_id]
+                oldest = self._history[0][0] if self._history else self._next_id
+                if last_id is not None and last_id + 1 >= oldest and len(missed) <= self.max_queue:
+                    resume = missed
+            if resume is not None:
+                for frame in resume:
+                    subscriber.offer(frame)
+            elif self._current is not None:
+                subscriber.offer(self._current_frame())
+            elif last_event_id:
+                subscriber.offer(RESYNC_FRAME)
+            self._subscribers.add(subscriber)
+            self.active.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers:
+                self.active.clear()
+
+    def publish(self, event: str, data: Dict[str, Any], current: Optional[Dict[str, Any]] = None) -> int:
+        """Enviar un evento a todos los suscriptores; devuelve su identificador
+
+        Con ``current`` se sustituye en el mismo paso el estado completo que recibirán los
+        clientes nuevos, de modo que ninguno obtiene un estado desfasado respecto a los deltas.
+        El diccionario no debe modificarse después: se serializa al suscribirse cada cliente.
+        """
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+            payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+            frame = f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode('utf-8')
+            self._history.append((event_id, frame))
+            if current is not None:
+                self._current = current
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            if not subscriber.offer(frame):
+                logger.warning(f"Suscriptor lento: cola llena, se le pide resincronizar ({subscriber.dropped})")
+        return event_id
+
+
+class LiveBarPoller:
+    """Consulta las barras de 1m mientras haya suscriptores y publica solo lo que cambió
+
+    Usa su propio ``NasdaqAnalyzer`` sin caché de barras para no competir con los análisis
+    completos. La referencia inicial es el archivo diario ya guardado y se publica completa
+    (``live_state``) al empezar cada día. Cada delta lleva la secuencia del estado sobre el que
+    se calculó (``base``) y la del resultante (``seq``): el cliente solo lo aplica si ``base``
+    coincide con la suya y, si no, se resincroniza.
+    """
+
+    def __init__(self, broadcaster: Broadcaster, analyzer=None, timeframe: str = '1m',
+                 poll_seconds: float = 5.0):
+        if analyzer is None:
+            from nasdaq_analyzer import NasdaqAnalyzer
+            analyzer = NasdaqAnalyzer()
+        self.analyzer = analyzer
+        self.analyzer.bar_cache_ttl = 0
+        self.broadcaster = broadcaster
+        self.timeframe = timeframe
+        self.poll_seconds = poll_seconds
+        self.day = None
+        self.seq = 0
+        self._state = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load_baseline(self, day: str) -> Dict[str, Any]:
+        """Estado de referencia: barras e indicadores del timeframe en el archivo diario"""
+        state = {'chart_data': {self.timeframe: []}, 'intraday_analysis': {self.timeframe: {}}}
+        filepath = os.path.join(self.analyzer.data_dir, f"{day}.json")
+        if os.path.exists(filepath):
+            try:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    analysis = json.load(f)
+                state['chart_data'][self.timeframe] = (analysis.get('chart_data') or {}).get(self.timeframe) or []
+                state['intraday_analysis'][self.timeframe] = (analysis.get('intraday_analysis') or {}).get(self.timeframe) or {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"No se pudo leer la referencia del stream en {filepath}: {e}")
+        return state
+
+    def poll_once(self) -> Optional[int]:
+        """Descargar las barras, calcular el delta y publicarlo. Devuelve el id del evento o None"""
+        day = datetime.now().strftime('%Y%m%d')
+        if day != self.day or self._state is None:
+            self.day = day
+            self._state = self.load_baseline(day)
+            self.seq += 1
+            state_payload = self.state_payload()
+            self.broadcaster.publish(STATE_EVENT, state_payload, current=state_payload)
+
+        data = self.analyzer.get_intraday_data(self.timeframe)
+        if data.empty:
+            return None
+        if self.timeframe == '1m':
+            # Solo en memoria: el archivo de la curva lo reescribe el análisis completo
+            self.analyzer.get_volume_curve().add_bars(data)
+
+        patterns = scan_patterns(data)
+        state = {
+            'chart_data': {self.timeframe: self.analyzer.format_bar_rows(data, patterns)},
+            'intraday_analysis': {
+                self.timeframe: self.analyzer.clean_nan_values(
+                    self.analyzer.calculate_intraday_indicators(data, self.timeframe, patterns))
+            }
+        }
+        delta = diff_states(self._state, state)
+        if not delta:
+            return None
+
+        # El estado se sustituye (nunca se modifica) para que el Broadcaster pueda serializarlo después
+        base = self.seq
+        self._state = state
+        self.seq += 1
+        return self.broadcaster.publish('delta', {
+            'day': day,
+            'timestamp': datetime.now().isoformat(),
+            'base': base,
+            'seq': self.seq,
+            'delta': delta
+        }, current=self.state_payload())
+
+    def state_payload(self) -> Dict[str, Any]:
+        """Estado completo vigente del stream con su secuencia"""
+        return {'day': self.day, 'seq': self.seq, 'state': self._state}
+
+    def run(self):
+        """Bucle del poller: inactivo mientras no haya suscriptores o el mercado esté cerrado"""
+        from analysis_daemon import market_phase
+
+        while not self._stop.is_set():
+            if not self.broadcaster.active.wait(timeout=self.poll_seconds):
+                continue
+            started = time.time()
+            if market_phase() != 'closed':
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    logger.warning(f"Error consultando barras en vivo: {e}")
+            self._stop.wait(max(0.0, self.poll_seconds - (time.time() - started)))
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='live-bars', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
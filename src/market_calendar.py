@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Calendario de negociación de NYSE y CME (futuros de índices) en hora de Nueva York
+Permite saber si pudo formarse alguna barra nueva entre dos instantes y evitar descargas inútiles
+"""
+
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+MARKET_TZ = ZoneInfo("America/New_York")
+
+NYSE_OPEN = time(9, 30)
+NYSE_CLOSE = time(16, 0)
+NYSE_EARLY_CLOSE = time(13, 0)
+
+# Margen tras el cierre en el que aún pueden llegar revisiones de la barra diaria
+NYSE_CLOSE_GRACE = timedelta(minutes=15)
+
+# Globex: domingo 18:00 a viernes 17:00 con pausa diaria de 17:00 a 18:00
+CME_DAILY_CLOSE = time(17, 0)
+CME_DAILY_OPEN = time(18, 0)
+
+# Cierres extraordinarios de NYSE (funerales de Estado)
+NYSE_SPECIAL_CLOSURES = {
+    date(2018, 12, 5),
+    date(2025, 1, 9),
+}
+
+
+def _easter(year: int) -> date:
+    """Domingo de Pascua (algoritmo gregoriano anónimo)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """n-ésimo día de la semana del mes (n=-1 para el último)"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(day: date) -> date:
+    """Festivo en sábado se traslada al viernes; en domingo, al lunes"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=None)
+def nyse_holidays(year: int) -> frozenset:
+    """Festivos de NYSE de un año"""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),           # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),           # Presidents' Day
+        _easter(year) - timedelta(days=2),     # Good Friday
+        _nth_weekday(year, 5, 0, -1),          # Memorial Day
+        _observed(date(year, 7, 4)),           # Independence Day
+        _nth_weekday(year, 9, 0, 1),           # Labor Day
+        _nth_weekday(year, 11, 3, 4),          # Thanksgiving
+        _observed(date(year, 12, 25)),         # Christmas
+    }
+    # Año Nuevo en sábado no se traslada al 31 de diciembre
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    holidays.update(day for day in NYSE_SPECIAL_CLOSURES if day.year == year)
+    return frozenset(holidays)
+
+
+@lru_cache(maxsize=None)
+def nyse_early_closes(year: int) -> frozenset:
+    """Sesiones de NYSE que cierran a las 13:00"""
+    candidates = [
+        date(year, 7, 3),                                   # Víspera de Independence Day
+        _nth_weekday(year, 11, 3, 4) + timedelta(days=1),   # Día después de Thanksgiving
+        date(year, 12, 24),                                 # Nochebuena
+    ]
+    holidays = nyse_holidays(year)
+    return frozenset(day for day in candidates if day.weekday() < 5 and day not in holidays)
+
+
+def is_nyse_trading_day(day: date) -> bool:
+    """True si NYSE abre ese día"""
+    return day.weekday() < 5 and day not in nyse_holidays(day.year)
+
+
+def nyse_session(day: date) -> Optional[Tuple[datetime, datetime]]:
+    """Apertura y cierre de NYSE para un día (hora de Nueva York) o None si no hay sesión"""
+    if not is_nyse_trading_day(day):
+        return None
+    close = NYSE_EARLY_CLOSE if day in nyse_early_closes(day.year) else NYSE_CLOSE
+    return (datetime.combine(day, NYSE_OPEN, MARKET_TZ), datetime.combine(day, close, MARKET_TZ))
+
+
+def _cme_full_closure(day: date) -> bool:
+    """Días sin sesión diurna de futuros de índices: Año Nuevo, Good Friday y Navidad"""
+    if day not in nyse_holidays(day.year):
+        return False
+    return (day.month, day.day) in ((1, 1), (1, 2), (12, 25), (12, 26)) or day == _easter(day.year) - timedelta(days=2)
+
+
+def cme_sessions(day: date) -> List[Tuple[datetime, datetime]]:
+    """Intervalos de negociación de Globex dentro de un día natural (hora de Nueva York)
+
+    Modelo conservador: se ignoran los cierres anticipados, de modo que ante la duda se
+    considera que el mercado pudo generar barras.
+    """
+    start_of_day = datetime.combine(day, time(0, 0), MARKET_TZ)
+    end_of_day = datetime.combine(day + timedelta(days=1), time(0, 0), MARKET_TZ)
+    daily_close = datetime.combine(day, CME_DAILY_CLOSE, MARKET_TZ)
+    daily_open = datetime.combine(day, CME_DAILY_OPEN, MARKET_TZ)
+    weekday = day.weekday()
+
+    sessions = []
+    # Tramo de madrugada a cierre diario (lunes a viernes)
+    if weekday < 5 and not _cme_full_closure(day):
+        sessions.append((start_of_day, daily_close))
+    # Reapertura vespertina para la sesión del día siguiente (domingo a jueves)
+    next_day = day + timedelta(days=1)
+    if (weekday == 6 or weekday < 4) and not (_cme_full_closure(next_day) and next_day.weekday() == 4):
+        sessions.append((daily_open, end_of_day))
+    return sessions
+
+
+def _to_market_time(moment) -> datetime:
+    """Aceptar epoch, datetime con zona o datetime naive (hora local del sistema)"""
+    if isinstance(moment, (int, float)):
+        return datetime.fromtimestamp(moment, MARKET_TZ)
+    if moment.tzinfo is None:
+        moment = moment.astimezone()
+    return moment.astimezone(MARKET_TZ)
+
+
+def market_open_between(calendar: str, start, end=None) -> bool:
+    """True si el mercado ('nyse' o 'cme') estuvo abierto en algún momento entre ``start`` y ``end``
+
+    Para NYSE se incluye un margen tras el cierre en el que aún puede revisarse la barra diaria.
+    """
+    start = _to_market_time(start)
+    end = _to_market_time(end if end is not None else datetime.now(MARKET_TZ))
+    if end <= start:
+        return False
+
+    day = start.date() - timedelta(days=1)
+    while day <= end.date():
+        if calendar == 'nyse':
+            session = nyse_session(day)
+            intervals = [(session[0], session[1] + NYSE_CLOSE_GRACE)] if session else []
+        elif calendar == 'cme':
+            intervals = cme_sessions(day)
+        else:
+            raise ValueError(f"Calendario desconocido: {calendar}")
+        for session_start, session_end in intervals:
+            if session_start < end and session_end > start:
+                return True
+        day += timedelta(days=1)
+    return False
+
+
+def calendar_for_symbol(symbol: str) -> str:
+    """Calendario que rige las barras de un símbolo: futuros en CME, el resto en NYSE"""
+    return 'cme' if symbol.endswith('=F') else 'nyse'
+
+
+def new_bars_possible(since, now=None) -> bool:
+    """True si NYSE o CME pudieron producir barras nuevas desde ``since``"""
+    return market_open_between('cme', since, now) or market_open_between('nyse', since, now)
+
+
+def stored_data_as_of(analysis: Dict[str, Any], timeframe: str = '1m') -> Optional[datetime]:
+    """Instante hasta el que llegan los datos de un análisis guardado
+
+    Se usa el final de la última barra de ``chart_data[timeframe]`` (hora de Nueva York) y, si
+    no hay barras, el timestamp de la ejecución.
+    """
+    rows = (analysis.get('chart_data') or {}).get(timeframe) or []
+    if rows and rows[-1].get('timestamp'):
+        last_bar = datetime.strptime(rows[-1]['timestamp'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=MARKET_TZ)
+        return last_bar + timedelta(minutes=1)
+    if analysis.get('timestamp'):
+        return _to_market_time(datetime.fromisoformat(analysis['timestamp']))
+    return None
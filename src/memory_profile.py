@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Perfil de memoria de una ejecución del análisis
+Registra el pico de RSS y una instantánea de tracemalloc al terminar cada etapa, atribuye los
+principales puntos de asignación a los métodos de los analizadores y comprueba un presupuesto
+de memoria por símbolo
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import bisect
+import json
+import os
+import sys
+import tracemalloc
+import logging
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple, Any
+
+from run_metrics import current_rss_mb, peak_rss_mb
+from pipeline_benchmark import PIPELINES, DEFAULT_FIXTURES, replay_fixtures, run_pipeline
+
+logger = logging.getLogger(__name__)
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos cuyos métodos reciben la atribución de las asignaciones
+ANALYZER_MODULES = ('nasdaq_analyzer.py', 'enhanced_analyzer.py')
+
+# Lo que asigna la propia instrumentación no se atribuye a la etapa
+INSTRUMENTATION_MODULES = ('memory_profile.py', 'run_metrics.py')
+
+# Presupuesto por símbolo: pico de memoria asignada (tracemalloc) durante una ejecución
+DEFAULT_BUDGET_MB = 256.0
+
+# Profundidad de las trazas de tracemalloc; basta para llegar desde pandas al método que llama
+TRACE_FRAMES = 20
+
+
+class MethodIndex:
+    """Traduce (archivo, línea) al método del analizador que contiene esa línea"""
+
+    def __init__(self, filenames=ANALYZER_MODULES):
+        self._ranges = {}
+        self._absolute = {}
+        for filename in filenames:
+            path = os.path.join(SRC_DIR, filename)
+            with open(path, 'r', encoding='utf-8') as f:
+                tree = ast.parse(f.read(), filename)
+            ranges = []
+            for node in tree.body:
+                if isinstance(node, ast.ClassDef):
+                    for item in node.body:
+                        if isinstance(item, ast.FunctionDef):
+                            ranges.append((item.lineno, item.end_lineno, f"{node.name}.{item.name}"))
+                elif isinstance(node, ast.FunctionDef):
+                    ranges.append((node.lineno, node.end_lineno, node.name))
+            ranges.sort()
+            self._ranges[path] = ([start for start, _, _ in ranges], ranges)
+
+    def absolute(self, filename: str) -> str:
+        """Las rutas de las trazas son relativas si el script se lanzó con una ruta relativa"""
+        if filename not in self._absolute:
+            self._absolute[filename] = os.path.abspath(filename)
+        return self._absolute[filename]
+
+    def method_for(self, traceback, instrumentation=frozenset()) -> Optional[str]:
+        """Método del analizador más cercano a la asignación (recorriendo la traza hacia fuera)
+
+        Devuelve ``''`` si antes de llegar al analizador aparece un archivo de ``instrumentation``.
+        """
+        for frame in reversed(traceback):
+            path = self.absolute(frame.filename)
+            if path in instrumentation:
+                return ''
+            entry = self._ranges.get(path)
+            if entry is None:
+                continue
+            starts, ranges = entry
+            position = bisect.bisect_right(starts, frame.lineno) - 1
+            if position >= 0 and ranges[position][1] >= frame.lineno:
+                return ranges[position][2]
+        return None
+
+
+class StageMemoryRecorder:
+    """Listener de ``RunMetrics``: instantánea de tracemalloc y RSS al terminar cada etapa"""
+
+    def __init__(self, top: int = 10):
+        self.top = top
+        self.index = MethodIndex()
+        self.instrumentation = {os.path.join(SRC_DIR, filename) for filename in INSTRUMENTATION_MODULES}
+        self.stages = []
+        self._previous = None
+
+    def __call__(self, name: str, record: Dict[str, Any]):
+        if not tracemalloc.is_tracing():
+            return
+        snapshot = tracemalloc.take_snapshot()
+        traced_current, _ = tracemalloc.get_traced_memory()
+        entry = {
+            'stage': name,
+            'rss_mb': current_rss_mb(),
+            'peak_rss_mb': peak_rss_mb(),
+            'traced_mb': round(traced_current / (1024 * 1024), 2),
+            'alloc_peak_kb': record.get('alloc_peak_kb'),
+            'alloc_net_kb': record.get('alloc_net_kb'),
+        }
+        if self._previous is not None:
+            entry['methods'], entry['sites'] = self.attribute(snapshot.compare_to(self._previous, 'traceback'))
+        self._previous = snapshot
+        self.stages.append(entry)
+
+    def attribute(self, differences) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Memoria retenida desde la etapa anterior, agrupada por método y por línea de origen"""
+        by_method = {}
+        sites = []
+        for difference in differences:
+            if difference.size_diff <= 0:
+                continue
+            method = self.index.method_for(difference.traceback, self.instrumentation)
+            if method == '':
+                continue
+            method = method or '(fuera de los analizadores)'
+            by_method[method] = by_method.get(method, 0) + difference.size_diff
+            frame = difference.traceback[-1]
+            sites.append({
+                'site': f"{os.path.relpath(frame.filename, SRC_DIR) if frame.filename.startswith(SRC_DIR) else frame.filename}:{frame.lineno}",
+                'method': method,
+                'kb': round(difference.size_diff / 1024, 1),
+                'blocks': difference.count_diff
+            })
+
+        methods = [{'method': method, 'kb': round(size / 1024, 1)}
+                   for method, size in sorted(by_method.items(), key=lambda item: item[1], reverse=True)]
+        sites.sort(key=lambda site: site['kb'], reverse=True)
+        return methods[:self.top], sites[:self.top]
+
+
+def profile_run(pipeline: str, fixtures_dir: Optional[str] = None, top: int = 10) -> Dict[str, Any]:
+    """Una ejecución con tracemalloc activo; con ``fixtures_dir`` se reproduce sin red"""
+    recorder = StageMemoryRecorder(top)
+    with replay_fixtures(fixtures_dir) if fixtures_dir else nullcontext():
+        # Una ejecución sin trazar importa pandas, sklearn, etc.: si no, sus módulos dominarían
+        # las instantáneas y el perfil tardaría minutos
+        run_pipeline(pipeline)
+        rss_before = current_rss_mb()
+        tracemalloc.start(TRACE_FRAMES)
+        try:
+            recorder(' inicio', {})
+            result = run_pipeline(pipeline, [recorder])
+            _, traced_peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'pipeline': pipeline,
+        'rss_before_mb': rss_before,
+        'peak_rss_mb': peak_rss_mb(),
+        'traced_peak_mb': round(traced_peak / (1024 * 1024), 2),
+        'stages': [stage for stage in recorder.stages if stage['stage'] != ' inicio'],
+        'total_ms': result['metrics']['total']['wall_ms']
+    }
+
+
+def print_report(report: Dict[str, Any], budget_mb: float, top: int):
+    """Memoria por etapa y métodos del analizador que más retienen"""
+    within = report['traced_peak_mb'] <= budget_mb
+    status = '✅' if within else '❌'
+    print(f"\n{status} {report['pipeline']}: pico asignado {report['traced_peak_mb']:.1f} MB "
+          f"(presupuesto {budget_mb:.0f} MB), RSS {report['rss_before_mb']} -> pico {report['peak_rss_mb']} MB")
+    print(f"   {'etapa':<16} {'RSS MB':>8} {'asignado MB':>12} {'pico etapa KB':>14} {'neto KB':>9}")
+    for stage in report['stages']:
+        peak = stage['alloc_peak_kb'] if stage['alloc_peak_kb'] is not None else '-'
+        net = stage['alloc_net_kb'] if stage['alloc_net_kb'] is not None else '-'
+        print(f"   {stage['stage']:<16} {stage['rss_mb'] or '-':>8} {stage['traced_mb']:>12.2f} {peak:>14} {net:>9}")
+
+    totals = {}
+    for stage in report['stages']:
+        for entry in stage.get('methods', []):
+            totals[entry['method']] = totals.get(entry['method'], 0) + entry['kb']
+    print(f"\n   Memoria retenida por método (suma de etapas, top {top}):")
+    for method, kb in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"   {kb:>10.1f} KB  {method}")
+
+
+def main():
+    """Herramienta de línea de comandos del perfil de memoria"""
+    parser = argparse.ArgumentParser(description='Perfil de memoria por etapa de una ejecución del análisis')
+    parser.add_argument('--pipeline', choices=PIPELINES, default='daily')
+    parser.add_argument('--fixtures', nargs='?', const=DEFAULT_FIXTURES, default=None,
+                        help='Reproducir grabaciones en lugar de usar la red (ver pipeline_benchmark.py)')
+    parser.add_argument('--top', type=int, default=10, help='Métodos y líneas a mostrar por etapa')
+    parser.add_argument('--budget-mb', type=float, default=DEFAULT_BUDGET_MB,
+                        help=f'Presupuesto de memoria asignada por símbolo (por defecto {DEFAULT_BUDGET_MB:.0f} MB)')
+    parser.add_argument('--check', action='store_true',
+                        help='Salir con código 1 si se supera el presupuesto')
+    parser.add_argument('--json', metavar='ARCHIVO', help='Guardar el informe completo en JSON')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        report = profile_run(args.pipeline, args.fixtures, args.top)
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print_report(report, args.budget_mb, args.top)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Informe guardado en {args.json}")
+
+    if args.check and report['traced_peak_mb'] > args.budget_mb:
+        print(f"❌ Presupuesto de memoria superado ({report['traced_peak_mb']:.1f} MB > {args.budget_mb:.0f} MB)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,45 +5,182 @@ NASDAQ 100 Technical Analysis Script
 Ejecuta análisis técnico diario del NASDAQ 100 y guarda los resultados en JSON
 """
 
+from __future__ import annotations
+
 import json
 import os
-import requests
+import shutil
 from datetime import datetime, timedelta
-import yfinance as yf
-import pandas as pd
-import numpy as np
-from bs4 import BeautifulSoup
 import time
 import logging
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Set, Tuple
 import re
 from urllib.parse import urljoin, urlparse
 import math
 
+# Dependencias pesadas: se cargan en la primera etapa que las usa, no al importar el módulo
+from lazy_imports import lazy_import
+requests = lazy_import('requests')
+yf = lazy_import('yfinance')
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+bs4 = lazy_import('bs4')
+
+from storage import (write_json_atomic, update_history_manifest, write_last_update,
+                     market_content_hash, previous_market_hash, news_content_hash)
+from snapshot_log import SnapshotLog, compact_stale_logs, write_delta_payload, prune_delta_payloads
+from stages import resolve_stages, load_previous_analysis, carry_over_sections, build_stage_parser
+from market_calendar import market_open_between, calendar_for_symbol, new_bars_possible, stored_data_as_of
+from run_metrics import RunMetrics, measure, append_metrics_log
+from stage_cache import StageCache, stage_cache_dir
+from anchored_vwap import VWAPAccumulator, anchored_vwaps, trailing_anchors
+from volume_profile import ProfileBook, DEFAULT_TICK_SIZE, ROLLING_SESSIONS, profile_levels
+from level_index import LevelIndex, level_tolerance
+from volume_curve import (VolumeCurve, volume_curve_path, stored_minute_bars, TIMEFRAME_MINUTES,
+                          SPIKE_RVOL)
+from volatility import volatility_summary, realized_volatility, stop_distance, REFERENCE_WINDOW
+from similar_days import FeatureStore, SimilarDayIndex, similar_days_path
+from percentile_ranks import PercentileHistory, percentile_history_path, ranked_values, INTRADAY_INDICATORS
+from candle_patterns import scan_patterns, latest_patterns, bar_patterns
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Etapas seleccionables con --only/--skip y secciones del archivo diario que produce cada una
+STAGE_SECTIONS = {
+    'indicators': ('yesterday_data', 'technical_indicators', 'trend_analysis', 'daily_levels'),
+    'probabilistic': ('probabilistic_analysis',),
+    'vix': ('vix_detailed_analysis',),
+    'tick': ('tick_index_analysis',),
+    'tape': ('tape_trading_metrics',),
+    'vwap': ('vwap_multi_timeframe',),
+    'intraday': ('intraday_analysis', 'chart_data'),
+    'volume_profile': ('volume_profile',),
+    'similar_days': ('similar_days',),
+    'news': ('news',)
+}
+STAGE_DEPENDENCIES = {'probabilistic': ('indicators',), 'similar_days': ('indicators',)}
+
+# Temporalidades de la etapa 'intraday' (una entrada de chart_data por cada una)
+INTRADAY_TIMEFRAMES = ('1m', '5m', '15m', '4h', '1d')
+
+# Clusters de confluencia a cada lado del precio en los niveles diarios
+CONFLUENCE_LEVELS = 3
+
+# Percentiles frente al historial del propio indicador que cuentan como extremo y como compresión
+EXTREME_PERCENTILE = 95
+SQUEEZE_PERCENTILE = 10
+
+# Versiones del registro intradía entre dos reescrituras completas del archivo diario (por debajo
+# de los 20 deltas pendientes a partir de los que el dashboard recarga el archivo)
+SNAPSHOT_CHECKPOINT_INTERVAL = 8
+
 class NasdaqAnalyzer:
     def __init__(self):
         self.symbol = "^NDX"  # NASDAQ 100 Index
         self.data_dir = "data"
+        self.snapshot_dir = os.path.join(self.data_dir, "snapshots")
+        self.delta_dir = os.path.join(self.data_dir, "deltas")
+        self.metrics_dir = os.path.join(self.data_dir, "metrics")
+        self.last_save_changed = True
         self.ensure_data_directory()
         
+        # Estado reutilizable entre ejecuciones dentro del mismo proceso (modo daemon)
+        self.bar_cache_ttl = 60  # segundos que una descarga de barras se considera vigente
+        self._bar_cache = {}
+        self._model_cache = {}
+        # Perfiles de volumen por temporalidad, actualizados solo con las barras nuevas
+        self._profile_books = {}
+        # Curvas de volumen por minuto de la sesión, por símbolo (ver volume_curve.py)
+        self.volume_curves = {}
+        # Índice de días similares, sincronizado con los archivos diarios (ver similar_days.py)
+        self._similar_days = None
+        # Arrays ordenados del historial de cada indicador (ver percentile_ranks.py)
+        self._percentile_history = None
+        # Con False el historial no se sincroniza con el directorio de datos (p. ej. los procesos
+        # del backfill, que reciben una copia fija construida antes de repartir los días)
+        self.percentile_sync = True
+        self._session = None
+        # Con el mercado cerrado desde la última descarga no se vuelve a descargar nada
+        self.freshness_gate = True
+        # Métricas por etapa de la ejecución en curso (ver run_metrics.py)
+        self.metrics = None
+        self.metrics_listeners = []
+        # Resultados de etapas deterministas reutilizados mientras sus entradas no cambien
+        self.stage_cache = StageCache(stage_cache_dir(self.data_dir))
+        # Eventos con fecha (nombre -> fecha, p. ej. resultados de los componentes principales)
+        # desde los que anclar VWAP además de sesión, semana, huecos y swings
+        self.vwap_events = {}
+        
+    @property
+    def session(self):
+        """Sesión HTTP reutilizable; se crea (e importa requests) en el primer uso"""
+        if self._session is None:
+            self._session = requests.Session()
+            self._session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            })
+            self._session.hooks['response'].append(self._count_response_bytes)
+        return self._session
+    
+    def _count_response_bytes(self, response, *args, **kwargs):
+        """Sumar el cuerpo de cada respuesta HTTP a la etapa en curso"""
+        if self.metrics is not None:
+            self.metrics.add_bytes(len(response.content))
+    
     def ensure_data_directory(self):
         """Crear directorio data si no existe"""
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
             logger.info(f"Directorio {self.data_dir} creado")
     
-    def get_market_data(self, days_back: int = 30) -> pd.DataFrame:
-        """Obtener datos históricos del NASDAQ 100"""
+    def get_cached_history(self, cache_key: tuple, fetch) -> pd.DataFrame:
+        """Devolver barras de la caché en memoria si siguen vigentes; si no, descargarlas con ``fetch``
+        
+        Evita descargar varias veces las mismas barras en una ejecución (p. ej. las de 1m) y
+        mantiene los datos calientes entre ejecuciones del daemon. El primer elemento de
+        ``cache_key`` es el símbolo: si su mercado no ha abierto desde la descarga anterior,
+        las barras en caché siguen siendo las últimas aunque haya vencido el TTL.
+        """
+        cached = self._bar_cache.get(cache_key)
+        if cached is not None:
+            fetched_at, data = cached
+            if time.time() - fetched_at < self.bar_cache_ttl:
+                return data
+            if self.freshness_gate and not market_open_between(calendar_for_symbol(cache_key[0]), fetched_at):
+                return data
+        
+        data = fetch()
+        if self.metrics is not None:
+            self.metrics.add_frame(data)
+        self.prime_history(cache_key, data)
+        return data
+    
+    def memoized(self, stage: str, func, *inputs):
+        """``func(*inputs)`` a través de la caché de etapas (sin caché si ``stage_cache`` es None)"""
+        if self.stage_cache is None:
+            return func(*inputs)
+        return self.stage_cache.get_or_compute(stage, func, inputs)
+    
+    def prime_history(self, cache_key: tuple, data: pd.DataFrame):
+        """Guardar en la caché barras obtenidas por otro camino (p. ej. recortadas de un rango mayor)"""
+        if data is not None and not data.empty:
+            self._bar_cache[cache_key] = (time.time(), data)
+    
+    def get_market_data(self, days_back: int = 45) -> pd.DataFrame:
+        """Obtener datos históricos del NASDAQ 100
+
+        45 días naturales dan unas 30 sesiones: la ventana de referencia de volatilidad (20 barras)
+        necesita al menos 21 aunque haya festivos o falte la barra del primer día.
+        """
         try:
             ticker = yf.Ticker(self.symbol)
             end_date = datetime.now()
             start_date = end_date - timedelta(days=days_back)
             
-            data = ticker.history(start=start_date, end=end_date)
+            data = self.get_cached_history((self.symbol, 'market', days_back),
+                                           lambda: ticker.history(start=start_date, end=end_date))
             logger.info(f"Datos obtenidos para {len(data)} días")
             return data
         except Exception as e:
@@ -60,7 +197,7 @@ class NasdaqAnalyzer:
         try:
             # Usar NQ=F (NASDAQ 100 Futures) para datos intradía que son más similares a TradingView US 100 Cash CFD
             # NQ=F proporciona valores en el rango de 21,000+ similar a TradingView
-            symbol = "NQ=F" if self.symbol == "^NDX" else self.symbol
+            symbol = self.intraday_symbol()
             
             # Ajustar período según el intervalo para obtener suficientes datos
             if interval in ["1m", "2m", "5m"]:
@@ -73,7 +210,8 @@ class NasdaqAnalyzer:
                 period = "1y"
             
             ticker = yf.Ticker(symbol)
-            data = ticker.history(period=period, interval=interval)
+            data = self.get_cached_history((symbol, interval, period),
+                                           lambda: ticker.history(period=period, interval=interval))
             
             if data.empty:
                 logger.warning(f"No se pudieron obtener datos intradía para {interval}")
@@ -120,6 +258,25 @@ class NasdaqAnalyzer:
             logger.error(f"Error preparando datos para gráfico: {e}")
             return {}
     
+    def format_bar_rows(self, data: pd.DataFrame, patterns: Optional[pd.DataFrame] = None) -> List[Dict[str, Any]]:
+        """Convertir barras OHLCV al formato simple de ``chart_data`` (también usado por el stream en vivo)
+        
+        Con ``patterns`` (de ``scan_patterns``) las barras marcadas llevan la lista de sus patrones.
+        """
+        rows = [{
+            'timestamp': dt.strftime('%Y-%m-%d %H:%M:%S'),
+            'open': float(row['Open']),
+            'high': float(row['High']),
+            'low': float(row['Low']),
+            'close': float(row['Close']),
+            'volume': int(row['Volume'])
+        } for dt, row in data.iterrows()]
+        if patterns is not None:
+            for row, names in zip(rows, bar_patterns(patterns)):
+                if names:
+                    row['patterns'] = names
+        return rows
+    
     def calculate_technical_indicators(self, data: pd.DataFrame) -> Dict[str, Any]:
         """Calcular indicadores técnicos avanzados"""
         if data.empty:
@@ -302,12 +459,16 @@ class NasdaqAnalyzer:
                 'atr': float(atr.iloc[-1]) if not atr.empty else None,
                 'volatility_high': int(float(atr.iloc[-1]) > float(atr.rolling(window=20).mean().iloc[-1])) if not atr.empty else 0,
                 'volatility_std': float(volatility_std) if volatility_std else 0,
+                'volatility_estimators': volatility_summary(data, '1d'),
                 'daily_range_pct': float(daily_range_pct) if daily_range_pct else 0,
                 
                 # Análisis de Gaps - NUEVO
                 'gaps_detected': len(gaps),
                 'gap_info': gaps[0] if gaps else None,
                 
+                # Velas y estructura de swings de las barras diarias
+                'candle_patterns': latest_patterns(data),
+                
                 # Volumen - CORREGIDO: RVOL y nuevos indicadores
                 'rvol': float(rvol) if rvol else 1,  # NUEVO: Relative Volume
                 'volume_above_average': int(volume_above_average),  # CORREGIDO: basado en RVOL > 1.5
@@ -338,8 +499,6 @@ class NasdaqAnalyzer:
             return {}
         
         try:
-            from sklearn.linear_model import LinearRegression
-            from sklearn.preprocessing import StandardScaler
             import warnings
             warnings.filterwarnings('ignore')
             
@@ -389,65 +548,7 @@ class NasdaqAnalyzer:
             if len(features) < 3:
                 return {'error': 'Insuficientes features para análisis probabilístico'}
             
-            # Crear datos históricos para entrenamiento (simulado)
-            # En producción, esto usaría datos históricos reales
-            np.random.seed(42)  # Para reproducibilidad
-            n_samples = 100
-            
-            # Generar datos sintéticos basados en los features actuales
-            X_train = []
-            y_train = []
-            
-            for i in range(n_samples):
-                # Generar variaciones de los features actuales
-                sample_features = []
-                for j, feature in enumerate(features):
-                    if feature_names[j] == 'rsi':
-                        sample_features.append(np.random.normal(feature, 10))
-                    elif feature_names[j] == 'macd':
-                        sample_features.append(np.random.normal(feature, feature * 0.2))
-                    elif feature_names[j] == 'obv_trend':
-                        sample_features.append(np.random.choice([-1, 0, 1]))
-                    elif feature_names[j] == 'price_vs_sma20':
-                        sample_features.append(np.random.normal(feature, 2))
-                    elif feature_names[j] == 'adx':
-                        sample_features.append(np.random.normal(feature, 5))
-                    elif feature_names[j] == 'volume_ratio':
-                        sample_features.append(np.random.normal(feature, 0.3))
-                    else:
-                        sample_features.append(np.random.normal(feature, feature * 0.1))
-                
-                X_train.append(sample_features)
-                
-                # Generar target basado en lógica de trading
-                rsi_val = sample_features[0] if 'rsi' in feature_names else 50
-                macd_val = sample_features[1] if 'macd' in feature_names else 0
-                obv_val = sample_features[2] if 'obv_trend' in feature_names else 0
-                
-                # Lógica simplificada para determinar ruptura
-                bullish_score = 0
-                if rsi_val < 30: bullish_score += 2
-                elif rsi_val < 50: bullish_score += 1
-                if macd_val > 0: bullish_score += 1
-                if obv_val > 0: bullish_score += 1
-                
-                # 1 = ruptura alcista, 0 = neutral, -1 = ruptura bajista
-                if bullish_score >= 3:
-                    y_train.append(1)
-                elif bullish_score <= 1:
-                    y_train.append(-1)
-                else:
-                    y_train.append(0)
-            
-            X_train = np.array(X_train)
-            y_train = np.array(y_train)
-            
-            # Entrenar modelo
-            scaler = StandardScaler()
-            X_train_scaled = scaler.fit_transform(X_train)
-            
-            model = LinearRegression()
-            model.fit(X_train_scaled, y_train)
+            scaler, model, model_score = self.fit_probabilistic_model(features, feature_names)
             
             # Predecir con features actuales
             current_features = np.array(features).reshape(1, -1)
@@ -474,7 +575,7 @@ class NasdaqAnalyzer:
                 'bearish_probability': round(bearish_prob, 1),
                 'prediction_confidence': round(abs(prediction) * 100, 1),
                 'features_used': feature_names,
-                'model_score': round(model.score(X_train_scaled, y_train), 3)
+                'model_score': model_score
             }
             
         except ImportError:
@@ -483,8 +584,91 @@ class NasdaqAnalyzer:
             logger.error(f"Error en análisis probabilístico: {e}")
             return {'error': str(e)}
     
-    def calculate_intraday_indicators(self, data: pd.DataFrame, timeframe: str = '1m') -> Dict[str, Any]:
-        """Calcular indicadores técnicos específicos para temporalidades bajas"""
+    def fit_probabilistic_model(self, features: List[float], feature_names: List[str]):
+        """Ajustar el modelo lineal sobre muestras sintéticas alrededor de los features actuales
+        
+        Devuelve (scaler, modelo, score). El resultado se memoriza por features, de modo que un
+        proceso residente no reentrena mientras los indicadores diarios no cambien.
+        """
+        from sklearn.linear_model import LinearRegression
+        from sklearn.preprocessing import StandardScaler
+        
+        model_key = (tuple(feature_names), tuple(round(float(f), 6) for f in features))
+        if model_key in self._model_cache:
+            return self._model_cache[model_key]
+        
+        # Crear datos históricos para entrenamiento (simulado)
+        # En producción, esto usaría datos históricos reales
+        np.random.seed(42)  # Para reproducibilidad
+        n_samples = 100
+        
+        # Generar datos sintéticos basados en los features actuales
+        X_train = []
+        y_train = []
+        
+        for i in range(n_samples):
+            # Generar variaciones de los features actuales
+            sample_features = []
+            for j, feature in enumerate(features):
+                if feature_names[j] == 'rsi':
+                    sample_features.append(np.random.normal(feature, 10))
+                elif feature_names[j] == 'macd':
+                    sample_features.append(np.random.normal(feature, feature * 0.2))
+                elif feature_names[j] == 'obv_trend':
+                    sample_features.append(np.random.choice([-1, 0, 1]))
+                elif feature_names[j] == 'price_vs_sma20':
+                    sample_features.append(np.random.normal(feature, 2))
+                elif feature_names[j] == 'adx':
+                    sample_features.append(np.random.normal(feature, 5))
+                elif feature_names[j] == 'volume_ratio':
+                    sample_features.append(np.random.normal(feature, 0.3))
+                else:
+                    sample_features.append(np.random.normal(feature, feature * 0.1))
+            
+            X_train.append(sample_features)
+            
+            # Generar target basado en lógica de trading
+            rsi_val = sample_features[0] if 'rsi' in feature_names else 50
+            macd_val = sample_features[1] if 'macd' in feature_names else 0
+            obv_val = sample_features[2] if 'obv_trend' in feature_names else 0
+            
+            # Lógica simplificada para determinar ruptura
+            bullish_score = 0
+            if rsi_val < 30: bullish_score += 2
+            elif rsi_val < 50: bullish_score += 1
+            if macd_val > 0: bullish_score += 1
+            if obv_val > 0: bullish_score += 1
+            
+            # 1 = ruptura alcista, 0 = neutral, -1 = ruptura bajista
+            if bullish_score >= 3:
+                y_train.append(1)
+            elif bullish_score <= 1:
+                y_train.append(-1)
+            else:
+                y_train.append(0)
+        
+        X_train = np.array(X_train)
+        y_train = np.array(y_train)
+        
+        # Entrenar modelo
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(X_train)
+        
+        model = LinearRegression()
+        model.fit(X_train_scaled, y_train)
+        
+        fitted = (scaler, model, round(model.score(X_train_scaled, y_train), 3))
+        if len(self._model_cache) >= 8:
+            self._model_cache.pop(next(iter(self._model_cache)))
+        self._model_cache[model_key] = fitted
+        return fitted
+    
+    def calculate_intraday_indicators(self, data: pd.DataFrame, timeframe: str = '1m',
+                                      patterns: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+        """Calcular indicadores técnicos específicos para temporalidades bajas
+        
+        ``patterns`` reutiliza un escaneo de ``scan_patterns`` ya hecho sobre ``data``.
+        """
         if data.empty:
             return {}
         
@@ -610,9 +794,26 @@ class NasdaqAnalyzer:
             volume_sma = data['Volume'].rolling(window=20).mean()
             volume_ratio = data['Volume'] / volume_sma
             
+            # Volumen relativo a la misma hora de la sesión (None sin curva o sin referencia)
+            rvol_time_of_day = None
+            expected_volume = None
+            if timeframe in TIMEFRAME_MINUTES:
+                try:
+                    curve = self.get_volume_curve()
+                    expected = curve.expected_volume(data.index[-1:], TIMEFRAME_MINUTES[timeframe])[0]
+                    if expected > 0:
+                        expected_volume = float(expected)
+                        rvol_time_of_day = float(data['Volume'].iloc[-1] / expected)
+                except Exception as e:
+                    logger.warning(f"No se pudo calcular el RVOL por hora para {timeframe}: {e}")
+            
             # Señales de trading específicas para scalping
             current_price = data['Close'].iloc[-1]
             
+            # Volatilidad de la temporalidad y distancia de stop (ATR o desviación por barra)
+            volatility = volatility_summary(data, timeframe, windows=(REFERENCE_WINDOW,))
+            stop = stop_distance(atr.iloc[-1] if not atr.empty else None, volatility.get('bar_sigma'), current_price)
+            
             # Señal de cruce de EMAs
             ema_bullish_cross = (ema_fast_line.iloc[-1] > ema_slow_line.iloc[-1] and 
                                ema_fast_line.iloc[-2] <= ema_slow_line.iloc[-2])
@@ -692,8 +893,10 @@ class NasdaqAnalyzer:
                 
                 # ATR para stop loss
                 'atr': float(atr.iloc[-1]) if not atr.empty else None,
-                'atr_stop_long': float(current_price - (atr.iloc[-1] * 1.5)) if not atr.empty else None,
-                'atr_stop_short': float(current_price + (atr.iloc[-1] * 1.5)) if not atr.empty else None,
+                'atr_stop_long': float(current_price - stop) if stop else None,
+                'atr_stop_short': float(current_price + stop) if stop else None,
+                'volatility_estimators': volatility,
+                'realized_volatility': realized_volatility(data) if timeframe == '1m' else {},
                 
                 # Stochastic
                 'stoch_k': float(k_percent.iloc[-1]) if not k_percent.empty else None,
@@ -711,7 +914,11 @@ class NasdaqAnalyzer:
                 
                 # Volumen
                 'volume_ratio': float(volume_ratio.iloc[-1]) if not volume_ratio.empty else None,
-                'volume_spike': int(volume_ratio.iloc[-1] > 2) if not volume_ratio.empty else 0,
+                'rvol_time_of_day': rvol_time_of_day,
+                'expected_volume': expected_volume,
+                # Pico frente a la misma hora de otras sesiones; sin curva, frente a las últimas 20 barras
+                'volume_spike': (int(rvol_time_of_day > SPIKE_RVOL) if rvol_time_of_day is not None
+                                 else int(volume_ratio.iloc[-1] > 2) if not volume_ratio.empty else 0),
                 
                 # Datos actuales
                 'current_price': float(current_price),
@@ -726,7 +933,10 @@ class NasdaqAnalyzer:
                 # Señales de scalping
                 'scalp_buy_signal': int(scalp_buy_signal),
                 'scalp_sell_signal': int(scalp_sell_signal),
-                'range_trading': int(bb_squeeze)
+                'range_trading': int(bb_squeeze),
+                
+                # Velas y estructura de swings
+                'candle_patterns': latest_patterns(data, patterns)
             }
             
             return result
@@ -760,9 +970,9 @@ class NasdaqAnalyzer:
             
             for url in nasdaq_urls:
                 try:
-                    response = requests.get(url, headers=headers, timeout=10)
+                    response = self.session.get(url, headers=headers, timeout=10)
                     if response.status_code == 200:
-                        soup = BeautifulSoup(response.content, 'html.parser')
+                        soup = bs4.BeautifulSoup(response.content, 'html.parser')
                         
                         # Buscar artículos con selectores más específicos
                         articles = soup.find_all(['article', 'div'], class_=re.compile(r'.*article.*|.*news.*|.*story.*|.*item.*', re.I))
@@ -820,10 +1030,10 @@ class NasdaqAnalyzer:
         # Fuente 2: FinancialJuice
         try:
             logger.info("Obteniendo noticias de FinancialJuice...")
-            response = requests.get('https://www.financialjuice.com/home', 
-                                  headers=headers, timeout=10)
+            response = self.session.get('https://www.financialjuice.com/home', 
+                                        headers=headers, timeout=10)
             if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
+                soup = bs4.BeautifulSoup(response.content, 'html.parser')
                 
                 # Buscar contenido de noticias financieras
                 articles = soup.find_all(['div', 'article', 'section'], class_=re.compile(r'.*news.*|.*article.*|.*post.*', re.I))
@@ -868,7 +1078,7 @@ class NasdaqAnalyzer:
         try:
             # Obtener datos del VIX para sentimiento del mercado
             vix_ticker = yf.Ticker("^VIX")
-            vix_data = vix_ticker.history(period="5d")
+            vix_data = self.get_cached_history(("^VIX", "1d", "5d"), lambda: vix_ticker.history(period="5d"))
             
             if not vix_data.empty:
                 current_vix = vix_data['Close'].iloc[-1]
@@ -916,9 +1126,9 @@ class NasdaqAnalyzer:
                 }
             ]
             
-            # Agregar un evento aleatorio
-            import random
-            selected_event = random.choice(economic_events)
+            # Un evento por día, fijo dentro del día: un sorteo en cada ejecución cambiaría las
+            # noticias sin titulares nuevos y forzaría reescrituras, commits y redespliegues
+            selected_event = economic_events[datetime.now().date().toordinal() % len(economic_events)]
             selected_event['timestamp'] = datetime.now().isoformat()
             news.append(selected_event)
             
@@ -943,11 +1153,11 @@ class NasdaqAnalyzer:
         try:
             # Obtener datos del VIX
             vix_ticker = yf.Ticker("^VIX")
-            vix_data = vix_ticker.history(period="60d")  # 60 días para percentiles
+            vix_data = self.get_cached_history(("^VIX", "1d", "60d"), lambda: vix_ticker.history(period="60d"))  # 60 días para percentiles
             
             # Obtener datos del SPX para ratio SPX/VIX
             spx_ticker = yf.Ticker("^GSPC")
-            spx_data = spx_ticker.history(period="5d")
+            spx_data = self.get_cached_history(("^GSPC", "1d", "5d"), lambda: spx_ticker.history(period="5d"))
             
             if vix_data.empty:
                 return {'error': 'No se pudieron obtener datos del VIX'}
@@ -960,6 +1170,9 @@ class NasdaqAnalyzer:
             # Calcular percentil de 30 días
             vix_30d_data = vix_data['Close'].tail(30)
             vix_30d_percentile = (vix_30d_data < current_vix).sum() / len(vix_30d_data) * 100
+            # Percentil frente a todos los días guardados (None hasta tener historial suficiente)
+            vix_history_percentile = self.rank_indicators(
+                'vix', {'vix_value': float(current_vix)}, vix_data.index[-1]).get('vix_value')
             
             # Clasificar sentimiento
             if current_vix > 30:
@@ -987,6 +1200,7 @@ class NasdaqAnalyzer:
                 'vix_change_1d': float(vix_change_1d),
                 'vix_change_1d_pct': float(vix_change_1d_pct),
                 'vix_30d_percentile': float(vix_30d_percentile),
+                'vix_history_percentile': vix_history_percentile,
                 'sentiment': sentiment,
                 'sentiment_score': sentiment_score,
                 'spx_vix_ratio': float(spx_vix_ratio) if spx_vix_ratio else None,
@@ -1012,7 +1226,7 @@ class NasdaqAnalyzer:
             for symbol in nasdaq_symbols:
                 try:
                     ticker = yf.Ticker(symbol)
-                    data = ticker.history(period="2d")
+                    data = self.get_cached_history((symbol, "1d", "2d"), lambda: ticker.history(period="2d"))
                     
                     if len(data) >= 2:
                         current_close = data['Close'].iloc[-1]
@@ -1127,7 +1341,12 @@ class NasdaqAnalyzer:
     
     def calculate_vwap_multi_timeframe(self, data_1m: pd.DataFrame = None, data_5m: pd.DataFrame = None, 
                                       data_15m: pd.DataFrame = None, data_4h: pd.DataFrame = None) -> Dict[str, Any]:
-        """Calcular VWAP para múltiples marcos temporales"""
+        """Calcular VWAP para múltiples marcos temporales
+        
+        ``vwap_{tf}`` es el VWAP desde el inicio de la ventana descargada; ``anchored[tf]`` añade
+        los VWAP con bandas de ±1σ/±2σ desde la sesión, la semana, el último hueco y los últimos
+        swings, todos a partir de las mismas sumas acumuladas (ver ``anchored_vwap.py``).
+        """
         try:
             # Obtener datos si no se proporcionan
             if data_1m is None:
@@ -1139,7 +1358,7 @@ class NasdaqAnalyzer:
             if data_4h is None:
                 data_4h = self.get_intraday_data('4h')
             
-            vwap_results = {}
+            vwap_results = {'anchored': {}}
             
             timeframes = {
                 '1m': data_1m,
@@ -1154,17 +1373,18 @@ class NasdaqAnalyzer:
                     vwap_results[f'vwap_{tf}_distance'] = None
                     continue
                 
-                # Calcular VWAP
-                typical_price = (data['High'] + data['Low'] + data['Close']) / 3
-                vwap = (typical_price * data['Volume']).cumsum() / data['Volume'].cumsum()
-                
-                current_price = data['Close'].iloc[-1]
-                current_vwap = vwap.iloc[-1]
-                vwap_distance = ((current_price - current_vwap) / current_vwap) * 100
+                # Calcular VWAP desde todos los anclajes en una pasada
+                anchored = anchored_vwaps(data, events=self.vwap_events)
+                window = anchored.get('window')
+                if window is None:
+                    vwap_results[f'vwap_{tf}'] = None
+                    vwap_results[f'vwap_{tf}_distance'] = None
+                    continue
                 
-                vwap_results[f'vwap_{tf}'] = float(current_vwap)
-                vwap_results[f'vwap_{tf}_distance'] = float(vwap_distance)
-                vwap_results[f'price_above_vwap_{tf}'] = int(current_price > current_vwap)
+                vwap_results[f'vwap_{tf}'] = window['vwap']
+                vwap_results[f'vwap_{tf}_distance'] = window['distance_pct']
+                vwap_results[f'price_above_vwap_{tf}'] = int(window['distance_pct'] > 0)
+                vwap_results['anchored'][tf] = anchored
             
             return vwap_results
             
@@ -1206,6 +1426,22 @@ class NasdaqAnalyzer:
                 signals.append(f'RSI neutral ({rsi:.1f})')
                 neutral_signals += 1
         
+        # Extremos frente al historial propio (peso: 0.5 cada uno): un RSI de 70 es habitual en
+        # una tendencia fuerte; el percentil dice si el valor es raro para este índice
+        ranks = indicators.get('percentile_ranks') or {}
+        for name, label in (('rsi', 'RSI'), ('stoch_k', 'Stochastic'), ('mfi', 'MFI')):
+            rank = ranks.get(name)
+            if rank is None:
+                continue
+            if rank >= EXTREME_PERCENTILE:
+                signals.append(f'{label} en el percentil {rank:.0f} de su historial - extremo, riesgo de giro bajista')
+                bearish_signals += 0.5
+                signal_weights.append(('bearish', 0.5))
+            elif rank <= 100 - EXTREME_PERCENTILE:
+                signals.append(f'{label} en el percentil {rank:.0f} de su historial - extremo, posible rebote')
+                bullish_signals += 0.5
+                signal_weights.append(('bullish', 0.5))
+        
         # Análisis MACD (peso: 2)
         macd = indicators.get('macd')
         macd_signal = indicators.get('macd_signal')
@@ -1329,14 +1565,55 @@ class NasdaqAnalyzer:
         bb_squeeze = indicators.get('bb_squeeze', 0)
         volatility_high = indicators.get('volatility_high', 0)
         
-        if bb_squeeze:
+        # Con historial, la compresión es relativa a la anchura habitual del índice y no un 10% fijo
+        bb_width_rank = ranks.get('bb_width')
+        if bb_width_rank is not None:
+            if bb_width_rank <= SQUEEZE_PERCENTILE:
+                signals.append(f'Bollinger Bands en el percentil {bb_width_rank:.0f} de anchura - squeeze, posible ruptura inminente')
+                neutral_signals += 1
+        elif bb_squeeze:
             signals.append('Bollinger Bands squeeze - posible ruptura inminente')
             neutral_signals += 1
         
-        if volatility_high:
+        atr_rank = ranks.get('atr_pct')
+        if atr_rank is not None and atr_rank >= EXTREME_PERCENTILE:
+            signals.append(f'ATR en el percentil {atr_rank:.0f} de su historial - volatilidad extrema')
+            neutral_signals += 1
+        elif volatility_high:
             signals.append('Alta volatilidad detectada - mercado inestable')
             neutral_signals += 1
         
+        # Velas y estructura de swings de las barras diarias (peso: 1)
+        candles = indicators.get('candle_patterns') or {}
+        last_bar = ', '.join(candles.get('last_bar') or [])
+        if candles.get('bias') == 'bullish':
+            signals.append(f'Patrón de velas alcista ({last_bar})')
+            bullish_signals += 0.5
+            signal_weights.append(('bullish', 1))
+        elif candles.get('bias') == 'bearish':
+            signals.append(f'Patrón de velas bajista ({last_bar})')
+            bearish_signals += 0.5
+            signal_weights.append(('bearish', 1))
+        
+        if candles.get('structure') == 'uptrend':
+            signals.append('Máximos y mínimos de swing crecientes - estructura alcista')
+            bullish_signals += 0.5
+            signal_weights.append(('bullish', 1))
+        elif candles.get('structure') == 'downtrend':
+            signals.append('Máximos y mínimos de swing decrecientes - estructura bajista')
+            bearish_signals += 0.5
+            signal_weights.append(('bearish', 1))
+        
+        recent_patterns = candles.get('recent') or {}
+        if 'double_top' in recent_patterns:
+            signals.append(f"Doble techo reciente (cuello {candles['double_top']['neckline']:.2f}) - posible giro bajista")
+            bearish_signals += 0.5
+            signal_weights.append(('bearish', 1))
+        if 'double_bottom' in recent_patterns:
+            signals.append(f"Doble suelo reciente (cuello {candles['double_bottom']['neckline']:.2f}) - posible giro alcista")
+            bullish_signals += 0.5
+            signal_weights.append(('bullish', 1))
+        
         # Análisis de Money Flow Index (peso: 1)
         mfi = indicators.get('mfi')
         if mfi:
@@ -1388,8 +1665,47 @@ class NasdaqAnalyzer:
             'bearish_weight': round(total_bearish_weight, 1)
         }
     
-    def predict_daily_levels(self, data: pd.DataFrame, indicators: Dict[str, Any]) -> Dict[str, float]:
-        """Predecir niveles de soporte y resistencia avanzados para el día"""
+    def calculate_volume_profiles(self) -> Dict[str, Any]:
+        """Perfil de volumen de la sesión (barras de 1m) y de las últimas sesiones (5m de 5 días)
+        
+        Los libros de perfiles se conservan en el analizador: en un proceso residente cada
+        ejecución solo añade las barras nuevas (ver ``volume_profile.py``).
+        """
+        try:
+            symbol = self.intraday_symbol()
+            session_bars = self.get_intraday_data('1m')
+            ticker = yf.Ticker(symbol)
+            multi_day_bars = self.get_cached_history((symbol, '5m', '5d'),
+                                                     lambda: ticker.history(period='5d', interval='5m'))
+            
+            session_book = self._profile_books.setdefault('1m', ProfileBook(DEFAULT_TICK_SIZE))
+            multi_day_book = self._profile_books.setdefault('5m', ProfileBook(DEFAULT_TICK_SIZE))
+            session_book.add_bars(session_bars)
+            multi_day_book.add_bars(multi_day_bars)
+            
+            last_bars = session_bars if not session_bars.empty else multi_day_bars
+            if last_bars.empty:
+                return {}
+            profiles = {
+                'symbol': symbol,
+                'tick_size': DEFAULT_TICK_SIZE,
+                'reference_price': float(last_bars['Close'].iloc[-1]),
+                'session': session_book.session()
+            }
+            for count in ROLLING_SESSIONS:
+                profiles[f'rolling_{count}'] = multi_day_book.rolling(count)
+            return profiles
+        except Exception as e:
+            logger.error(f"Error calculando perfil de volumen: {e}")
+            return {'error': str(e)}
+    
+    def predict_daily_levels(self, data: pd.DataFrame, indicators: Dict[str, Any],
+                             volume_profile: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
+        """Predecir niveles de soporte y resistencia avanzados para el día
+        
+        Con ``volume_profile`` (sección de ``calculate_volume_profiles``) se añaden como niveles
+        el POC, el área de valor y los nodos de volumen alto de cada perfil.
+        """
         if data.empty or not indicators:
             return {}
         
@@ -1403,6 +1719,8 @@ class NasdaqAnalyzer:
             current_high = indicators.get('last_high', 0)
             current_low = indicators.get('last_low', 0)
             atr = indicators.get('atr', 0)
+            daily_sigma = (indicators.get('volatility_estimators') or {}).get('bar_sigma')
+            expected_move = current_close * daily_sigma if daily_sigma else None
             
             # 1. Niveles basados en Bandas de Bollinger
             bb_upper = indicators.get('bb_upper', 0)
@@ -1481,25 +1799,17 @@ class NasdaqAnalyzer:
             
             # 8. Niveles de volumen (VWAP mejorado) - ACTUALIZADO
             vwap_data = {}
-            if len(recent_data_20) > 0:
-                # VWAP estándar (20 períodos)
-                typical_price_20 = (recent_data_20['High'] + recent_data_20['Low'] + recent_data_20['Close']) / 3
-                vwap = (typical_price_20 * recent_data_20['Volume']).sum() / recent_data_20['Volume'].sum()
+            # VWAP estándar (20 períodos) y de 10 y 5 períodos con las mismas sumas acumuladas
+            accumulator = VWAPAccumulator(recent_data_20) if len(recent_data_20) > 0 else None
+            vwap_20 = accumulator.from_anchor(0) if accumulator is not None else None
+            if vwap_20 is not None:
+                vwap = vwap_20['vwap']
                 vwap_data['vwap_20'] = vwap
-                
-                # VWAP de 10 períodos si hay suficientes datos
-                if len(recent_data_20) >= 10:
-                    recent_10 = recent_data_20.tail(10)
-                    typical_price_10 = (recent_10['High'] + recent_10['Low'] + recent_10['Close']) / 3
-                    vwap_10 = (typical_price_10 * recent_10['Volume']).sum() / recent_10['Volume'].sum()
-                    vwap_data['vwap_10'] = vwap_10
-                
-                # VWAP de 5 períodos
-                if len(recent_data_20) >= 5:
-                    recent_5 = recent_data_20.tail(5)
-                    typical_price_5 = (recent_5['High'] + recent_5['Low'] + recent_5['Close']) / 3
-                    vwap_5 = (typical_price_5 * recent_5['Volume']).sum() / recent_5['Volume'].sum()
-                    vwap_data['vwap_5'] = vwap_5
+                for period, position in trailing_anchors(len(recent_data_20), (10, 5)).items():
+                    trailing = accumulator.from_anchor(position)
+                    if trailing is not None:
+                        vwap_data[f'vwap_{period}'] = trailing['vwap']
+                vwap_data['vwap_20_bands'] = {band: vwap_20[band] for band in ('upper_1', 'lower_1', 'upper_2', 'lower_2')}
                 
                 # Análisis de desviación del VWAP
                 vwap_deviation = ((current_close - vwap) / vwap) * 100
@@ -1509,39 +1819,30 @@ class NasdaqAnalyzer:
                 vwap = current_close
                 vwap_data = {'vwap_20': vwap, 'vwap_deviation_pct': 0, 'above_vwap': 1}
             
-            # Compilar todos los niveles
-            all_resistance_levels = [
-                bb_upper, recent_high_5, recent_high_10, recent_high_20,
-                fib_23_6_5d, fib_38_2_5d, fib_38_2_20d,
-                r1, r2, atr_resistance_1, atr_resistance_2
-            ]
-            
-            all_support_levels = [
-                bb_lower, recent_low_5, recent_low_10, recent_low_20,
-                fib_61_8_5d, fib_78_6_5d, fib_61_8_20d,
-                s1, s2, atr_support_1, atr_support_2
-            ]
-            
-            # Filtrar niveles válidos (por encima/debajo del precio actual)
-            valid_resistances = [r for r in all_resistance_levels if r and r > current_close]
-            valid_supports = [s for s in all_support_levels if s and s < current_close]
-            
-            # Ordenar y seleccionar los más cercanos
-            valid_resistances.sort()
-            valid_supports.sort(reverse=True)
-            
-            # Agregar medias móviles según su posición relativa al precio
-            ma_levels = [sma_10, sma_20, sma_50, ema_12, ema_26, vwap]
-            for ma in ma_levels:
-                if ma:
-                    if ma > current_close:
-                        valid_resistances.append(ma)
-                    elif ma < current_close:
-                        valid_supports.append(ma)
-            
-            # Re-ordenar después de agregar MAs
-            valid_resistances.sort()
-            valid_supports.sort(reverse=True)
+            # Niveles del perfil de volumen: donde realmente se ha negociado
+            volume_levels = profile_levels(volume_profile, current_close)
+            
+            # Compilar todos los niveles en clusters de confluencia: los niveles de distintas
+            # fuentes a menos de una fracción del ATR se funden en uno y puntúan por fuente
+            level_index = LevelIndex.from_sources({
+                'bollinger': [bb_upper, bb_lower],
+                'recent_range': [recent_high_5, recent_high_10, recent_high_20,
+                                 recent_low_5, recent_low_10, recent_low_20],
+                'fibonacci': [fib_23_6_5d, fib_38_2_5d, fib_50_0_5d, fib_61_8_5d, fib_78_6_5d,
+                              fib_38_2_20d, fib_61_8_20d],
+                'pivot': [r1, r2, r3, s1, s2, s3],
+                'atr': [atr_resistance_1, atr_resistance_2, atr_support_1, atr_support_2],
+                'psychological': psychological_levels,
+                'moving_average': [sma_10, sma_20, sma_50, ema_12, ema_26],
+                'vwap': [vwap],
+                'volume_profile': volume_levels
+            }, level_tolerance(atr, current_close))
+            
+            # Los más cercanos a cada lado del precio actual (búsqueda binaria)
+            resistance_clusters = level_index.above(current_close, CONFLUENCE_LEVELS)
+            support_clusters = level_index.below(current_close, CONFLUENCE_LEVELS)
+            valid_resistances = [cluster['price'] for cluster in resistance_clusters]
+            valid_supports = [cluster['price'] for cluster in support_clusters]
             
             return {
                 # Resistencias principales
@@ -1586,110 +1887,311 @@ class NasdaqAnalyzer:
                 # Niveles psicológicos
                 'psychological_levels': [float(level) for level in psychological_levels],
                 
+                # Niveles del perfil de volumen (trasladados al precio del índice)
+                'volume_profile_levels': volume_levels,
+                
+                # Clusters de confluencia más cercanos y su puntuación (fuentes coincidentes)
+                'confluence_levels': {
+                    'resistance': resistance_clusters,
+                    'support': support_clusters,
+                    'tolerance': round(float(level_index.tolerance), 2)
+                },
+                
                 # Información adicional
                 'current_price': float(current_close),
                 'daily_range': float(current_high - current_low),
                 'atr_value': float(atr) if atr else 0,
-                'volatility_adjusted_range': float(atr * 2) if atr else 0
+                'volatility_adjusted_range': float(atr * 2) if atr else 0,
+                
+                # Movimiento esperado de 1σ diaria (Yang-Zhang de 20 días)
+                'expected_move': round(float(expected_move), 2) if expected_move else None,
+                'expected_range_high': round(float(current_close + expected_move), 2) if expected_move else None,
+                'expected_range_low': round(float(current_close - expected_move), 2) if expected_move else None
             }
             
         except Exception as e:
             logger.error(f"Error calculando niveles diarios: {e}")
             return {}
     
-    def generate_daily_analysis(self) -> Dict[str, Any]:
-        """Generar análisis completo del día con datos intradía"""
-        logger.info("Iniciando análisis diario del NASDAQ 100")
-        
-        # Obtener datos de mercado
-        market_data = self.get_market_data()
-        if market_data.empty:
-            logger.error("No se pudieron obtener datos de mercado")
-            return {}
-        
-        # Calcular indicadores técnicos
-        indicators = self.calculate_technical_indicators(market_data)
-        
-        # Calcular análisis probabilístico - NUEVO
-        probabilistic_analysis = self.calculate_probabilistic_analysis(market_data, indicators)
-        
-        # Calcular nuevos indicadores - NUEVOS INDICADORES IMPLEMENTADOS
-        vix_analysis = self.get_vix_detailed_analysis()
-        tick_analysis = self.get_tick_index_approximation()
-        tape_trading = self.calculate_tape_trading_metrics()
-        vwap_multi = self.calculate_vwap_multi_timeframe()
-        
-        # Analizar tendencia
-        trend_analysis = self.analyze_trend(indicators)
-        
-        # Predecir niveles del día
-        daily_levels = self.predict_daily_levels(market_data, indicators)
+    def intraday_symbol(self) -> str:
+        """Símbolo de las barras intradía (el futuro NQ=F para el NASDAQ 100)"""
+        return "NQ=F" if self.symbol == "^NDX" else self.symbol
+    
+    def get_volume_curve(self, symbol: Optional[str] = None) -> VolumeCurve:
+        """Curva de volumen por minuto de ``symbol`` (por defecto, el intradía del analizador)
         
-        # Obtener datos intradía para múltiples temporalidades
+        Se carga de ``data/cache/volume_curve`` la primera vez; si no existe, se construye con
+        las barras de 1m de los informes diarios guardados.
+        """
+        symbol = symbol or self.intraday_symbol()
+        if symbol not in self.volume_curves:
+            curve = VolumeCurve.load(volume_curve_path(self.data_dir, symbol))
+            if curve is None:
+                curve = VolumeCurve()
+                if symbol == self.intraday_symbol():
+                    with measure(self.metrics, 'volume_curve_bootstrap'):
+                        curve.add_bars(stored_minute_bars(self.data_dir))
+            self.volume_curves[symbol] = curve
+        return self.volume_curves[symbol]
+    
+    def update_volume_curve(self, data: pd.DataFrame, symbol: Optional[str] = None):
+        """Añadir las barras de 1m nuevas a la curva de ``symbol`` y guardarla"""
+        symbol = symbol or self.intraday_symbol()
+        try:
+            curve = self.get_volume_curve(symbol)
+            if curve.add_bars(data):
+                curve.save(volume_curve_path(self.data_dir, symbol))
+        except Exception as e:
+            logger.warning(f"No se pudo actualizar la curva de volumen de {symbol}: {e}")
+    
+    def calculate_intraday_timeframes(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Indicadores y barras para gráficos de todas las temporalidades intradía"""
         intraday_analysis = {}
         chart_data = {}
         
-        timeframes = ['1m', '5m', '15m', '4h', '1d']
-        for timeframe in timeframes:
+        for timeframe in INTRADAY_TIMEFRAMES:
             try:
-                logger.info(f"Obteniendo datos intradía para {timeframe}")
-                intraday_data = self.get_intraday_data(timeframe)
-                
-                if not intraday_data.empty:
-                    # Análisis técnico específico para la temporalidad
-                    intraday_indicators = self.calculate_intraday_indicators(intraday_data, timeframe)
-                    intraday_analysis[timeframe] = intraday_indicators
-                    
-                    # Datos para gráficos - convertir a formato simple para JSON
-                    chart_data[timeframe] = [{
-                        'timestamp': dt.strftime('%Y-%m-%d %H:%M:%S'),
-                        'open': float(row['Open']),
-                        'high': float(row['High']),
-                        'low': float(row['Low']),
-                        'close': float(row['Close']),
-                        'volume': int(row['Volume'])
-                    } for dt, row in intraday_data.iterrows()]
+                with measure(self.metrics, f'intraday_{timeframe}'):
+                    logger.info(f"Obteniendo datos intradía para {timeframe}")
+                    intraday_data = self.get_intraday_data(timeframe)
                     
-                    logger.info(f"Análisis intradía completado para {timeframe}: {len(intraday_data)} barras")
-                else:
-                    logger.warning(f"No se pudieron obtener datos intradía para {timeframe}")
-                    intraday_analysis[timeframe] = {}
-                    chart_data[timeframe] = []
+                    if not intraday_data.empty:
+                        if timeframe == '1m':
+                            self.update_volume_curve(intraday_data)
+                        # Patrones de todas las barras en una pasada: estado final e indicadores por barra
+                        patterns = scan_patterns(intraday_data)
+                        # Análisis técnico específico para la temporalidad
+                        intraday_indicators = self.calculate_intraday_indicators(intraday_data, timeframe, patterns)
+                        if intraday_indicators:
+                            intraday_indicators['percentile_ranks'] = self.rank_indicators(
+                                timeframe, ranked_values(intraday_indicators, INTRADAY_INDICATORS, 'current_price'),
+                                intraday_data.index[-1])
+                        intraday_analysis[timeframe] = intraday_indicators
+                        
+                        # Datos para gráficos - convertir a formato simple para JSON
+                        chart_data[timeframe] = self.format_bar_rows(intraday_data, patterns)
+                        
+                        logger.info(f"Análisis intradía completado para {timeframe}: {len(intraday_data)} barras")
+                    else:
+                        logger.warning(f"No se pudieron obtener datos intradía para {timeframe}")
+                        intraday_analysis[timeframe] = {}
+                        chart_data[timeframe] = []
                     
             except Exception as e:
                 logger.error(f"Error obteniendo datos intradía para {timeframe}: {e}")
                 intraday_analysis[timeframe] = {}
                 chart_data[timeframe] = []
         
-        # Obtener noticias
-        news = self.get_market_news()
+        return intraday_analysis, chart_data
+    
+    def calculate_indicator_sections(self, market_data: pd.DataFrame,
+                                     volume_profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Secciones de la etapa 'indicators' a partir de barras diarias
+        
+        Solo depende de ``market_data`` (y del perfil de volumen, si se da), por lo que sirve
+        también para recalcular días pasados con las barras disponibles a su cierre (ver
+        ``backfill.py``).
+        """
+        # Calcular indicadores técnicos
+        indicators = self.with_percentile_ranks(
+            self.memoized('indicators', self.calculate_technical_indicators, market_data), market_data)
+        
+        return {
+            'technical_indicators': indicators,
+            # Analizar tendencia
+            'trend_analysis': self.memoized('trend', self.analyze_trend, indicators),
+            # Predecir niveles del día
+            'daily_levels': self.memoized('levels', self.predict_daily_levels, market_data, indicators, volume_profile),
+            # Datos del día anterior
+            'yesterday_data': self.summarize_yesterday(market_data)
+        }
+    
+    def similar_day_index(self) -> SimilarDayIndex:
+        """Índice de días similares al día con los archivos diarios guardados
+        
+        La primera vez se carga el almacén de ``data/cache/similar_days``; en cada llamada solo
+        se leen los archivos diarios nuevos o modificados desde la última sincronización.
+        """
+        path = similar_days_path(self.data_dir, self.symbol)
+        if self._similar_days is None or self._similar_days.store.path != path:
+            store = FeatureStore(path)
+            self.sync_feature_store(store)
+            self._similar_days = SimilarDayIndex(store)
+        else:
+            self.sync_feature_store(self._similar_days.store)
+        return self._similar_days
+    
+    def sync_feature_store(self, store: FeatureStore):
+        """Incorporar al almacén los archivos diarios nuevos y guardarlo si cambia"""
+        try:
+            if store.sync(self.data_dir):
+                store.save()
+        except Exception as e:
+            logger.warning(f"No se pudo sincronizar el almacén de días similares: {e}")
+    
+    def find_similar_days(self, indicators: Dict[str, Any]) -> Dict[str, Any]:
+        """Días anteriores a hoy con indicadores más parecidos y su evolución posterior"""
+        try:
+            return self.similar_day_index().query(indicators)
+        except Exception as e:
+            logger.error(f"Error buscando días similares: {e}")
+            return {'error': str(e)}
+    
+    def percentile_history(self) -> PercentileHistory:
+        """Historial de percentiles al día con los archivos diarios guardados
+        
+        La primera vez se carga ``data/cache/percentiles``; en cada llamada solo se leen los
+        archivos diarios nuevos o modificados desde la última sincronización.
+        """
+        path = percentile_history_path(self.data_dir, self.symbol)
+        if self._percentile_history is None or self._percentile_history.path != path:
+            self._percentile_history = PercentileHistory(path)
+        if not self.percentile_sync:
+            return self._percentile_history
+        try:
+            if self._percentile_history.sync(self.data_dir):
+                self._percentile_history.save()
+        except Exception as e:
+            logger.warning(f"No se pudo sincronizar el historial de percentiles: {e}")
+        return self._percentile_history
+    
+    def rank_indicators(self, timeframe: str, values: Dict[str, float], as_of) -> Dict[str, float]:
+        """Percentil de cada valor frente a los días guardados anteriores a ``as_of``"""
+        try:
+            return self.percentile_history().ranks(timeframe, values, as_of.strftime('%Y-%m-%d'))
+        except Exception as e:
+            logger.warning(f"No se pudieron calcular los percentiles de {timeframe}: {e}")
+            return {}
+    
+    def with_percentile_ranks(self, indicators: Dict[str, Any], market_data: pd.DataFrame) -> Dict[str, Any]:
+        """Copia de los indicadores diarios con ``percentile_ranks`` frente a su historial
         
-        # Datos del día anterior
-        yesterday_data = {
+        El historial se corta en la fecha de la última barra: en un backfill solo cuentan los
+        días que el análisis de entonces conocía.
+        """
+        if not indicators or market_data.empty:
+            return indicators
+        return dict(indicators, percentile_ranks=self.rank_indicators(
+            'daily', ranked_values(indicators), market_data.index[-1]))
+    
+    def summarize_yesterday(self, market_data: pd.DataFrame) -> Dict[str, Any]:
+        """Máximo, mínimo, cierre y volumen de la última barra diaria"""
+        return {
             'high': float(market_data['High'].iloc[-1]),
             'low': float(market_data['Low'].iloc[-1]),
             'close': float(market_data['Close'].iloc[-1]),
             'volume': int(market_data['Volume'].iloc[-1])
         }
+    
+    def generate_daily_analysis(self, stages: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """Generar análisis completo del día con datos intradía
         
+        Con ``stages`` solo se ejecutan esas etapas (ver ``STAGE_SECTIONS``); las demás
+        conservan los valores del archivo diario existente.
+        """
+        logger.info("Iniciando análisis diario del NASDAQ 100")
+        self.metrics = RunMetrics('daily', self.metrics_listeners)
+        if self.stage_cache is not None:
+            self.stage_cache.reset_stats()
+        
+        stages = set(stages or STAGE_SECTIONS)
+        previous = {}
+        if stages != set(STAGE_SECTIONS):
+            previous = load_previous_analysis(self.data_dir, datetime.now().strftime('%Y%m%d'), self.snapshot_dir)
+            if previous:
+                logger.info(f"Etapas seleccionadas: {', '.join(sorted(stages))}; el resto conserva los valores previos")
+            else:
+                logger.warning("No hay análisis previo del que conservar valores; se ejecutan todas las etapas")
+                stages = set(STAGE_SECTIONS)
+        
+        sections = {}
+        # El perfil de volumen va antes que los indicadores porque alimenta los niveles
+        if 'volume_profile' in stages:
+            with measure(self.metrics, 'volume_profile'):
+                sections['volume_profile'] = self.calculate_volume_profiles()
+        volume_profile = sections.get('volume_profile', previous.get('volume_profile'))
+        
+        if 'indicators' in stages:
+            # Obtener datos de mercado
+            with measure(self.metrics, 'fetch_market'):
+                market_data = self.get_market_data()
+            if market_data.empty:
+                logger.error("No se pudieron obtener datos de mercado")
+                return {}
+            
+            # Indicadores técnicos, tendencia, niveles y datos del día anterior
+            with measure(self.metrics, 'indicators'):
+                sections.update(self.calculate_indicator_sections(market_data, volume_profile))
+            
+            # Calcular análisis probabilístico - NUEVO
+            if 'probabilistic' in stages:
+                with measure(self.metrics, 'probabilistic'):
+                    sections['probabilistic_analysis'] = self.memoized(
+                        'probabilistic', self.calculate_probabilistic_analysis,
+                        market_data, sections['technical_indicators'])
+            
+            # Días históricos más parecidos y qué hizo el precio después
+            if 'similar_days' in stages:
+                with measure(self.metrics, 'similar_days'):
+                    sections['similar_days'] = self.find_similar_days(sections['technical_indicators'])
+        
+        # Calcular nuevos indicadores - NUEVOS INDICADORES IMPLEMENTADOS
+        if 'vix' in stages:
+            with measure(self.metrics, 'vix'):
+                sections['vix_detailed_analysis'] = self.get_vix_detailed_analysis()
+        if 'tick' in stages:
+            with measure(self.metrics, 'tick'):
+                sections['tick_index_analysis'] = self.get_tick_index_approximation()
+        if 'tape' in stages:
+            with measure(self.metrics, 'tape'):
+                sections['tape_trading_metrics'] = self.calculate_tape_trading_metrics()
+        if 'vwap' in stages:
+            with measure(self.metrics, 'vwap'):
+                sections['vwap_multi_timeframe'] = self.calculate_vwap_multi_timeframe()
+        
+        # Obtener datos intradía para múltiples temporalidades (una etapa por temporalidad)
+        if 'intraday' in stages:
+            sections['intraday_analysis'], sections['chart_data'] = self.calculate_intraday_timeframes()
+        
+        # Obtener noticias
+        if 'news' in stages:
+            with measure(self.metrics, 'news'):
+                sections['news'] = self.get_market_news()
+        
+        carry_over_sections(sections, previous, STAGE_SECTIONS, stages)
+        with measure(self.metrics, 'summary'):
+            return self.build_analysis(sections)
+    
+    def build_analysis(self, sections: Dict[str, Any], as_of: Optional[datetime] = None) -> Dict[str, Any]:
+        """Compilar el análisis a partir de las secciones de todas las etapas
+        
+        ``as_of`` fija la fecha y el timestamp (días recalculados); por defecto, ahora.
+        """
+        as_of = as_of or datetime.now()
         # Compilar análisis completo
         analysis = {
-            'date': datetime.now().strftime('%Y-%m-%d'),
-            'timestamp': datetime.now().isoformat(),
+            'date': as_of.strftime('%Y-%m-%d'),
+            'timestamp': as_of.isoformat(),
             'symbol': self.symbol,
-            'yesterday_data': yesterday_data,
-            'technical_indicators': indicators,
-            'trend_analysis': trend_analysis,
-            'daily_levels': daily_levels,
-            'probabilistic_analysis': probabilistic_analysis,  # NUEVO
-            'vix_detailed_analysis': vix_analysis,  # NUEVO - VIX detallado
-            'tick_index_analysis': tick_analysis,  # NUEVO - TICK Index
-            'tape_trading_metrics': tape_trading,  # NUEVO - Order Flow
-            'vwap_multi_timeframe': vwap_multi,  # NUEVO - VWAP múltiples marcos
-            'intraday_analysis': intraday_analysis,
-            'chart_data': chart_data,
-            'news': news,
-            'summary': self.generate_summary(trend_analysis, daily_levels, indicators, intraday_analysis, probabilistic_analysis, vix_analysis, tick_analysis, tape_trading)
+            'yesterday_data': sections['yesterday_data'],
+            'technical_indicators': sections['technical_indicators'],
+            'trend_analysis': sections['trend_analysis'],
+            'daily_levels': sections['daily_levels'],
+            'probabilistic_analysis': sections['probabilistic_analysis'],  # NUEVO
+            'vix_detailed_analysis': sections['vix_detailed_analysis'],  # NUEVO - VIX detallado
+            'tick_index_analysis': sections['tick_index_analysis'],  # NUEVO - TICK Index
+            'tape_trading_metrics': sections['tape_trading_metrics'],  # NUEVO - Order Flow
+            'vwap_multi_timeframe': sections['vwap_multi_timeframe'],  # NUEVO - VWAP múltiples marcos
+            'intraday_analysis': sections['intraday_analysis'],
+            'chart_data': sections['chart_data'],
+            'volume_profile': sections['volume_profile'],
+            'similar_days': sections['similar_days'],
+            'news': sections['news'],
+            'summary': self.memoized('summary', self.generate_summary,
+                                     sections['trend_analysis'], sections['daily_levels'],
+                                     sections['technical_indicators'], sections['intraday_analysis'],
+                                     sections['probabilistic_analysis'], sections['vix_detailed_analysis'],
+                                     sections['tick_index_analysis'], sections['tape_trading_metrics'])
         }
         
         return analysis
@@ -1836,6 +2338,18 @@ class NasdaqAnalyzer:
                         'type': 'ema_cross',
                         'emoji': '🔴'
                     })
+            
+            # Patrones de velas de la última barra de cada temporalidad
+            for timeframe, timeframe_analysis in intraday_analysis.items():
+                candles = (timeframe_analysis or {}).get('candle_patterns') or {}
+                if candles.get('bias') in ('bullish', 'bearish'):
+                    bullish = candles['bias'] == 'bullish'
+                    intraday_signals.append({
+                        'timeframe': timeframe,
+                        'signal': f"VELAS {'ALCISTAS' if bullish else 'BAJISTAS'}: {', '.join(candles['last_bar'])}",
+                        'type': 'candle_pattern',
+                        'emoji': '🟢' if bullish else '🔴'
+                    })
         
         # SECCIÓN 7: ANÁLISIS PROBABILÍSTICO
         probabilistic_prediction = {}
@@ -1951,51 +2465,209 @@ class NasdaqAnalyzer:
         else:
             return obj
     
-    def save_analysis(self, analysis: Dict[str, Any]) -> str:
-        """Guardar análisis en archivo JSON"""
+    def save_analysis(self, analysis: Dict[str, Any], skip_unchanged: bool = True,
+                      record_metrics: bool = True) -> str:
+        """Guardar análisis en archivo JSON
+        
+        Si el hash de las partes de mercado coincide con el de la ejecución anterior no se
+        reescribe nada y ``self.last_save_changed`` queda a False. Con ``skip_unchanged=False``
+        se guarda igualmente (p. ej. al refrescar solo las noticias). Con ``record_metrics=False``
+        las métricas no se añaden al histórico (lo hace quien coordina la ejecución).
+        """
         if not analysis:
             logger.error("No hay análisis para guardar")
             return ""
         
-        filename = f"{datetime.now().strftime('%Y%m%d')}.json"
+        day = datetime.now().strftime('%Y%m%d')
+        filename = f"{day}.json"
         filepath = os.path.join(self.data_dir, filename)
         
         try:
-            # Limpiar valores NaN antes de guardar
-            clean_analysis = self.clean_nan_values(analysis)
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(clean_analysis, f, indent=2, ensure_ascii=False)
-            
-            logger.info(f"Análisis guardado en {filepath}")
+            with measure(self.metrics, 'serialize'):
+                # Limpiar valores NaN antes de guardar
+                clean_analysis = self.clean_nan_values(analysis)
+                clean_analysis.pop('snapshot_version', None)
+                clean_analysis.pop('snapshot_epoch', None)
+                
+                # Sin barras nuevas ni cambios derivados: evitar escrituras, commits y redespliegues
+                clean_analysis['market_hash'] = market_content_hash(clean_analysis)
+            # El registro intradía va por delante del archivo diario entre puntos de control
+            snapshot_log = SnapshotLog(self.snapshot_dir, day)
+            previous_hash = snapshot_log.latest()[0].get('market_hash') or previous_market_hash(self.data_dir, filename)
+            if skip_unchanged and clean_analysis['market_hash'] == previous_hash:
+                self.last_save_changed = False
+                logger.info(f"Sin cambios en los datos de mercado; {filepath} no se reescribe")
+                if record_metrics:
+                    self.record_run_metrics()
+                return filepath
+            self.last_save_changed = True
+            
+            # Registro intradía: solo se anexa lo que cambió desde la ejecución anterior.
+            # La versión resultante identifica el snapshot ante los clientes que piden deltas.
+            with measure(self.metrics, 'snapshot'):
+                snapshot_version = self.append_snapshot(clean_analysis, day, snapshot_log)
+            if snapshot_version:
+                clean_analysis['snapshot_version'] = snapshot_version
+                clean_analysis['snapshot_epoch'] = snapshot_log.epoch
+            
+            # El archivo diario completo solo se reescribe en los puntos de control: primer snapshot
+            # del día, cada SNAPSHOT_CHECKPOINT_INTERVAL versiones o si el registro falla. Entre medias
+            # el dashboard parte del último punto de control y aplica los deltas publicados
+            checkpoint = (not snapshot_version or snapshot_version == 1
+                          or snapshot_version % SNAPSHOT_CHECKPOINT_INTERVAL == 0
+                          or not os.path.exists(filepath))
+            
+            # Las métricas no entran en el registro intradía; la escritura solo consta en el histórico
+            if self.metrics is not None:
+                clean_analysis['run_metrics'] = self.metrics.as_dict()
+            with measure(self.metrics, 'write'):
+                if checkpoint:
+                    write_json_atomic(filepath, clean_analysis)
+                    logger.info(f"Análisis guardado en {filepath}")
+                    # Mantener el manifiesto del histórico
+                    update_history_manifest(self.data_dir, filepath, clean_analysis)
+                else:
+                    logger.info(f"Snapshot v{snapshot_version} anexado; {filepath} se reescribirá en el próximo punto de control")
+                write_last_update(self.data_dir, 'success', day=day, snapshot_version=snapshot_version,
+                                  snapshot_epoch=snapshot_log.epoch)
+            with measure(self.metrics, 'similar_days_index'):
+                self.similar_day_index()
+            if record_metrics:
+                self.record_run_metrics()
             return filepath
         except Exception as e:
             logger.error(f"Error guardando análisis: {e}")
             return ""
     
-    def run_daily_analysis(self):
-        """Ejecutar análisis diario completo"""
+    def record_run_metrics(self):
+        """Añadir las métricas de la ejecución al histórico rodante ``data/metrics``"""
+        if self.metrics is None:
+            return
         try:
-            analysis = self.generate_daily_analysis()
+            entry = self.metrics.as_dict()
+            entry['changed'] = self.last_save_changed
+            if self.stage_cache is not None:
+                entry['stage_cache'] = self.stage_cache.stats()
+            append_metrics_log(self.metrics_dir, entry)
+            total = entry['total']
+            logger.info(f"Ejecución medida: {total['wall_ms'] / 1000:.1f}s, CPU {total['cpu_ms'] / 1000:.1f}s, "
+                        f"{total['bytes_fetched'] / 1024:.0f} KB descargados, pico {total['peak_rss_mb']} MB")
+        except Exception as e:
+            logger.warning(f"No se pudieron registrar las métricas de la ejecución: {e}")
+    
+    def append_snapshot(self, analysis: Dict[str, Any], day: str, snapshot_log: Optional[SnapshotLog] = None):
+        """Anexar el análisis al registro intradía del día y publicar el delta para el dashboard
+
+        Devuelve la versión vigente del snapshot (la anterior si no hubo cambios).
+        """
+        try:
+            compact_stale_logs(self.snapshot_dir, day, materialize=self.materialize_snapshot)
+            prune_delta_payloads(self.delta_dir, day)
+            
+            snapshot_log = snapshot_log or SnapshotLog(self.snapshot_dir, day)
+            version = snapshot_log.append(analysis)
+            if version is None:
+                return snapshot_log.latest()[1]
+            if version == 1:
+                # Registro nuevo (o perdido): los deltas del linaje anterior ya no valen. Los nuevos
+                # van bajo otro epoch, así que los clientes nunca reciben de caché los antiguos
+                shutil.rmtree(os.path.join(self.delta_dir, day), ignore_errors=True)
+            
+            delta_path = write_delta_payload(self.delta_dir, day, snapshot_log.last_record, snapshot_log.epoch)
+            if delta_path:
+                logger.info(f"Delta v{version - 1} -> v{version} publicado en {delta_path}")
+            return version
+        except Exception as e:
+            logger.warning(f"No se pudo anexar el snapshot intradía: {e}")
+            return None
+    
+    def materialize_snapshot(self, day: str, state: Dict[str, Any], version: int):
+        """Volcar el estado final de un día anterior en su archivo diario antes de compactar su registro"""
+        filepath = os.path.join(self.data_dir, f"{day}.json")
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                if json.load(f).get('snapshot_version') == version:
+                    return
+        except (OSError, ValueError):
+            pass
+        final_state = dict(state, snapshot_version=version)
+        write_json_atomic(filepath, final_state)
+        update_history_manifest(self.data_dir, filepath, final_state)
+        logger.info(f"Estado final v{version} de {day} guardado en {filepath}")
+    
+    def stored_analysis_is_current(self) -> bool:
+        """True si el análisis guardado ya contiene todas las barras que pueden existir
+        
+        Según el calendario de NYSE y CME, desde la última barra guardada no ha habido
+        ninguna sesión abierta (noches, fines de semana y festivos).
+        """
+        previous = load_previous_analysis(self.data_dir, datetime.now().strftime('%Y%m%d'), self.snapshot_dir)
+        as_of = stored_data_as_of(previous) if previous else None
+        return as_of is not None and not new_bars_possible(as_of)
+    
+    def keep_unchanged_news(self, analysis: Dict[str, Any]) -> bool:
+        """True si las noticias descargadas son las ya guardadas
+        
+        En ese caso se conservan las guardadas (con su hora de obtención) para que el registro
+        intradía no anexe un delta que solo cambia horas.
+        """
+        previous = load_previous_analysis(self.data_dir, datetime.now().strftime('%Y%m%d'), self.snapshot_dir)
+        previous_news = previous.get('news')
+        if previous_news is None or news_content_hash(previous_news) != news_content_hash(analysis.get('news')):
+            return False
+        analysis['news'] = previous_news
+        logger.info("Las noticias no han cambiado desde el último guardado")
+        return True
+    
+    def run_daily_analysis(self, stages: Optional[Set[str]] = None):
+        """Ejecutar análisis diario completo o solo las etapas indicadas"""
+        try:
+            if stages is None and self.freshness_gate and self.stored_analysis_is_current():
+                self.last_save_changed = False
+                logger.info("Mercados cerrados desde la última barra guardada; se reutiliza el análisis existente")
+                return True
+            
+            analysis = self.generate_daily_analysis(stages)
             if analysis:
-                filepath = self.save_analysis(analysis)
+                # Las noticias no forman parte del hash de mercado: si se piden expresamente, guardar
+                # solo si cambiaron los titulares (la hora de obtención de cada uno no cuenta)
+                news_refresh = stages is not None and 'news' in stages and set(stages) != set(STAGE_SECTIONS)
+                if news_refresh:
+                    news_refresh = not self.keep_unchanged_news(analysis)
+                filepath = self.save_analysis(analysis, skip_unchanged=not news_refresh)
                 if filepath:
-                    logger.info("Análisis diario completado exitosamente")
+                    if self.last_save_changed:
+                        logger.info("Análisis diario completado exitosamente")
+                    else:
+                        logger.info("Análisis diario completado sin cambios de mercado")
                     return True
             
             logger.error("Falló el análisis diario")
+            write_last_update(self.data_dir, 'error', 'Falló el análisis diario')
             return False
         except Exception as e:
             logger.error(f"Error en análisis diario: {e}")
+            write_last_update(self.data_dir, 'error', f'Error ejecutando análisis: {e}')
             return False
 
 def main():
     """Función principal"""
+    parser = build_stage_parser('Análisis técnico diario del NASDAQ 100', STAGE_SECTIONS)
+    args = parser.parse_args()
+    try:
+        stages = resolve_stages(STAGE_SECTIONS, args.only, args.skip, STAGE_DEPENDENCIES)
+    except ValueError as e:
+        parser.error(str(e))
+    
     analyzer = NasdaqAnalyzer()
-    success = analyzer.run_daily_analysis()
+    analyzer.freshness_gate = not args.force
+    success = analyzer.run_daily_analysis(None if stages == set(STAGE_SECTIONS) else stages)
     
     if success:
-        print("✅ Análisis diario completado")
+        if analyzer.last_save_changed:
+            print("✅ Análisis diario completado")
+        else:
+            print("✅ Análisis diario completado (sin cambios de mercado, no se reescribe)")
     else:
         print("❌ Error en el análisis diario")
         exit(1)
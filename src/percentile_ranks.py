@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Percentiles de los indicadores frente a su historial
+Arrays ordenados con el valor de cada indicador en cada día guardado, por temporalidad
+('daily' para ``technical_indicators``, una por temporalidad de ``intraday_analysis`` y 'vix').
+El percentil del valor de hoy se obtiene con una búsqueda binaria y cada día nuevo o modificado
+se inserta en su posición sin reordenar el historial
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import time
+import logging
+from typing import Dict, Optional, Any
+
+from lazy_imports import lazy_import
+np = lazy_import('numpy')
+
+from storage import write_json_atomic, DAY_FILE_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# Indicadores con percentil. Las medidas en puntos se pasan a % del precio (sufijo _pct) para que
+# días de décadas distintas sean comparables
+DAILY_INDICATORS = ('rsi', 'macd_histogram_pct', 'bb_width', 'stoch_k', 'williams_r', 'cci', 'mfi', 'adx',
+                    'atr_pct', 'rvol', 'daily_range_pct', 'daily_change_pct', 'volatility_std')
+INTRADAY_INDICATORS = ('rsi', 'macd_histogram_pct', 'stoch_k', 'atr_pct', 'momentum_5', 'momentum_10',
+                       'volume_ratio', 'rvol_time_of_day')
+VIX_INDICATORS = ('vix_value',)
+
+# Días mínimos de historial para publicar un percentil
+MIN_HISTORY = 20
+
+HISTORY_FORMAT = 1
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+        return None
+    return float(value)
+
+
+def _percent_of(value, price) -> Optional[float]:
+    value, price = _number(value), _number(price)
+    if value is None or not price:
+        return None
+    return value / price * 100
+
+
+def ranked_values(indicators: Dict[str, Any], names=DAILY_INDICATORS,
+                  price_key: str = 'last_close') -> Dict[str, float]:
+    """Valores con percentil de un diccionario de indicadores (los que falten no aparecen)"""
+    indicators = indicators or {}
+    values = {}
+    for name in names:
+        if name not in indicators and name.endswith('_pct'):
+            value = _percent_of(indicators.get(name[:-4]), indicators.get(price_key))
+        else:
+            value = _number(indicators.get(name))
+        if value is not None:
+            values[name] = value
+    return values
+
+
+def analysis_values(analysis: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Valores con percentil de un análisis diario, por temporalidad"""
+    values = {'daily': ranked_values(analysis.get('technical_indicators'))}
+    for timeframe, indicators in (analysis.get('intraday_analysis') or {}).items():
+        values[timeframe] = ranked_values(indicators, INTRADAY_INDICATORS, 'current_price')
+    values['vix'] = ranked_values(analysis.get('vix_detailed_analysis'), VIX_INDICATORS)
+    return {timeframe: entries for timeframe, entries in values.items() if entries}
+
+
+class PercentileHistory:
+    """Historial de indicadores por día con un array ordenado por (temporalidad, indicador)
+
+    ``days`` guarda los valores de cada día ('YYYY-MM-DD' -> temporalidad -> indicador) para
+    poder sustituir un día que se vuelve a escribir y para excluir los días posteriores a la
+    fecha de la consulta. Se persiste en JSON y se sincroniza con el directorio de datos
+    leyendo solo los archivos diarios modificados desde la última sincronización.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.days = {}
+        self.dates = []
+        self.synced_at = 0.0
+        self._sorted = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+            if payload.get('format') == HISTORY_FORMAT:
+                self.days = payload.get('days', {})
+                self.synced_at = payload.get('synced_at', 0.0)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudo leer el historial de percentiles {path}: {e}")
+        self.dates = sorted(self.days)
+        # Construcción inicial: una ordenación por indicador; después, inserciones
+        columns = {}
+        for day in self.dates:
+            for timeframe, values in self.days[day].items():
+                for name, value in values.items():
+                    columns.setdefault((timeframe, name), []).append(value)
+        self._sorted = {key: np.sort(np.array(values, dtype=float)) for key, values in columns.items()}
+
+    def _insert(self, key: tuple, value: float):
+        values = self._sorted.get(key, np.empty(0))
+        self._sorted[key] = np.insert(values, np.searchsorted(values, value), value)
+
+    def _remove(self, key: tuple, value: float):
+        values = self._sorted[key]
+        self._sorted[key] = np.delete(values, np.searchsorted(values, value))
+
+    def add(self, day: str, values: Dict[str, Dict[str, float]]) -> bool:
+        """Añadir o sustituir los valores del día ``day``; devuelve True si cambia algo"""
+        previous = self.days.get(day, {})
+        if previous == values:
+            return False
+        for timeframe in set(previous) | set(values):
+            old, new = previous.get(timeframe, {}), values.get(timeframe, {})
+            for name in set(old) | set(new):
+                if old.get(name) == new.get(name):
+                    continue
+                if name in old:
+                    self._remove((timeframe, name), old[name])
+                if name in new:
+                    self._insert((timeframe, name), new[name])
+        if day not in self.days:
+            bisect.insort(self.dates, day)
+        self.days[day] = values
+        return True
+
+    def sync(self, data_dir: str) -> int:
+        """Incorporar los archivos diarios nuevos o modificados; devuelve cuántos días cambian
+
+        Los archivos diarios se escriben con un renombrado atómico, que actualiza la fecha de
+        modificación del directorio: si no ha cambiado desde la última vez no se recorre.
+        """
+        started = time.time()
+        try:
+            if os.stat(data_dir).st_mtime < self.synced_at:
+                return 0
+            entries = [entry for entry in os.scandir(data_dir) if DAY_FILE_PATTERN.match(entry.name)]
+        except FileNotFoundError:
+            return 0
+        changed = 0
+        for entry in sorted(entries, key=lambda item: item.name):
+            year, month, day = DAY_FILE_PATTERN.match(entry.name).groups()
+            day = f"{year}-{month}-{day}"
+            if day in self.days and entry.stat().st_mtime < self.synced_at:
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    analysis = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"No se pudo leer {entry.name} para el historial de percentiles: {e}")
+                continue
+            changed += int(self.add(day, analysis_values(analysis)))
+        self.synced_at = started
+        return changed
+
+    def save(self):
+        """Guardar el historial de forma atómica"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        write_json_atomic(self.path, {'format': HISTORY_FORMAT, 'synced_at': self.synced_at, 'days': self.days},
+                          indent=None)
+
+    def rank(self, timeframe: str, name: str, value: float, before: Optional[str] = None) -> Optional[float]:
+        """Percentil (0-100) de ``value`` entre los días anteriores a ``before`` ('YYYY-MM-DD')
+
+        Se cuentan los valores menores y la mitad de los iguales (rango medio). Los días desde
+        ``before`` se descuentan uno a uno: en vivo solo es el propio día; en un backfill, los
+        días posteriores al recalculado, que el análisis de entonces no conocía.
+        """
+        values = self._sorted.get((timeframe, name))
+        if values is None:
+            return None
+        below = np.searchsorted(values, value, side='left')
+        equal = np.searchsorted(values, value, side='right') - below
+        total = len(values)
+        if before is not None:
+            later = [self.days[day].get(timeframe, {}).get(name)
+                     for day in self.dates[bisect.bisect_left(self.dates, before):]]
+            later = np.array([item for item in later if item is not None], dtype=float)
+            below -= int(np.sum(later < value))
+            equal -= int(np.sum(later == value))
+            total -= len(later)
+        if total < MIN_HISTORY:
+            return None
+        return round(float((below + 0.5 * equal) / total * 100), 1)
+
+    def ranks(self, timeframe: str, values: Dict[str, float], before: Optional[str] = None) -> Dict[str, float]:
+        """Percentil de cada valor de ``values`` (de ``ranked_values``) con historial suficiente"""
+        ranks = {}
+        for name, value in values.items():
+            rank = self.rank(timeframe, name, value, before)
+            if rank is not None:
+                ranks[name] = rank
+        return ranks
+
+
+def percentile_history_path(data_dir: str, symbol: str) -> str:
+    """Archivo del historial de percentiles de ``symbol`` dentro del directorio de datos"""
+    safe_symbol = ''.join(char if char.isalnum() else '_' for char in symbol)
+    return os.path.join(data_dir, 'cache', 'percentiles', f"{safe_symbol}.json")
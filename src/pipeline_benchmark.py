@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de extremo a extremo sin red
+Reproduce ``run_daily_analysis`` / ``run_enhanced_analysis`` N veces contra barras sintéticas
+deterministas (por defecto) o contra las barras y páginas de noticias grabadas de una ejecución
+real, informando p50/p95 del tiempo, asignaciones y tamaño de salida de cada etapa
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import tracemalloc
+import logging
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any
+from unittest import mock
+
+from lazy_imports import lazy_import
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+yf = lazy_import('yfinance')
+requests = lazy_import('requests')
+
+logger = logging.getLogger(__name__)
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(SRC_DIR), 'benchmarks', 'fixtures', 'default')
+FIXTURE_MANIFEST = 'fixtures.json'
+
+PIPELINES = ('daily', 'enhanced')
+SOURCES = ('synthetic', 'recorded')
+
+# Barras sintéticas: precio inicial, volatilidad diaria y volumen diario medio por símbolo
+SYNTHETIC_MARKETS = {
+    '^NDX': (20000.0, 0.012, 4.0e9),
+    'NQ=F': (20100.0, 0.012, 6.0e5),
+    '^GSPC': (5500.0, 0.010, 3.5e9),
+    '^VIX': (16.0, 0.060, 0.0)
+}
+SYNTHETIC_DEFAULT_MARKET = (200.0, 0.020, 5.0e7)
+INTERVAL_MINUTES = {'1m': 1, '2m': 2, '5m': 5, '15m': 15, '30m': 30, '60m': 60, '90m': 90,
+                    '1h': 60, '4h': 240}
+PERIOD_DAYS = {'1d': 1, '5d': 5, '1mo': 30, '3mo': 90, '6mo': 180, '1y': 365, '2y': 730,
+               '5y': 1826, '10y': 3652, 'max': 3652}
+SESSION_MINUTES = 390
+
+
+def bars_key(symbol: str, kwargs: Dict[str, Any]) -> str:
+    """Clave estable de una llamada a ``Ticker.history``
+
+    Las descargas por rango (start/end relativos a ahora) se identifican por su amplitud en días,
+    de modo que la grabación sirve en cualquier fecha.
+    """
+    interval = kwargs.get('interval', '1d')
+    if kwargs.get('start') is not None:
+        span = f"{(kwargs['end'] - kwargs['start']).days}d-range"
+    else:
+        span = kwargs.get('period', '1mo')
+    return f"{symbol}|{interval}|{span}"
+
+
+def _fixture_name(key: str, extension: str) -> str:
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + extension
+
+
+@contextmanager
+def record_fixtures(fixtures_dir: str):
+    """Grabar todas las barras y respuestas HTTP de las ejecuciones dentro del bloque"""
+    os.makedirs(fixtures_dir, exist_ok=True)
+    manifest = {'recorded_at': datetime.now().isoformat(), 'pandas': pd.__version__, 'bars': {}, 'http': {}}
+    original_history = yf.Ticker.history
+    original_send = requests.adapters.HTTPAdapter.send
+
+    def history(ticker, *args, **kwargs):
+        data = original_history(ticker, *args, **kwargs)
+        key = bars_key(ticker.ticker, kwargs)
+        filename = _fixture_name(key, '.pkl')
+        data.to_pickle(os.path.join(fixtures_dir, filename))
+        manifest['bars'][key] = filename
+        return data
+
+    def send(adapter, request, **kwargs):
+        response = original_send(adapter, request, **kwargs)
+        key = f"{request.method} {request.url}"
+        filename = _fixture_name(key, '.body')
+        with open(os.path.join(fixtures_dir, filename), 'wb') as f:
+            f.write(response.content)
+        manifest['http'][key] = {
+            'file': filename,
+            'status_code': response.status_code,
+            'encoding': response.encoding,
+            'headers': {'Content-Type': response.headers.get('Content-Type', '')}
+        }
+        return response
+
+    with mock.patch.object(yf.Ticker, 'history', history), mock.patch.object(requests.adapters.HTTPAdapter, 'send', send):
+        yield manifest
+
+    with open(os.path.join(fixtures_dir, FIXTURE_MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    logger.info(f"Grabadas {len(manifest['bars'])} descargas de barras y {len(manifest['http'])} respuestas HTTP")
+
+
+def _refuse_connection(*args, **kwargs):
+    raise OSError("Red deshabilitada durante el benchmark")
+
+
+@contextmanager
+def replay_fixtures(fixtures_dir: str):
+    """Servir barras y respuestas HTTP desde las grabaciones, con la red bloqueada
+
+    Las barras no grabadas devuelven un DataFrame vacío (como yfinance cuando falla) y las URL
+    no grabadas lanzan ``ConnectionError``.
+    """
+    manifest_path = os.path.join(fixtures_dir, FIXTURE_MANIFEST)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"No hay grabaciones en {fixtures_dir}; ejecuta primero con --record")
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    # Se cargan una vez: el benchmark mide el análisis, no la lectura de las grabaciones
+    bars = {key: pd.read_pickle(os.path.join(fixtures_dir, filename)) for key, filename in manifest['bars'].items()}
+    bodies = {}
+    for key, entry in manifest['http'].items():
+        with open(os.path.join(fixtures_dir, entry['file']), 'rb') as f:
+            bodies[key] = f.read()
+
+    def history(ticker, *args, **kwargs):
+        data = bars.get(bars_key(ticker.ticker, kwargs))
+        return data.copy() if data is not None else pd.DataFrame()
+
+    def send(adapter, request, **kwargs):
+        key = f"{request.method} {request.url}"
+        entry = manifest['http'].get(key)
+        if entry is None:
+            raise requests.ConnectionError(f"Sin grabación para {key}")
+        response = requests.Response()
+        response.status_code = entry['status_code']
+        response._content = bodies[key]
+        response.encoding = entry['encoding']
+        response.headers = requests.structures.CaseInsensitiveDict(entry['headers'])
+        response.url = request.url
+        response.request = request
+        return response
+
+    with mock.patch.object(yf.Ticker, 'history', history), \
+            mock.patch.object(requests.adapters.HTTPAdapter, 'send', send), \
+            mock.patch.object(socket.socket, 'connect', _refuse_connection), \
+            mock.patch.object(socket.socket, 'connect_ex', _refuse_connection):
+        yield manifest
+
+
+def _synthetic_sessions(kwargs: Dict[str, Any], today) -> List:
+    """Días hábiles que cubre una llamada a ``Ticker.history`` (el último, hoy o el hábil anterior)"""
+    if kwargs.get('start') is not None:
+        start = pd.Timestamp(kwargs['start']).normalize()
+        end = pd.Timestamp(kwargs['end']).normalize()
+        return list(pd.bdate_range(start, end - timedelta(days=1)).date)
+    period = kwargs.get('period', '1mo')
+    if period == 'ytd':
+        days = (today - today.replace(month=1, day=1)).days + 1
+    elif period in PERIOD_DAYS:
+        days = PERIOD_DAYS[period]
+    else:
+        days = int(period.rstrip('d'))
+    last = pd.Timestamp(today) if today.weekday() < 5 else pd.Timestamp(today) - pd.offsets.BDay(1)
+    # '1d' y '5d' cuentan sesiones; el resto, días naturales
+    if period in ('1d', '5d'):
+        return list(pd.bdate_range(end=last, periods=days).date)
+    return list(pd.bdate_range(last - timedelta(days=days - 1), last).date)
+
+
+def synthetic_bars(symbol: str, kwargs: Dict[str, Any], seed: int = 0, today=None) -> pd.DataFrame:
+    """Barras OHLCV deterministas con la forma de ``Ticker.history`` (índice en hora de Nueva York)
+
+    Paseo aleatorio geométrico con la semilla derivada de ``seed`` y de la clave de la llamada:
+    la misma llamada devuelve siempre las mismas barras. Las intradía cubren la sesión regular
+    de cada día hábil del periodo.
+    """
+    today = today or datetime.now().date()
+    interval = kwargs.get('interval', '1d')
+    sessions = _synthetic_sessions(kwargs, today)
+    if not sessions:
+        return pd.DataFrame()
+
+    if interval in INTERVAL_MINUTES:
+        minutes = INTERVAL_MINUTES[interval]
+        offsets = pd.to_timedelta(range(570, 570 + SESSION_MINUTES, minutes), unit='min')
+        index = pd.DatetimeIndex([pd.Timestamp(day) + offset for day in sessions for offset in offsets])
+        bars_per_day = len(offsets)
+    else:
+        index = pd.DatetimeIndex([pd.Timestamp(day) for day in sessions])
+        bars_per_day = 1
+    index = index.tz_localize('America/New_York')
+
+    price, daily_sigma, daily_volume = SYNTHETIC_MARKETS.get(symbol, SYNTHETIC_DEFAULT_MARKET)
+    sigma = daily_sigma / np.sqrt(bars_per_day)
+    digest = hashlib.sha1(f"{seed}|{bars_key(symbol, kwargs)}".encode('utf-8')).digest()
+    rng = np.random.default_rng(int.from_bytes(digest[:8], 'little'))
+
+    count = len(index)
+    close = price * np.exp(np.cumsum(rng.normal(0, sigma, count)))
+    open_ = np.concatenate(([price], close[:-1])) * np.exp(rng.normal(0, sigma / 4, count))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, sigma / 2, count)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, sigma / 2, count)))
+    volume = (daily_volume / bars_per_day * rng.lognormal(0, 0.4, count)).astype('int64')
+    return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume},
+                        index=index)
+
+
+@contextmanager
+def synthetic_fixtures(seed: int = 0):
+    """Servir barras sintéticas para cualquier símbolo e intervalo, con la red bloqueada
+
+    Las peticiones HTTP (noticias) fallan como sin conexión, así que esas etapas miden su
+    camino de error; para medir el análisis del HTML hay que grabar con ``--record``.
+    """
+    today = datetime.now().date()
+    bars = {}
+
+    def history(ticker, *args, **kwargs):
+        key = bars_key(ticker.ticker, kwargs)
+        if key not in bars:
+            bars[key] = synthetic_bars(ticker.ticker, kwargs, seed, today)
+        return bars[key].copy()
+
+    def send(adapter, request, **kwargs):
+        raise requests.ConnectionError(f"Sin red en el benchmark sintético: {request.method} {request.url}")
+
+    with mock.patch.object(yf.Ticker, 'history', history), \
+            mock.patch.object(requests.adapters.HTTPAdapter, 'send', send), \
+            mock.patch.object(socket.socket, 'connect', _refuse_connection), \
+            mock.patch.object(socket.socket, 'connect_ex', _refuse_connection):
+        yield {'bars': bars, 'http': {}}
+
+
+def build_analyzer(pipeline: str, data_dir: str, listeners=()):
+    """Analizador nuevo (sin cachés) que escribe en ``data_dir``"""
+    if pipeline == 'daily':
+        from nasdaq_analyzer import NasdaqAnalyzer
+        analyzer = NasdaqAnalyzer()
+        analyzer.snapshot_dir = os.path.join(data_dir, 'snapshots')
+        analyzer.delta_dir = os.path.join(data_dir, 'deltas')
+        # Se mide el cálculo completo de cada etapa, no la lectura de la caché
+        analyzer.stage_cache = None
+    else:
+        from enhanced_analyzer import EnhancedNasdaqAnalyzer
+        analyzer = EnhancedNasdaqAnalyzer()
+    analyzer.data_dir = data_dir
+    analyzer.metrics_dir = os.path.join(data_dir, 'metrics')
+    analyzer.freshness_gate = False
+    analyzer.metrics_listeners.extend(listeners)
+    return analyzer
+
+
+def run_pipeline(pipeline: str, listeners=()) -> Dict[str, Any]:
+    """Una ejecución completa en un directorio temporal: métricas por etapa y tamaño de cada sección"""
+    data_dir = tempfile.mkdtemp(prefix='bench-')
+    try:
+        analyzer = build_analyzer(pipeline, data_dir, listeners)
+        # El analizador mejorado imprime su resumen en cada ejecución
+        with redirect_stdout(io.StringIO()):
+            ok = analyzer.run_daily_analysis() if pipeline == 'daily' else analyzer.run_enhanced_analysis()
+        if not ok:
+            raise RuntimeError(f"La ejecución {pipeline} falló")
+
+        day_files = [name for name in os.listdir(data_dir) if name[:1].isdigit() and name.endswith('.json')]
+        with open(os.path.join(data_dir, day_files[0]), 'r', encoding='utf-8') as f:
+            output = json.load(f)
+        return {
+            'metrics': analyzer.metrics.as_dict(),
+            'output_bytes': {name: len(json.dumps(value, ensure_ascii=False))
+                             for name, value in output.items() if name != 'run_metrics'}
+        }
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentil con interpolación lineal (q entre 0 y 100)"""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(runs: List[Dict[str, Any]], traced: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """p50/p95 del tiempo de pared y CPU por etapa, más asignaciones de la ejecución trazada"""
+    stages = {}
+    for name in runs[0]['metrics']['stages']:
+        wall = [run['metrics']['stages'][name]['wall_ms'] for run in runs if name in run['metrics']['stages']]
+        cpu = [run['metrics']['stages'][name]['cpu_ms'] for run in runs if name in run['metrics']['stages']]
+        stages[name] = {
+            'wall_p50_ms': round(percentile(wall, 50), 1),
+            'wall_p95_ms': round(percentile(wall, 95), 1),
+            'cpu_p50_ms': round(percentile(cpu, 50), 1)
+        }
+        if traced and name in traced['metrics']['stages']:
+            stages[name]['alloc_peak_kb'] = traced['metrics']['stages'][name].get('alloc_peak_kb')
+            stages[name]['alloc_net_kb'] = traced['metrics']['stages'][name].get('alloc_net_kb')
+
+    totals = [run['metrics']['total']['wall_ms'] for run in runs]
+    return {
+        'runs': len(runs),
+        'total': {
+            'wall_p50_ms': round(percentile(totals, 50), 1),
+            'wall_p95_ms': round(percentile(totals, 95), 1),
+            'wall_mean_ms': round(statistics.mean(totals), 1),
+            'peak_rss_mb': max(run['metrics']['total']['peak_rss_mb'] for run in runs)
+        },
+        'stages': stages,
+        'output_bytes': runs[-1]['output_bytes']
+    }
+
+
+def benchmark(pipeline: str, fixtures_dir: Optional[str] = None, runs: int = 10, warmup: int = 1,
+              allocations: bool = True, seed: int = 0) -> Dict[str, Any]:
+    """Reproducir ``pipeline`` ``runs`` veces tras ``warmup`` ejecuciones
+
+    Con ``fixtures_dir`` se usan las grabaciones; sin él, barras sintéticas de la semilla ``seed``.
+    """
+    source = replay_fixtures(fixtures_dir) if fixtures_dir else synthetic_fixtures(seed)
+    with source:
+        for _ in range(warmup):
+            run_pipeline(pipeline)
+        measured = [run_pipeline(pipeline) for _ in range(runs)]
+
+        # tracemalloc multiplica los tiempos: las asignaciones salen de una ejecución aparte
+        traced = None
+        if allocations:
+            tracemalloc.start()
+            try:
+                traced = run_pipeline(pipeline)
+            finally:
+                tracemalloc.stop()
+    return summarize(measured, traced)
+
+
+def print_report(pipeline: str, summary: Dict[str, Any]):
+    """Tabla por etapa y tamaño de salida por sección"""
+    total = summary['total']
+    print(f"\n📊 {pipeline}: {summary['runs']} ejecuciones, p50 {total['wall_p50_ms']:.0f} ms, "
+          f"p95 {total['wall_p95_ms']:.0f} ms, pico RSS {total['peak_rss_mb']} MB")
+    print(f"   {'etapa':<18} {'p50 ms':>9} {'p95 ms':>9} {'CPU p50':>9} {'pico KB':>10} {'neto KB':>10}")
+    for name, stage in summary['stages'].items():
+        peak = f"{stage['alloc_peak_kb']:.0f}" if stage.get('alloc_peak_kb') is not None else '-'
+        net = f"{stage['alloc_net_kb']:.0f}" if stage.get('alloc_net_kb') is not None else '-'
+        print(f"   {name:<18} {stage['wall_p50_ms']:>9.1f} {stage['wall_p95_ms']:>9.1f} "
+              f"{stage['cpu_p50_ms']:>9.1f} {peak:>10} {net:>10}")
+
+    print(f"   {'sección':<28} {'bytes':>10}")
+    for name, size in sorted(summary['output_bytes'].items(), key=lambda item: item[1], reverse=True):
+        print(f"   {name:<28} {size:>10}")
+
+
+def main():
+    """Herramienta de línea de comandos del benchmark de extremo a extremo"""
+    parser = argparse.ArgumentParser(description='Benchmark sin red de las ejecuciones completas')
+    parser.add_argument('--source', choices=SOURCES, default='synthetic',
+                        help='Barras sintéticas deterministas (por defecto) o grabaciones de --record')
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES, help='Directorio de grabaciones')
+    parser.add_argument('--seed', type=int, default=0, help='Semilla de las barras sintéticas')
+    parser.add_argument('--record', action='store_true',
+                        help='Ejecutar una vez con red y grabar barras y respuestas HTTP')
+    parser.add_argument('--pipeline', choices=PIPELINES + ('both',), default='both')
+    parser.add_argument('--runs', type=int, default=10, help='Ejecuciones medidas')
+    parser.add_argument('--warmup', type=int, default=1, help='Ejecuciones de calentamiento')
+    parser.add_argument('--no-allocations', action='store_true',
+                        help='No hacer la ejecución adicional con tracemalloc')
+    parser.add_argument('--json', metavar='ARCHIVO', help='Guardar el resumen en JSON')
+    args = parser.parse_args()
+
+    # Los analizadores registran cada paso en INFO; aquí solo interesan los avisos
+    # (configurarlo antes de importarlos hace que su basicConfig no tenga efecto)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    pipelines = PIPELINES if args.pipeline == 'both' else (args.pipeline,)
+
+    if args.record:
+        with record_fixtures(args.fixtures) as manifest:
+            for pipeline in pipelines:
+                run_pipeline(pipeline)
+        print(f"💾 {len(manifest['bars'])} descargas de barras y {len(manifest['http'])} respuestas "
+              f"HTTP grabadas en {args.fixtures}")
+        return
+
+    try:
+        fixtures_dir = args.fixtures if args.source == 'recorded' else None
+        summaries = {pipeline: benchmark(pipeline, fixtures_dir, args.runs, args.warmup,
+                                         not args.no_allocations, args.seed) for pipeline in pipelines}
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    for pipeline, summary in summaries.items():
+        print_report(pipeline, summary)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summaries, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resumen guardado en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
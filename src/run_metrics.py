@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Métricas por etapa de cada ejecución del análisis
+Tiempo de pared, tiempo de CPU, bytes descargados y pico de memoria de cada etapa,
+guardados en la sección ``run_metrics`` y en un histórico rodante (JSONL)
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+import logging
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+METRICS_FILENAME = "run_metrics.jsonl"
+MAX_METRICS_ROWS = 2000
+
+
+def current_rss_mb() -> Optional[float]:
+    """Memoria residente actual del proceso (MB); solo en Linux"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return round(resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+
+
+def peak_rss_mb() -> float:
+    """Pico de memoria residente del proceso hasta ahora (MB)"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa en KB y macOS en bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class RunMetrics:
+    """Acumula las métricas de las etapas de una ejecución
+
+    Las etapas pueden anidarse; los bytes descargados se atribuyen a la etapa más interna.
+    El pico de memoria es el máximo del proceso al terminar la etapa, de modo que la etapa
+    en la que sube es la que lo ha provocado. Si ``tracemalloc`` está activo se añaden el pico
+    de memoria asignada por Python dentro de la etapa y lo que queda asignado al terminar.
+    """
+
+    def __init__(self, run_type: str, listeners: Optional[List[Callable[[str, Dict[str, Any]], None]]] = None):
+        self.run_type = run_type
+        # Se llaman con (etapa, registro) al terminar cada etapa (ver memory_profile.py)
+        self.listeners = list(listeners or [])
+        self.started_at = datetime.now().isoformat()
+        self.stages = {}
+        self._stack = []
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self.bytes_fetched = 0
+
+    @contextmanager
+    def stage(self, name: str):
+        """Medir un bloque de código como etapa ``name``"""
+        record = self.stages.setdefault(name, {'wall_ms': 0.0, 'cpu_ms': 0.0, 'bytes_fetched': 0, 'peak_rss_mb': 0.0})
+        tracing = tracemalloc.is_tracing()
+        frame = {'record': record, 'traced_start': 0, 'traced_peak': 0}
+        if tracing:
+            # reset_peak borra el pico de la etapa exterior: se guarda antes en su marco
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]['traced_peak'] = max(self._stack[-1]['traced_peak'], peak)
+            tracemalloc.reset_peak()
+            frame['traced_start'] = current
+        self._stack.append(frame)
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_ms'] = round(record['wall_ms'] + (time.perf_counter() - wall_start) * 1000, 1)
+            record['cpu_ms'] = round(record['cpu_ms'] + (time.process_time() - cpu_start) * 1000, 1)
+            record['peak_rss_mb'] = peak_rss_mb()
+            self._stack.pop()
+            if tracing and tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, frame['traced_peak'])
+                record['alloc_peak_kb'] = max(record.get('alloc_peak_kb', 0),
+                                              round((peak - frame['traced_start']) / 1024, 1))
+                record['alloc_net_kb'] = round(record.get('alloc_net_kb', 0) +
+                                               (current - frame['traced_start']) / 1024, 1)
+                if self._stack:
+                    self._stack[-1]['traced_peak'] = max(self._stack[-1]['traced_peak'], peak)
+            for listener in self.listeners:
+                listener(name, record)
+
+    def add_bytes(self, count: int):
+        """Registrar bytes descargados en la etapa en curso"""
+        self.bytes_fetched += count
+        if self._stack:
+            self._stack[-1]['record']['bytes_fetched'] += count
+
+    def add_frame(self, frame):
+        """Registrar una descarga de barras por su tamaño en memoria
+
+        yfinance gestiona su propia conexión, así que no se ven los bytes de red; el tamaño
+        del DataFrame resultante es una aproximación estable para comparar ejecuciones.
+        """
+        if frame is not None:
+            self.add_bytes(int(frame.memory_usage(deep=True).sum()))
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Resumen serializable para la sección ``run_metrics`` del archivo diario"""
+        return {
+            'run_type': self.run_type,
+            'started_at': self.started_at,
+            'total': {
+                'wall_ms': round((time.perf_counter() - self._wall_start) * 1000, 1),
+                'cpu_ms': round((time.process_time() - self._cpu_start) * 1000, 1),
+                'bytes_fetched': self.bytes_fetched,
+                'peak_rss_mb': peak_rss_mb()
+            },
+            'stages': self.stages
+        }
+
+
+def measure(metrics: Optional[RunMetrics], name: str):
+    """``metrics.stage(name)`` o un contexto vacío si la ejecución no se está midiendo"""
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+
+def append_metrics_log(metrics_dir: str, entry: Dict[str, Any], max_rows: int = MAX_METRICS_ROWS) -> str:
+    """Añadir una ejecución al histórico rodante conservando solo las últimas ``max_rows``"""
+    os.makedirs(metrics_dir, exist_ok=True)
+    path = os.path.join(metrics_dir, METRICS_FILENAME)
+    line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        rows = f.readlines()
+    if len(rows) > max_rows:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(rows[-max_rows:])
+        os.replace(tmp_path, path)
+    return path
+
+
+def load_metrics_log(metrics_dir: str) -> List[Dict[str, Any]]:
+    """Leer el histórico de métricas (más antiguas primero)"""
+    path = os.path.join(metrics_dir, METRICS_FILENAME)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Búsqueda de días históricos similares
+Un vector de características normalizado por día (RSI, MACD, anchura de Bollinger, RVOL...)
+extraído de ``technical_indicators`` de los archivos diarios guardados, indexado en un KD-tree.
+Dado el vector de hoy devuelve los K días más parecidos y qué hizo el precio después. El almacén
+se sincroniza de forma incremental con los archivos nuevos y el índice solo se reconstruye
+cuando se acumulan suficientes días sin indexar
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+from lazy_imports import lazy_import
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+from storage import DAY_FILE_PATTERN
+
+logger = logging.getLogger(__name__)
+
+FEATURES = ('rsi', 'macd_histogram_pct', 'bb_width', 'stoch_k', 'cci', 'mfi', 'di_spread', 'rvol',
+            'daily_range_pct', 'daily_change_pct', 'sma_20_distance_pct', 'atr_pct')
+PRICE_COLUMNS = ('close', 'high', 'low')
+
+DEFAULT_NEIGHBORS = 10
+# Sesiones hacia delante de los resultados de cada vecino
+HORIZONS = (1, 5)
+
+
+def _number(value) -> float:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+
+
+def snapshot_features(indicators: Dict[str, Any]) -> Dict[str, float]:
+    """Características y precios de un día a partir de su ``technical_indicators``
+
+    Las medidas en puntos se pasan a % del cierre para que días de décadas distintas sean
+    comparables. Las que falten quedan en NaN y el día no se indexa.
+    """
+    indicators = indicators or {}
+    close = _number(indicators.get('last_close'))
+    sma_20 = _number(indicators.get('sma_20'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'rsi': _number(indicators.get('rsi')),
+            'macd_histogram_pct': _number(indicators.get('macd_histogram')) / close * 100,
+            'bb_width': _number(indicators.get('bb_width')),
+            'stoch_k': _number(indicators.get('stoch_k')),
+            'cci': _number(indicators.get('cci')),
+            'mfi': _number(indicators.get('mfi')),
+            'di_spread': _number(indicators.get('plus_di')) - _number(indicators.get('minus_di')),
+            'rvol': _number(indicators.get('rvol')),
+            'daily_range_pct': _number(indicators.get('daily_range_pct')),
+            'daily_change_pct': _number(indicators.get('daily_change_pct')),
+            'sma_20_distance_pct': (close - sma_20) / sma_20 * 100,
+            'atr_pct': _number(indicators.get('atr')) / close * 100,
+            'close': close,
+            'high': _number(indicators.get('last_high')),
+            'low': _number(indicators.get('last_low')),
+        }
+
+
+class FeatureStore:
+    """Una fila de características y precios por día, persistida en CSV
+
+    Se sincroniza con el directorio de datos leyendo solo los archivos diarios que no están en el
+    almacén o que se han modificado después de la última sincronización.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.frame = pd.DataFrame(columns=list(FEATURES + PRICE_COLUMNS), index=pd.DatetimeIndex([]), dtype=float)
+        self.synced_at = 0.0
+        # Contador de modificaciones y días cambiados desde la última construcción del índice
+        self.version = 0
+        self.changed = set()
+        if os.path.exists(path):
+            try:
+                self.frame = pd.read_csv(path, index_col=0, parse_dates=True).reindex(
+                    columns=list(FEATURES + PRICE_COLUMNS))
+                self.synced_at = os.path.getmtime(path)
+            except Exception as e:
+                logger.warning(f"No se pudo leer el almacén de características {path}: {e}")
+
+    def add(self, day, indicators: Dict[str, Any]) -> bool:
+        """Añadir o sustituir el día ``day``; devuelve True si la fila cambia"""
+        day = pd.Timestamp(day).normalize()
+        row = pd.Series(snapshot_features(indicators))
+        if day in self.frame.index and self.frame.loc[day].equals(row.reindex(self.frame.columns)):
+            return False
+        self.frame.loc[day] = row
+        if len(self.frame) > 1 and self.frame.index[-2] > day:
+            self.frame.sort_index(inplace=True)
+        self.version += 1
+        self.changed.add(day)
+        return True
+
+    def sync(self, data_dir: str) -> int:
+        """Incorporar los archivos diarios nuevos o modificados; devuelve cuántos días cambian"""
+        try:
+            entries = [entry for entry in os.scandir(data_dir) if DAY_FILE_PATTERN.match(entry.name)]
+        except FileNotFoundError:
+            return 0
+        known = set(self.frame.index)
+        changed = 0
+        for entry in sorted(entries, key=lambda item: item.name):
+            year, month, day = DAY_FILE_PATTERN.match(entry.name).groups()
+            date = pd.Timestamp(int(year), int(month), int(day))
+            if date in known and entry.stat().st_mtime <= self.synced_at:
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    indicators = json.load(f).get('technical_indicators') or {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"No se pudo leer {entry.name} para el almacén de características: {e}")
+                continue
+            changed += int(self.add(date, indicators))
+        return changed
+
+    def save(self):
+        """Guardar el almacén de forma atómica"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        self.frame.to_csv(tmp_path)
+        os.replace(tmp_path, self.path)
+        self.synced_at = os.path.getmtime(self.path)
+
+
+class SimilarDayIndex:
+    """KD-tree sobre los vectores normalizados de los días anteriores a una fecha de corte
+
+    La normalización (z-score), el árbol y el recuento de días solo usan los días anteriores a
+    la fecha de la consulta: volver a analizar un día con las mismas barras da la misma sección
+    aunque entretanto se haya guardado su propio archivo (y el hash de mercado no cambia). El
+    árbol se reconstruye al cambiar la fecha de corte o algún día anterior a ella; los días
+    guardados desde la fecha de corte, como las ejecuciones del propio día, no lo invalidan.
+    """
+
+    def __init__(self, store: FeatureStore):
+        self.store = store
+        self.tree = None
+        self.cutoff = None
+        self._version = None
+
+    def _load_rows(self):
+        """Fechas, precios y características de todos los días del almacén"""
+        frame = self.store.frame
+        # Un día sin barra nueva (festivo, ejecución antes de la apertura) repite el cierre anterior
+        frame = frame[frame['close'].ne(frame['close'].shift())]
+        self.dates = pd.DatetimeIndex(frame.index)
+        self.prices = frame[list(PRICE_COLUMNS)].to_numpy(dtype=float)
+        self.features = frame[list(FEATURES)].to_numpy(dtype=float)
+        self.complete = np.isfinite(self.features).all(axis=1)
+
+    def rebuild(self, cutoff):
+        """Recalcular la normalización y el árbol con los días completos anteriores a ``cutoff``"""
+        self._load_rows()
+        self.cutoff = cutoff
+        self._version = self.store.version
+        self.store.changed = set()
+        self._tree_rows = np.flatnonzero(self.complete & (self.dates < cutoff))
+        self.mean, self.std = np.zeros(len(FEATURES)), np.ones(len(FEATURES))
+        if len(self._tree_rows):
+            self.mean = self.features[self._tree_rows].mean(axis=0)
+            std = self.features[self._tree_rows].std(axis=0)
+            self.std = np.where(std > 0, std, 1.0)
+        self.vectors = (self.features - self.mean) / self.std
+
+        self.tree = None
+        if len(self._tree_rows):
+            try:
+                from sklearn.neighbors import KDTree
+                self.tree = KDTree(self.vectors[self._tree_rows])
+            except ImportError:
+                logger.warning("sklearn no disponible: búsqueda de días similares por fuerza bruta")
+
+    def refresh(self, cutoff):
+        """Poner al día el árbol para consultas con fecha de corte ``cutoff``"""
+        if self.cutoff != cutoff:
+            self.rebuild(cutoff)
+            return
+        if self._version == self.store.version:
+            return
+        changed = self.store.changed
+        if changed and min(changed) < cutoff:
+            self.rebuild(cutoff)
+            return
+        # Solo cambian días desde la fecha de corte: se añaden al final y no mueven las filas indexadas
+        self._version = self.store.version
+        self.store.changed = set()
+
+    def normalize(self, features: Dict[str, float]) -> Optional[np.ndarray]:
+        vector = np.array([features.get(name, np.nan) for name in FEATURES], dtype=float)
+        if not np.isfinite(vector).all():
+            return None
+        return (vector - self.mean) / self.std
+
+    def _candidates(self, vector: np.ndarray, count: int) -> List[tuple]:
+        """(distancia, fila) de los ``count`` días indexados más cercanos"""
+        count = min(count, len(self._tree_rows))
+        if count <= 0:
+            return []
+        if self.tree is not None:
+            distances, positions = self.tree.query(vector[None, :], k=count)
+            return [(float(distance), int(self._tree_rows[position]))
+                    for distance, position in zip(distances[0], positions[0])]
+        distances = np.linalg.norm(self.vectors[self._tree_rows] - vector, axis=1)
+        nearest = np.argsort(distances)[:count]
+        return [(float(distances[position]), int(self._tree_rows[position])) for position in nearest]
+
+    def outcomes(self, row: int, before) -> Dict[str, Optional[float]]:
+        """Variación del cierre a 1 y 5 sesiones y máximo/mínimo de la sesión siguiente (%)"""
+        close = self.prices[row, 0]
+
+        def change(target: int, column: int = 0) -> Optional[float]:
+            if target >= len(self.dates) or self.dates[target] >= before:
+                return None
+            return round(float((self.prices[target, column] - close) / close * 100), 3)
+
+        result = {f'next_{horizon}d_pct': change(row + horizon) for horizon in HORIZONS}
+        result['next_high_pct'] = change(row + 1, 1)
+        result['next_low_pct'] = change(row + 1, 2)
+        return result
+
+    def query(self, indicators: Dict[str, Any], k: int = DEFAULT_NEIGHBORS, before=None) -> Dict[str, Any]:
+        """Los ``k`` días anteriores a ``before`` (por defecto, hoy) más parecidos y su evolución
+
+        Solo se devuelven días con resultado a 1 sesión anterior a ``before``: los más recientes
+        aún no lo tienen.
+        """
+        before = pd.Timestamp(before or datetime.now()).normalize()
+        self.refresh(before)
+        vector = self.normalize(snapshot_features(indicators))
+        if vector is None:
+            return {'error': 'Faltan indicadores para construir el vector del día'}
+
+        # Se pide un vecino de más: la víspera de ``before`` aún no tiene resultado
+        neighbors = []
+        for distance, row in sorted(self._candidates(vector, k + 1)):
+            outcome = self.outcomes(row, before)
+            if outcome['next_1d_pct'] is None:
+                continue
+            neighbors.append({'date': str(self.dates[row].date()), 'distance': round(distance, 3),
+                              'close': round(float(self.prices[row, 0]), 2), **outcome})
+            if len(neighbors) == k:
+                break
+
+        summary = {}
+        for key in [f'next_{horizon}d_pct' for horizon in HORIZONS]:
+            values = np.array([item[key] for item in neighbors if item[key] is not None], dtype=float)
+            if len(values):
+                summary[key] = {
+                    'mean': round(float(values.mean()), 3),
+                    'median': round(float(np.median(values)), 3),
+                    'positive_pct': round(float((values > 0).mean() * 100), 1),
+                    'count': int(len(values))
+                }
+        return {
+            'history_days': int(len(self._tree_rows)),
+            'features': list(FEATURES),
+            'neighbors': neighbors,
+            'outcomes': summary
+        }
+
+
+def similar_days_path(data_dir: str, symbol: str) -> str:
+    """Archivo del almacén de características de ``symbol`` dentro del directorio de datos"""
+    safe_symbol = ''.join(char if char.isalnum() else '_' for char in symbol)
+    return os.path.join(data_dir, 'cache', 'similar_days', f"{safe_symbol}.csv")
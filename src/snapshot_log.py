@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registro intradía de snapshots en modo solo-anexar (JSONL)
+Cada ejecución añade únicamente los campos y barras que cambiaron desde el snapshot anterior
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import logging
+import shutil
+from datetime import datetime
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Secciones cuyas listas de barras se codifican como "truncar y anexar"
+BAR_SECTIONS = ('chart_data',)
+
+
+def _diff_values(prev: Any, curr: Any, path: List[str], sets: List, unsets: List) -> None:
+    """Comparar recursivamente dos valores y acumular las rutas modificadas"""
+    if isinstance(prev, dict) and isinstance(curr, dict):
+        for key, value in curr.items():
+            if key not in prev:
+                sets.append([path + [key], value])
+            else:
+                _diff_values(prev[key], value, path + [key], sets, unsets)
+        for key in prev:
+            if key not in curr:
+                unsets.append(path + [key])
+    elif prev != curr:
+        sets.append([path, curr])
+
+
+def _diff_bars(prev: List[Dict], curr: List[Dict]) -> Optional[Dict[str, Any]]:
+    """Delta de una lista de barras: índice desde el que cambia y barras nuevas o revisadas"""
+    common = 0
+    limit = min(len(prev), len(curr))
+    while common < limit and prev[common] == curr[common]:
+        common += 1
+    if common == len(prev) == len(curr):
+        return None
+    return {'from': common, 'rows': curr[common:]}
+
+
+def diff_states(prev: Dict[str, Any], curr: Dict[str, Any]) -> Dict[str, Any]:
+    """Calcular el delta entre dos estados completos del análisis"""
+    sets, unsets, bars = [], [], {}
+
+    for key, value in curr.items():
+        if key in BAR_SECTIONS and isinstance(value, dict) and isinstance(prev.get(key), dict):
+            for timeframe, rows in value.items():
+                prev_rows = prev[key].get(timeframe)
+                if not isinstance(rows, list) or not isinstance(prev_rows, list):
+                    if prev_rows != rows:
+                        sets.append([[key, timeframe], rows])
+                    continue
+                bar_delta = _diff_bars(prev_rows, rows)
+                if bar_delta:
+                    bars.setdefault(key, {})[timeframe] = bar_delta
+            for timeframe in prev[key]:
+                if timeframe not in value:
+                    unsets.append([key, timeframe])
+        elif key not in prev:
+            sets.append([[key], value])
+        else:
+            _diff_values(prev[key], value, [key], sets, unsets)
+
+    for key in prev:
+        if key not in curr:
+            unsets.append([key])
+
+    delta = {}
+    if sets:
+        delta['set'] = sets
+    if unsets:
+        delta['unset'] = unsets
+    if bars:
+        delta['bars'] = bars
+    return delta
+
+
+def log_epoch(timestamp: str) -> str:
+    """Identificador del linaje de un registro a partir del instante de su snapshot completo (v1)"""
+    return hashlib.sha1(timestamp.encode('utf-8')).hexdigest()[:8]
+
+
+def apply_delta(state: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Aplicar un delta sobre un estado (modifica y devuelve el mismo diccionario)"""
+    for path, value in delta.get('set', []):
+        target = state
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = value
+
+    for path in delta.get('unset', []):
+        target = state
+        for key in path[:-1]:
+            target = target.get(key, {})
+        if isinstance(target, dict):
+            target.pop(path[-1], None)
+
+    for section, timeframes in delta.get('bars', {}).items():
+        section_state = state.setdefault(section, {})
+        for timeframe, bar_delta in timeframes.items():
+            rows = section_state.get(timeframe) or []
+            section_state[timeframe] = rows[:bar_delta['from']] + bar_delta['rows']
+
+    return state
+
+
+class SnapshotLog:
+    """Registro JSONL de snapshots intradía para un día concreto
+
+    La primera línea es un snapshot completo y las siguientes son deltas. Tras la
+    compactación el segmento se guarda comprimido como ``YYYYMMDD.jsonl.gz``.
+    """
+
+    def __init__(self, log_dir: str, day: str):
+        self.log_dir = log_dir
+        self.day = day
+        self.path = os.path.join(log_dir, f"{day}.jsonl")
+        self.compacted_path = self.path + '.gz'
+        self._last_state = None
+        self._last_version = 0
+        self._epoch = None
+        self.last_record = None
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
+    def _open_for_read(self):
+        if os.path.exists(self.path):
+            return open(self.path, 'r', encoding='utf-8')
+        if os.path.exists(self.compacted_path):
+            return gzip.open(self.compacted_path, 'rt', encoding='utf-8')
+        return None
+
+    def iter_records(self):
+        """Iterar los registros del día en orden de escritura"""
+        f = self._open_for_read()
+        if f is None:
+            return
+        with f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    def _replay(self, until: Optional[str] = None, version: Optional[int] = None) -> Tuple[Dict[str, Any], int]:
+        state, last_version = {}, 0
+        for record in self.iter_records():
+            if until is not None and record['ts'] > until:
+                break
+            if version is not None and record['v'] > version:
+                break
+            if record['type'] == 'full':
+                state = record['state']
+            else:
+                apply_delta(state, record['delta'])
+            last_version = record['v']
+        return state, last_version
+
+    def read_state(self, at: Optional[str] = None, version: Optional[int] = None) -> Dict[str, Any]:
+        """Reconstruir el estado en un instante (ISO) o versión concretos; por defecto el último"""
+        state, _ = self._replay(until=at, version=version)
+        return state
+
+    def latest(self) -> Tuple[Dict[str, Any], int]:
+        """Último estado reconstruido y su versión"""
+        if self._last_state is None:
+            self._last_state, self._last_version = self._replay()
+        return self._last_state, self._last_version
+
+    @property
+    def epoch(self) -> Optional[str]:
+        """Linaje del registro: si se pierde y vuelve a empezar en v1, el nuevo tiene otro epoch"""
+        if self._epoch is None:
+            records = self.iter_records()
+            first = next(records, None)
+            records.close()
+            if first is not None:
+                self._epoch = log_epoch(first['ts'])
+        return self._epoch
+
+    def append(self, state: Dict[str, Any]) -> Optional[int]:
+        """Añadir un snapshot; solo se escribe lo que cambió. Devuelve la versión o None si no hubo cambios"""
+        if os.path.exists(self.compacted_path) and not os.path.exists(self.path):
+            # Reabrir un día ya compactado: descomprimir para seguir anexando
+            with gzip.open(self.compacted_path, 'rb') as src, open(self.path, 'wb') as dst:
+                dst.write(src.read())
+            os.remove(self.compacted_path)
+
+        prev_state, prev_version = self.latest()
+        timestamp = state.get('timestamp') or datetime.now().isoformat()
+
+        if prev_version == 0:
+            record = {'v': 1, 'ts': timestamp, 'type': 'full', 'state': state}
+            self._epoch = log_epoch(timestamp)
+        else:
+            delta = diff_states(prev_state, state)
+            if not delta:
+                return None
+            record = {'v': prev_version + 1, 'ts': timestamp, 'type': 'delta', 'delta': delta}
+
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._last_state = json.loads(json.dumps(state))
+        self._last_version = record['v']
+        self.last_record = record
+        logger.info(f"Snapshot v{record['v']} añadido a {self.path} ({len(line)} bytes)")
+        return record['v']
+
+    def compact(self) -> Optional[str]:
+        """Reescribir el registro con deltas mínimos y comprimirlo (paso de fin de día)"""
+        if not os.path.exists(self.path):
+            return None
+
+        records = []
+        state, prev = {}, None
+        for record in self.iter_records():
+            if record['type'] == 'full':
+                state = record['state']
+            else:
+                apply_delta(state, record['delta'])
+            current = json.loads(json.dumps(state))
+            if prev is None:
+                records.append({'v': record['v'], 'ts': record['ts'], 'type': 'full', 'state': current})
+            else:
+                delta = diff_states(prev, current)
+                if delta:
+                    records.append({'v': record['v'], 'ts': record['ts'], 'type': 'delta', 'delta': delta})
+            prev = current
+
+        tmp_path = self.compacted_path + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        os.replace(tmp_path, self.compacted_path)
+
+        original_size = os.path.getsize(self.path)
+        os.remove(self.path)
+        logger.info(f"Registro {self.day} compactado: {original_size} -> {os.path.getsize(self.compacted_path)} bytes")
+        return self.compacted_path
+
+
+def compact_stale_logs(log_dir: str, today: str,
+                       materialize: Optional[Callable[[str, Dict[str, Any], int], None]] = None) -> List[str]:
+    """Compactar los registros de días anteriores que siguen sin comprimir
+
+    Con ``materialize`` se entrega antes el estado final de cada día (día, estado, versión) para
+    que quien llama lo vuelque en el archivo diario completo.
+    """
+    compacted = []
+    if not os.path.isdir(log_dir):
+        return compacted
+    for name in sorted(os.listdir(log_dir)):
+        if name.endswith('.jsonl') and name[:-len('.jsonl')] < today:
+            log = SnapshotLog(log_dir, name[:-len('.jsonl')])
+            if materialize is not None:
+                state, version = log.latest()
+                if state:
+                    materialize(log.day, state, version)
+            path = log.compact()
+            if path:
+                compacted.append(path)
+    return compacted
+
+
+def write_delta_payload(delta_dir: str, day: str, record: Dict[str, Any], epoch: str) -> Optional[str]:
+    """Publicar el delta N-1 -> N como documento independiente para el dashboard
+
+    Los documentos son inmutables: ``deltas/YYYYMMDD/<epoch>/v{N}.json`` siempre describe el paso
+    de la versión N-1 a la N de un mismo registro, por lo que el cliente puede cachearlos sin
+    límite. Un registro que vuelve a empezar en v1 publica bajo otro epoch y no reutiliza URLs.
+    """
+    if record.get('type') != 'delta':
+        return None
+
+    epoch_dir = os.path.join(delta_dir, day, epoch)
+    if not os.path.exists(epoch_dir):
+        os.makedirs(epoch_dir)
+
+    payload = {
+        'day': day,
+        'epoch': epoch,
+        'from_version': record['v'] - 1,
+        'to_version': record['v'],
+        'timestamp': record['ts'],
+        'delta': record['delta']
+    }
+    path = os.path.join(epoch_dir, f"v{record['v']}.json")
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return path
+
+
+def prune_delta_payloads(delta_dir: str, today: str) -> None:
+    """Eliminar los deltas de días anteriores; el cliente recarga el archivo diario completo"""
+    if not os.path.isdir(delta_dir):
+        return
+    for name in os.listdir(delta_dir):
+        day_dir = os.path.join(delta_dir, name)
+        if name < today and os.path.isdir(day_dir):
+            shutil.rmtree(day_dir)
+
+
+def main():
+    """Herramienta de línea de comandos para reproducir y compactar registros"""
+    parser = argparse.ArgumentParser(description='Registro intradía de snapshots')
+    parser.add_argument('command', choices=['replay', 'compact', 'info'])
+    parser.add_argument('day', help='Día en formato YYYYMMDD')
+    parser.add_argument('--log-dir', default=os.path.join('data', 'snapshots'))
+    parser.add_argument('--at', help='Instante ISO hasta el que reproducir (p. ej. 2025-09-05T15:30)')
+    parser.add_argument('--version', type=int, help='Versión hasta la que reproducir')
+    args = parser.parse_args()
+
+    log = SnapshotLog(args.log_dir, args.day)
+    if args.command == 'replay':
+        print(json.dumps(log.read_state(at=args.at, version=args.version), indent=2, ensure_ascii=False))
+    elif args.command == 'compact':
+        print(log.compact() or 'Nada que compactar')
+    else:
+        for record in log.iter_records():
+            size = len(json.dumps(record, separators=(',', ':')))
+            print(f"v{record['v']:>3}  {record['ts']}  {record['type']:<5}  {size} bytes")
+
+
+if __name__ == "__main__":
+    main()
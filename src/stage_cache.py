@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memoización en disco de las etapas deterministas del análisis
+Cada resultado se guarda bajo un hash de sus entradas y de la versión del código que lo calcula,
+de modo que una ejecución sobre las mismas barras reutiliza las etapas cuyas entradas no se han
+movido. El tamaño total está acotado con expulsión LRU
+"""
+
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from lazy_imports import lazy_import
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+# Cambiar si cambia el formato de las entradas de la caché
+CACHE_FORMAT = 1
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+ENTRY_SUFFIX = '.pkl'
+
+_source_hashes = {}
+
+
+def source_version(func: Callable) -> str:
+    """Hash de los módulos junto al archivo fuente de ``func`` y de las versiones de pandas/numpy
+
+    Se usan todos los módulos del directorio y no solo la función: los métodos llaman a otros
+    métodos y a módulos auxiliares (p. ej. ``anchored_vwap.py``), y cualquier cambio en ellos
+    debe invalidar los resultados guardados.
+    """
+    source_dir = os.path.dirname(os.path.abspath(inspect.getsourcefile(func)))
+    if source_dir not in _source_hashes:
+        digest = hashlib.sha256()
+        for name in sorted(os.listdir(source_dir)):
+            if name.endswith('.py'):
+                digest.update(name.encode())
+                with open(os.path.join(source_dir, name), 'rb') as f:
+                    digest.update(f.read())
+        digest.update(f"{pd.__version__}|{np.__version__}|{CACHE_FORMAT}".encode())
+        _source_hashes[source_dir] = digest.hexdigest()
+    return _source_hashes[source_dir]
+
+
+def _update_hash(digest, value: Any):
+    """Añadir ``value`` al hash de forma canónica (orden de claves, tipos y contenido exacto)"""
+    if isinstance(value, pd.DataFrame):
+        digest.update(b'DataFrame')
+        digest.update(repr(list(value.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, pd.Series):
+        digest.update(b'Series')
+        digest.update(repr(value.name).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(f"ndarray{value.dtype}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        digest.update(b'{')
+        for key in sorted(value, key=repr):
+            _update_hash(digest, key)
+            _update_hash(digest, value[key])
+        digest.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        digest.update(b'[' if isinstance(value, list) else b'(')
+        for item in value:
+            _update_hash(digest, item)
+        digest.update(b']')
+    else:
+        # repr de float es exacto; el tipo distingue 1 de 1.0 y de '1'
+        digest.update(f"{type(value).__name__}:{value!r};".encode())
+
+
+def inputs_hash(inputs: Iterable[Any]) -> str:
+    """Hash de contenido de las entradas de una etapa"""
+    digest = hashlib.sha256()
+    for value in inputs:
+        _update_hash(digest, value)
+    return digest.hexdigest()
+
+
+class StageCache:
+    """Resultados de etapas en ``cache_dir``, uno por archivo, con expulsión LRU por tamaño
+
+    La fecha de modificación de cada archivo hace de marca de último uso: se actualiza en
+    cada acierto y al superar ``max_bytes`` se borran primero los menos usados. Las escrituras
+    son atómicas, así que varios procesos (backfill) pueden compartir el directorio.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = []
+        self.misses = []
+
+    def reset_stats(self):
+        """Olvidar los aciertos y fallos registrados (al empezar cada ejecución)"""
+        self.hits = []
+        self.misses = []
+
+    def stats(self) -> Dict[str, List[str]]:
+        """Etapas reutilizadas y recalculadas desde el último ``reset_stats``"""
+        return {'hits': list(self.hits), 'misses': list(self.misses)}
+
+    def key(self, stage: str, func: Callable, inputs: Tuple[Any, ...]) -> str:
+        """Clave de la entrada: etapa, versión del código y contenido de las entradas"""
+        return hashlib.sha256(f"{stage}|{source_version(func)}|{inputs_hash(inputs)}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """(True, valor) si la entrada existe y se puede leer; (False, None) si no"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        except Exception as e:
+            logger.warning(f"Entrada de caché ilegible {path}: {e}")
+            return False, None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return True, value
+
+    def put(self, key: str, value: Any):
+        """Guardar una entrada de forma atómica y expulsar las menos usadas si hace falta"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp_')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Borrar las entradas menos usadas hasta quedar por debajo de ``max_bytes``"""
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(ENTRY_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return
+
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def get_or_compute(self, stage: str, func: Callable, inputs: Tuple[Any, ...]) -> Any:
+        """``func(*inputs)`` desde la caché si ya se calculó con las mismas entradas y código"""
+        try:
+            key = self.key(stage, func, inputs)
+        except Exception as e:
+            logger.warning(f"No se pudo calcular la clave de caché de '{stage}': {e}")
+            return func(*inputs)
+
+        found, value = self.get(key)
+        if found:
+            self.hits.append(stage)
+            return value
+
+        self.misses.append(stage)
+        value = func(*inputs)
+        # Los métodos del analizador devuelven {'error': ...} al fallar: no se memoriza el fallo
+        if isinstance(value, dict) and 'error' in value:
+            return value
+        try:
+            self.put(key, value)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar '{stage}' en la caché de etapas: {e}")
+        return value
+
+
+def stage_cache_dir(data_dir: str) -> str:
+    """Directorio de la caché de etapas dentro del directorio de datos"""
+    return os.path.join(data_dir, 'cache', 'stages')
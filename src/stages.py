@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Selección de etapas del análisis desde la línea de comandos
+Las etapas que no se ejecutan conservan los valores del archivo diario existente
+"""
+
+import argparse
+import json
+import os
+import logging
+from typing import Dict, Iterable, Optional, Set, Tuple, Any
+
+from storage import load_manifest
+from snapshot_log import SnapshotLog
+
+logger = logging.getLogger(__name__)
+
+# Secciones que son listas; el resto se inicializa como diccionario si no hay valor previo
+LIST_SECTIONS = ('news', 'economic_events')
+
+
+def parse_stage_list(values: Optional[Iterable[str]]) -> Set[str]:
+    """Aceptar tanto ``--only news,vix`` como ``--only news --only vix``"""
+    stages = set()
+    for value in values or []:
+        stages.update(name.strip() for name in value.split(',') if name.strip())
+    return stages
+
+
+def resolve_stages(available: Iterable[str], only: Optional[Iterable[str]] = None,
+                   skip: Optional[Iterable[str]] = None,
+                   dependencies: Optional[Dict[str, Tuple[str, ...]]] = None) -> Set[str]:
+    """Calcular el conjunto de etapas a ejecutar a partir de ``--only`` y ``--skip``
+
+    Las dependencias de una etapa seleccionada se añaden automáticamente salvo que se hayan
+    excluido de forma explícita, en cuyo caso se lanza ``ValueError``.
+    """
+    available = tuple(available)
+    only, skip = parse_stage_list(only), parse_stage_list(skip)
+
+    unknown = (only | skip) - set(available)
+    if unknown:
+        raise ValueError(f"Etapas desconocidas: {', '.join(sorted(unknown))}. "
+                         f"Disponibles: {', '.join(available)}")
+
+    selected = (only or set(available)) - skip
+    for stage in sorted(selected):
+        for dependency in (dependencies or {}).get(stage, ()):
+            if dependency in skip:
+                raise ValueError(f"La etapa '{stage}' requiere '{dependency}'")
+            selected.add(dependency)
+
+    if not selected:
+        raise ValueError("No queda ninguna etapa que ejecutar")
+    return selected
+
+
+def load_previous_analysis(data_dir: str, day: str, snapshot_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Análisis previo del que se toman las etapas omitidas
+
+    Con ``snapshot_dir`` se usa primero el último estado del registro intradía del día (el archivo
+    diario solo se reescribe en los puntos de control). Si no, el archivo del día; si aún no existe
+    (p. ej. antes de la apertura), el último día registrado en el manifiesto.
+    """
+    if snapshot_dir and os.path.exists(os.path.join(snapshot_dir, f"{day}.jsonl")):
+        try:
+            state, version = SnapshotLog(snapshot_dir, day).latest()
+            if state:
+                return dict(state, snapshot_version=version)
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudo reconstruir el registro intradía {day}: {e}")
+
+    candidates = [f"{day}.json"]
+    latest = load_manifest(data_dir)['days'][:1]
+    if latest:
+        candidates.append(latest[0]['file'])
+
+    for filename in candidates:
+        filepath = os.path.join(data_dir, filename)
+        if os.path.exists(filepath):
+            try:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"No se pudo leer el análisis previo {filepath}: {e}")
+    return {}
+
+
+def carry_over_sections(sections: Dict[str, Any], previous: Dict[str, Any],
+                        stage_sections: Dict[str, Tuple[str, ...]], stages: Set[str]) -> Dict[str, Any]:
+    """Completar las secciones de las etapas omitidas con sus valores previos"""
+    for stage, names in stage_sections.items():
+        if stage in stages:
+            continue
+        for name in names:
+            sections[name] = previous.get(name, [] if name in LIST_SECTIONS else {})
+    return sections
+
+
+def build_stage_parser(description: str, stage_sections: Dict[str, Tuple[str, ...]]) -> argparse.ArgumentParser:
+    """Parser común con ``--only`` y ``--skip`` para los analizadores"""
+    stage_names = ', '.join(stage_sections)
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--only', action='append', metavar='ETAPAS',
+                        help=f'Ejecutar solo estas etapas, separadas por comas ({stage_names})')
+    parser.add_argument('--skip', action='append', metavar='ETAPAS',
+                        help='Omitir estas etapas; conservan los valores del archivo diario existente')
+    parser.add_argument('--force', action='store_true',
+                        help='Ejecutar aunque el calendario indique que no puede haber barras nuevas')
+    return parser
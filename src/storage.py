@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Utilidades de almacenamiento compartidas por los analizadores
+Escrituras atómicas de JSON, manifiesto del histórico y timestamp de última actualización
+"""
+
+import json
+import os
+import re
+import hashlib
+import tempfile
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+LAST_UPDATE_FILENAME = "last_update.json"
+DAY_FILE_PATTERN = re.compile(r'^(\d{4})(\d{2})(\d{2})\.json$')
+
+# Secciones que cambian en cada ejecución aunque no lleguen barras nuevas
+NON_MARKET_SECTIONS = ('timestamp', 'news', 'snapshot_version', 'snapshot_epoch', 'market_hash', 'run_metrics')
+
+
+def write_json_atomic(filepath: str, data: Any, indent: Optional[int] = 2) -> int:
+    """Escribir JSON en un temporal del mismo directorio y renombrarlo sobre el destino
+
+    Devuelve el número de bytes escritos.
+    """
+    directory = os.path.dirname(filepath) or '.'
+    payload = json.dumps(data, indent=indent, ensure_ascii=False).encode('utf-8')
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, filepath)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(payload)
+
+
+def file_sha256(filepath: str) -> str:
+    """Hash SHA-256 del contenido de un archivo"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def market_content_hash(analysis: Dict[str, Any]) -> str:
+    """Hash canónico de las partes del análisis derivadas de datos de mercado
+
+    Excluye el timestamp de ejecución y las noticias, de modo que dos ejecuciones
+    sobre las mismas barras producen el mismo hash.
+    """
+    market_parts = {key: value for key, value in analysis.items() if key not in NON_MARKET_SECTIONS}
+    canonical = json.dumps(market_parts, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def news_content_hash(news: List[Dict[str, Any]]) -> str:
+    """Hash canónico de las noticias sin la hora de obtención de cada una
+
+    Dos descargas de los mismos titulares producen el mismo hash aunque se hagan a horas distintas.
+    """
+    items = [{key: value for key, value in item.items() if key != 'timestamp'} for item in news or []]
+    canonical = json.dumps(items, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def previous_market_hash(data_dir: str, filename: str) -> Optional[str]:
+    """Hash de mercado registrado en el manifiesto para un archivo diario, si existe"""
+    if not os.path.exists(os.path.join(data_dir, filename)):
+        return None
+    for entry in load_manifest(data_dir)['days']:
+        if entry.get('file') == filename:
+            return entry.get('market_hash')
+    return None
+
+
+def stored_market_hash(filepath: str) -> Optional[str]:
+    """Hash de mercado guardado dentro de un archivo que no figura en el manifiesto"""
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return json.load(f).get('market_hash')
+    except (OSError, ValueError):
+        return None
+
+
+def summarize_analysis(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Resumen mínimo de un análisis para el manifiesto (tendencia, confianza, último cierre)"""
+    trend_analysis = analysis.get('trend_analysis') or {}
+    indicators = analysis.get('technical_indicators') or {}
+    last_close = indicators.get('last_close')
+    if last_close is None:
+        last_close = (analysis.get('yesterday_data') or {}).get('close')
+    return {
+        'trend': trend_analysis.get('trend'),
+        'confidence': trend_analysis.get('confidence'),
+        'last_close': last_close
+    }
+
+
+def build_manifest_entry(filepath: str, analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Construir la entrada del manifiesto para un archivo diario"""
+    filename = os.path.basename(filepath)
+    match = DAY_FILE_PATTERN.match(filename)
+    if not match:
+        raise ValueError(f"Nombre de archivo diario no válido: {filename}")
+
+    if analysis is None:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            analysis = json.load(f)
+
+    return {
+        'date': '-'.join(match.groups()),
+        'file': filename,
+        'timestamp': analysis.get('timestamp'),
+        'size': os.path.getsize(filepath),
+        'sha256': file_sha256(filepath),
+        'market_hash': analysis.get('market_hash'),
+        'summary': summarize_analysis(analysis)
+    }
+
+
+def load_manifest(data_dir: str) -> Dict[str, Any]:
+    """Cargar el manifiesto existente o uno vacío si no existe o está corrupto"""
+    manifest_path = os.path.join(data_dir, MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if isinstance(manifest.get('days'), list):
+                return manifest
+        except (OSError, ValueError) as e:
+            logger.warning(f"Manifiesto ilegible, se regenerará: {e}")
+    return {'days': []}
+
+
+def update_history_manifest(data_dir: str, filepath: Optional[str] = None,
+                            analysis: Optional[Dict[str, Any]] = None,
+                            refresh: Iterable[str] = ()) -> Dict[str, Any]:
+    """Actualizar de forma atómica el manifiesto del histórico tras guardar un archivo diario
+
+    Recalcula la entrada del archivo recién guardado y las de ``refresh`` (nombres de archivos
+    reescritos, p. ej. por un backfill), añade los archivos diarios que aún no estaban
+    registrados y elimina las entradas cuyos archivos ya no existen.
+    """
+    manifest = load_manifest(data_dir)
+    entries = {entry['file']: entry for entry in manifest['days'] if entry.get('file')}
+
+    day_files = {name for name in os.listdir(data_dir) if DAY_FILE_PATTERN.match(name)}
+    saved_name = os.path.basename(filepath) if filepath else None
+    refresh = set(refresh)
+
+    for name in sorted(day_files):
+        if name == saved_name:
+            entries[name] = build_manifest_entry(filepath, analysis)
+        elif name not in entries or name in refresh:
+            try:
+                entries[name] = build_manifest_entry(os.path.join(data_dir, name))
+            except (OSError, ValueError) as e:
+                logger.warning(f"No se pudo registrar {name} en el manifiesto: {e}")
+
+    days = sorted((entry for name, entry in entries.items() if name in day_files),
+                  key=lambda entry: entry['date'], reverse=True)
+
+    manifest = {
+        'generated_at': datetime.now().isoformat(),
+        'count': len(days),
+        'latest': days[0]['date'] if days else None,
+        'days': days
+    }
+    write_json_atomic(os.path.join(data_dir, MANIFEST_FILENAME), manifest)
+    logger.info(f"Manifiesto actualizado: {len(days)} días disponibles")
+    return manifest
+
+
+def write_last_update(data_dir: str, status: str = 'success', message: Optional[str] = None,
+                      day: Optional[str] = None, snapshot_version: Optional[int] = None,
+                      snapshot_epoch: Optional[str] = None) -> None:
+    """Escribir el timestamp de última actualización que consulta el dashboard
+
+    Si se indica ``snapshot_version`` el cliente puede pedir solo los deltas que le faltan;
+    ``snapshot_epoch`` le dice en qué ruta están y si su copia pertenece a otro registro.
+    """
+    payload = {
+        'last_update': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+        'status': status
+    }
+    if message:
+        payload['message'] = message
+    if day and snapshot_version:
+        payload['day'] = day
+        payload['snapshot_version'] = snapshot_version
+        if snapshot_epoch:
+            payload['snapshot_epoch'] = snapshot_epoch
+    write_json_atomic(os.path.join(data_dir, LAST_UPDATE_FILENAME), payload, indent=None)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estimadores de volatilidad realizada
+Close-to-close, Parkinson, Garman-Klass, Rogers-Satchell y Yang-Zhang en ventanas móviles,
+calculados con sumas acumuladas sobre arrays (una columna por símbolo) para cualquier
+temporalidad, y volatilidad realizada de la sesión a partir de rendimientos de 1 minuto.
+Los resultados se expresan anualizados en %
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Dict, Iterable, Optional, Any
+
+from lazy_imports import lazy_import
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+from volume_curve import TIMEFRAME_MINUTES
+from volume_profile import session_dates
+
+logger = logging.getLogger(__name__)
+
+ESTIMATORS = ('close_to_close', 'parkinson', 'garman_klass', 'rogers_satchell', 'yang_zhang')
+# 40 barras caben en los 60 días naturales del informe mejorado
+DEFAULT_WINDOWS = (10, 20, 40)
+
+# Estimador y ventana de referencia para riesgo, stops y anchura de niveles
+REFERENCE_ESTIMATOR = 'yang_zhang'
+REFERENCE_WINDOW = 20
+
+# Stops: el mayor entre 1,5 ATR y 2 desviaciones por barra del estimador de referencia
+STOP_ATR_MULTIPLIER = 1.5
+STOP_SIGMAS = 2.0
+
+# Anchura de los niveles secundarios y terciarios en desviaciones diarias
+LEVEL_WIDTH_SIGMAS = (2.0, 4.0)
+
+TRADING_DAYS = 252
+# Globex negocia 23 horas por sesión
+SESSION_MINUTES = 23 * 60
+
+
+def periods_per_year(timeframe: str = '1d') -> float:
+    """Barras por año de la temporalidad (para anualizar)"""
+    if timeframe in TIMEFRAME_MINUTES:
+        return TRADING_DAYS * SESSION_MINUTES / TIMEFRAME_MINUTES[timeframe]
+    return TRADING_DAYS
+
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Suma móvil a lo largo del eje 0 ignorando NaN; NaN si la ventana no tiene ``window`` valores"""
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    zeros = np.zeros((1,) + values.shape[1:])
+    sums = np.concatenate((zeros, np.cumsum(filled, axis=0)))
+    counts = np.concatenate((zeros, np.cumsum(valid, axis=0)))
+    total = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        window_counts = counts[window:] - counts[:-window]
+        total[window - 1:] = np.where(window_counts == window, sums[window:] - sums[:-window], np.nan)
+    return total
+
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling_sum(values, window) / window
+
+
+def _rolling_var(values: np.ndarray, window: int) -> np.ndarray:
+    """Varianza muestral móvil (n - 1) a partir de las sumas de x y x²"""
+    mean = _rolling_mean(values, window)
+    return np.maximum(_rolling_sum(values * values, window) - window * mean * mean, 0.0) / (window - 1)
+
+
+def log_terms(open_: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> Dict[str, np.ndarray]:
+    """Logaritmos de precios por barra que usan los estimadores"""
+    previous_close = np.concatenate((np.full((1,) + close.shape[1:], np.nan), close[:-1]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        high_open = np.log(high / open_)
+        low_open = np.log(low / open_)
+        close_open = np.log(close / open_)
+        return {
+            'close': np.log(close / previous_close),
+            'overnight': np.log(open_ / previous_close),
+            'open_close': close_open,
+            'high_low': np.log(high / low),
+            'rogers_satchell': high_open * (high_open - close_open) + low_open * (low_open - close_open),
+        }
+
+
+def rolling_variances(open_: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                      window: int) -> Dict[str, np.ndarray]:
+    """Varianza por barra de cada estimador en ventanas de ``window`` barras (sin anualizar)
+
+    Acepta arrays de una dimensión (un símbolo) o de dos (barras × símbolos).
+    """
+    terms = log_terms(open_, high, low, close)
+    high_low = terms['high_low']
+    open_close = terms['open_close']
+    rogers_satchell = _rolling_mean(terms['rogers_satchell'], window)
+    # Peso de Yang-Zhang que minimiza la varianza del estimador
+    k = 0.34 / (1.34 + (window + 1) / (window - 1))
+    return {
+        'close_to_close': _rolling_var(terms['close'], window),
+        'parkinson': _rolling_mean(high_low * high_low, window) / (4 * np.log(2)),
+        'garman_klass': np.maximum(_rolling_mean(0.5 * high_low * high_low
+                                                 - (2 * np.log(2) - 1) * open_close * open_close, window), 0.0),
+        'rogers_satchell': np.maximum(rogers_satchell, 0.0),
+        'yang_zhang': (_rolling_var(terms['overnight'], window) + k * _rolling_var(open_close, window)
+                       + (1 - k) * np.maximum(rogers_satchell, 0.0)),
+    }
+
+
+def _ohlc(data: pd.DataFrame):
+    return tuple(data[column].to_numpy(dtype=float) for column in ('Open', 'High', 'Low', 'Close'))
+
+
+def rolling_volatility(data: pd.DataFrame, window: int = REFERENCE_WINDOW, timeframe: str = '1d') -> pd.DataFrame:
+    """Volatilidad anualizada (%) de cada estimador en cada barra"""
+    variances = rolling_variances(*_ohlc(data), window)
+    scale = periods_per_year(timeframe)
+    return pd.DataFrame({name: np.sqrt(variance * scale) * 100 for name, variance in variances.items()},
+                        index=data.index)
+
+
+def _rounded(value: float) -> Optional[float]:
+    return round(float(value), 2) if np.isfinite(value) else None
+
+
+def volatility_summary(data: pd.DataFrame, timeframe: str = '1d',
+                       windows: Iterable[int] = DEFAULT_WINDOWS) -> Dict[str, Any]:
+    """Último valor de cada estimador en cada ventana, anualizado en %
+
+    ``bar_sigma`` es la desviación por barra (fracción del precio, sin anualizar) del estimador
+    de referencia: lo que se espera que se mueva el precio en una barra, para stops y niveles.
+    Si no hay barras para ``REFERENCE_WINDOW`` (festivos, una ventana recortada) se toma la mayor
+    ventana que quepa; ``reference_window`` indica cuál se usó.
+    """
+    if data is None or len(data) < 3:
+        return {}
+    ohlc = _ohlc(data)
+    scale = periods_per_year(timeframe)
+    estimators = {name: {} for name in ESTIMATORS}
+    sigmas = {}
+    for window in windows:
+        if len(data) <= window:
+            continue
+        variances = rolling_variances(*ohlc, window)
+        for name, variance in variances.items():
+            estimators[name][str(window)] = _rounded(np.sqrt(variance[-1] * scale) * 100)
+        if np.isfinite(variances[REFERENCE_ESTIMATOR][-1]):
+            sigmas[window] = float(np.sqrt(variances[REFERENCE_ESTIMATOR][-1]))
+
+    reference_window = REFERENCE_WINDOW if REFERENCE_WINDOW in sigmas else max(sigmas, default=None)
+    return {
+        'timeframe': timeframe,
+        'estimators': estimators,
+        'reference': estimators[REFERENCE_ESTIMATOR].get(str(reference_window)),
+        'reference_window': reference_window,
+        'bar_sigma': sigmas.get(reference_window)
+    }
+
+
+def stop_distance(atr: Optional[float], bar_sigma: Optional[float], price: float,
+                  atr_multiplier: float = STOP_ATR_MULTIPLIER, sigmas: float = STOP_SIGMAS) -> Optional[float]:
+    """Distancia del stop: la mayor entre el múltiplo del ATR y ``sigmas`` desviaciones por barra
+
+    El ATR reacciona tarde a un cambio de régimen; la desviación de Yang-Zhang incluye los
+    huecos de apertura y evita stops demasiado ceñidos tras una expansión de volatilidad.
+    """
+    candidates = []
+    if atr is not None and np.isfinite(atr):
+        candidates.append(float(atr) * atr_multiplier)
+    if bar_sigma:
+        candidates.append(float(bar_sigma) * float(price) * sigmas)
+    return max(candidates) if candidates else None
+
+
+def level_widths(bar_sigma: Optional[float], sigmas: Iterable[float] = LEVEL_WIDTH_SIGMAS) -> Optional[tuple]:
+    """Anchuras (fracción del precio) de los niveles a ``sigmas`` desviaciones diarias"""
+    if not bar_sigma:
+        return None
+    return tuple(float(bar_sigma) * sigma for sigma in sigmas)
+
+
+def realized_volatility(minute_bars: pd.DataFrame) -> Dict[str, Any]:
+    """Volatilidad realizada anualizada (%) de cada sesión con rendimientos de 1 minuto
+
+    Es la raíz de la suma de rendimientos logarítmicos al cuadrado de la sesión, sin el salto
+    entre sesiones (que recoge el estimador de Yang-Zhang diario).
+    """
+    if minute_bars is None or len(minute_bars) < 2:
+        return {}
+    close = minute_bars['Close'].to_numpy(dtype=float)
+    sessions = np.asarray(session_dates(minute_bars.index))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.log(close[1:] / close[:-1])
+    same_session = sessions[1:] == sessions[:-1]
+    returns = np.where(same_session & np.isfinite(returns), returns, 0.0)
+    codes, unique_sessions = pd.factorize(sessions[1:], sort=True)
+    variance = np.bincount(codes, weights=returns * returns, minlength=len(unique_sessions))
+    realized = np.sqrt(variance * TRADING_DAYS) * 100
+    return {
+        'session': str(unique_sessions[-1].date()),
+        'bars': int(np.sum(codes == codes[-1]) + 1),
+        'realized': _rounded(realized[-1]),
+        'by_session': {str(session.date()): _rounded(value) for session, value in zip(unique_sessions, realized)}
+    }
+
+
+def universe_volatility(frames: Dict[str, pd.DataFrame], window: int = REFERENCE_WINDOW,
+                        timeframe: str = '1d') -> pd.DataFrame:
+    """Último valor de cada estimador para cada símbolo (filas) en una sola pasada vectorizada
+
+    Las barras se alinean por fecha en matrices barras × símbolos; los huecos quedan en NaN y
+    solo invalidan las ventanas que los contienen.
+    """
+    frames = {symbol: frame for symbol, frame in frames.items() if frame is not None and not frame.empty}
+    if not frames:
+        return pd.DataFrame(columns=list(ESTIMATORS))
+    # Solo hace falta la última ventana (más la barra anterior, para el hueco de apertura).
+    # Se trabaja con arrays: la selección de columnas de pandas por símbolo domina el coste
+    tails = {}
+    column_positions = {}
+    for symbol, frame in frames.items():
+        columns = tuple(frame.columns)
+        if columns not in column_positions:
+            column_positions[columns] = frame.columns.get_indexer(['Open', 'High', 'Low', 'Close'])
+        tail = frame.iloc[-(window + 1):]
+        tails[symbol] = (tail.index, tail.to_numpy(dtype=float)[:, column_positions[columns]])
+    index = next(iter(tails.values()))[0]
+    for frame_index, _ in tails.values():
+        if not frame_index.equals(index):
+            index = index.union(frame_index)
+    index = index[-(window + 1):]
+    symbols = list(tails)
+    ohlc = np.full((4, len(index), len(symbols)), np.nan)
+    for column, (frame_index, values) in enumerate(tails.values()):
+        if frame_index.equals(index):
+            ohlc[:, :, column] = values.T
+            continue
+        positions = index.get_indexer(frame_index)
+        present = positions >= 0
+        ohlc[:, positions[present], column] = values[present].T
+    variances = rolling_variances(*ohlc, window)
+    scale = periods_per_year(timeframe)
+    return pd.DataFrame({name: np.sqrt(variance[-1] * scale) * 100 for name, variance in variances.items()},
+                        index=symbols)
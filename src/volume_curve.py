@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Curva de volumen por minuto de la sesión
+Tabla del volumen medio de cada minuto de la sesión de Globex en las últimas sesiones, construida
+con un groupby vectorizado sobre las barras de 1m guardadas y actualizada de forma incremental.
+Sirve para el volumen relativo a la misma hora del día (RVOL): el volumen intradía tiene forma
+de U y una media de las últimas 20 barras exagera la apertura y el cierre
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import logging
+from typing import Dict, Optional, Any
+
+from lazy_imports import lazy_import
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+from market_calendar import MARKET_TZ
+from storage import write_json_atomic, DAY_FILE_PATTERN
+from volume_profile import session_dates, SESSION_SHIFT_HOURS
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_SESSION = 24 * 60
+
+# Sesiones que promedia la tabla y mínimo de sesiones con barra en un minuto para usarlo
+LOOKBACK_SESSIONS = 20
+MIN_SESSIONS = 3
+
+# RVOL a partir del cual una barra cuenta como pico de volumen
+SPIKE_RVOL = 2.0
+
+# Minutos de cada temporalidad intradía
+TIMEFRAME_MINUTES = {'1m': 1, '2m': 2, '5m': 5, '15m': 15, '30m': 30, '60m': 60, '90m': 90,
+                     '1h': 60, '4h': 240}
+
+CURVE_FORMAT = 1
+
+
+def session_minutes(index: pd.DatetimeIndex) -> np.ndarray:
+    """Minuto de la sesión de Globex (0 = 18:00 ET) de cada barra"""
+    if index.tz is None:
+        index = index.tz_localize(MARKET_TZ)
+    shifted = index.tz_convert(MARKET_TZ) + pd.Timedelta(hours=SESSION_SHIFT_HOURS)
+    return np.asarray(shifted.hour * 60 + shifted.minute, dtype=np.int64)
+
+
+class VolumeCurve:
+    """Volumen por minuto de cada sesión y tabla de medias para consultas O(1) por barra
+
+    ``sessions`` guarda una fila de ``MINUTES_PER_SESSION`` volúmenes por sesión (NaN donde no
+    hubo barra). La media de un minuto solo usa las sesiones anteriores a la de la barra
+    consultada, para que el volumen de la propia sesión no rebaje su RVOL.
+    """
+
+    def __init__(self, lookback: int = LOOKBACK_SESSIONS):
+        self.lookback = lookback
+        self.sessions = {}
+        self._tables = {}
+
+    def add_bars(self, data: pd.DataFrame) -> int:
+        """Sumar las barras de 1m a las filas de sus sesiones; devuelve cuántas sesiones cambian
+
+        Los minutos que llegan sustituyen a los guardados (la última barra pudo estar aún
+        formándose); los que no llegan se conservan, así que se pueden añadir trozos de sesión.
+        """
+        if data is None or data.empty:
+            return 0
+        frame = pd.DataFrame({
+            'session': session_dates(data.index),
+            'minute': session_minutes(data.index),
+            'volume': data['Volume'].to_numpy(dtype=float)
+        })
+        grid = frame.groupby(['session', 'minute'])['volume'].sum().unstack('minute')
+        grid = grid.reindex(columns=range(MINUTES_PER_SESSION))
+
+        for session, values in zip(grid.index, grid.to_numpy()):
+            row = self.sessions.get(session)
+            if row is None:
+                row = np.full(MINUTES_PER_SESSION, np.nan)
+            arrived = ~np.isnan(values)
+            row[arrived] = values[arrived]
+            self.sessions[session] = row
+        # Se conserva una sesión más que la ventana: la de la barra consultada no cuenta
+        for session in sorted(self.sessions)[:-(self.lookback + 1)]:
+            del self.sessions[session]
+        self._tables = {}
+        return len(grid)
+
+    def table(self, before) -> Optional[tuple]:
+        """Sumas prefijas de la curva media de las sesiones anteriores a ``before``
+
+        Devuelve (volumen acumulado, minutos con media acumulados) sobre dos sesiones seguidas,
+        para que una barra que cruza las 18:00 se resuelva con una resta igual que el resto.
+        None si no hay sesiones suficientes. Las sesiones posteriores a todas las guardadas
+        comparten tabla.
+        """
+        stored = sorted(self.sessions)
+        previous = stored[:bisect.bisect_left(stored, before)][-self.lookback:]
+        key = (previous[0], previous[-1]) if previous else None
+        if key not in self._tables:
+            if len(previous) < MIN_SESSIONS:
+                self._tables[key] = None
+            else:
+                rows = np.vstack([self.sessions[session] for session in previous])
+                counts = np.sum(~np.isnan(rows), axis=0)
+                average = np.where(counts >= MIN_SESSIONS,
+                                   np.nansum(rows, axis=0) / np.maximum(counts, 1), np.nan)
+                # Minutos sin datos suficientes (p. ej. la pausa de 17:00 a 18:00) no suman
+                self._tables[key] = (np.concatenate(([0.0], np.cumsum(np.nan_to_num(np.tile(average, 2))))),
+                                     np.concatenate(([0], np.cumsum(np.tile(~np.isnan(average), 2)))))
+        return self._tables[key]
+
+    def expected_volume(self, index: pd.DatetimeIndex, minutes: int = 1) -> np.ndarray:
+        """Volumen medio esperado de cada barra de ``minutes`` minutos a su hora de la sesión"""
+        expected = np.full(len(index), np.nan)
+        if len(index) == 0 or not self.sessions:
+            return expected
+        codes, sessions = pd.factorize(session_dates(index), sort=True)
+        starts = session_minutes(index)
+        ends = starts + minutes
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(sessions) + 1))
+        for code, session in enumerate(sessions):
+            table = self.table(session)
+            if table is None:
+                continue
+            cumulative, covered = table
+            mask = order[bounds[code]:bounds[code + 1]]
+            total = cumulative[ends[mask]] - cumulative[starts[mask]]
+            known = covered[ends[mask]] - covered[starts[mask]]
+            expected[mask] = np.where(known > 0, total, np.nan)
+        return expected
+
+    def relative_volume(self, data: pd.DataFrame, minutes: int = 1) -> pd.Series:
+        """Volumen de cada barra dividido por el esperado a esa hora (NaN si no hay referencia)"""
+        expected = self.expected_volume(data.index, minutes)
+        volume = data['Volume'].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rvol = np.where(expected > 0, volume / expected, np.nan)
+        return pd.Series(rvol, index=data.index)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Formato JSON: una lista de volúmenes por sesión (null donde no hubo barra)"""
+        return {
+            'format': CURVE_FORMAT,
+            'lookback': self.lookback,
+            'sessions': {str(session.date()): [None if np.isnan(value) else float(value) for value in row]
+                         for session, row in sorted(self.sessions.items())}
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> 'VolumeCurve':
+        """Curva a partir de ``to_dict``"""
+        curve = cls(payload.get('lookback', LOOKBACK_SESSIONS))
+        for day, values in payload.get('sessions', {}).items():
+            curve.sessions[pd.Timestamp(day).tz_localize(MARKET_TZ)] = np.array(
+                [np.nan if value is None else value for value in values], dtype=float)
+        return curve
+
+    def save(self, filepath: str):
+        """Guardar la curva de forma atómica"""
+        os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+        write_json_atomic(filepath, self.to_dict(), indent=None)
+
+    @classmethod
+    def load(cls, filepath: str) -> Optional['VolumeCurve']:
+        """Curva guardada en ``filepath`` o None si no existe o no se puede leer"""
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudo leer la curva de volumen {filepath}: {e}")
+            return None
+        if payload.get('format') != CURVE_FORMAT:
+            return None
+        return cls.from_dict(payload)
+
+
+def volume_curve_path(data_dir: str, symbol: str) -> str:
+    """Archivo de la curva de volumen de ``symbol`` dentro del directorio de datos"""
+    safe_symbol = ''.join(char if char.isalnum() else '_' for char in symbol)
+    return os.path.join(data_dir, 'cache', 'volume_curve', f"{safe_symbol}.json")
+
+
+def stored_minute_bars(data_dir: str, days: int = LOOKBACK_SESSIONS + 1, timeframe: str = '1m') -> pd.DataFrame:
+    """Barras de ``chart_data[timeframe]`` de los últimos ``days`` informes diarios guardados"""
+    try:
+        filenames = sorted(name for name in os.listdir(data_dir) if DAY_FILE_PATTERN.match(name))[-days:]
+    except FileNotFoundError:
+        return pd.DataFrame()
+    rows = []
+    for filename in filenames:
+        try:
+            with open(os.path.join(data_dir, filename), 'r', encoding='utf-8') as f:
+                rows.extend((json.load(f).get('chart_data') or {}).get(timeframe) or [])
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudieron leer las barras de {filename}: {e}")
+    if not rows:
+        return pd.DataFrame()
+    frame = pd.DataFrame(rows)
+    index = pd.DatetimeIndex(pd.to_datetime(frame['timestamp'])).tz_localize(
+        MARKET_TZ, ambiguous='NaT', nonexistent='NaT')
+    frame = frame.set_axis(index).rename(columns={'volume': 'Volume'})
+    frame = frame[frame.index.notna()]
+    return frame[~frame.index.duplicated(keep='last')].sort_index()
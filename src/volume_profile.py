@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Perfil de volumen a partir de barras intradía
+Reparte el volumen de cada barra entre los ticks de su rango con acumulación vectorizada
+(bincount sobre un array de diferencias) y obtiene el punto de control (POC), el área de valor
+(VAH/VAL) y los nodos de volumen alto y bajo por sesión y en ventanas de varias sesiones. Los
+perfiles se actualizan de forma incremental con las barras nuevas
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Dict, Iterable, List, Optional, Any
+
+from lazy_imports import lazy_import
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+from market_calendar import MARKET_TZ
+
+logger = logging.getLogger(__name__)
+
+# Tick del futuro NQ
+DEFAULT_TICK_SIZE = 0.25
+
+# Fracción del volumen que forma el área de valor
+VALUE_AREA_PCT = 0.70
+
+# Suavizado para detectar nodos (20 ticks = 5 puntos) y nodos a devolver de cada tipo
+NODE_SMOOTHING_TICKS = 20
+MAX_NODES = 3
+
+# Sesiones de las ventanas móviles
+ROLLING_SESSIONS = (3, 5)
+
+# La sesión de Globex empieza a las 18:00 ET del día anterior: desplazando 6 horas, la fecha
+# resultante es la de la sesión a la que pertenece cada barra
+SESSION_SHIFT_HOURS = 6
+
+
+class VolumeProfile:
+    """Volumen acumulado por tick de precio
+
+    ``volume[i]`` es el volumen en el precio ``(origin + i) * tick_size``. El rango crece según
+    llegan barras fuera de él.
+    """
+
+    def __init__(self, tick_size: float = DEFAULT_TICK_SIZE):
+        self.tick_size = tick_size
+        self.origin = 0
+        self.volume = np.zeros(0)
+        self.bars = 0
+        self.last_bar = None
+        self._last_contribution = None
+
+    def _ensure_range(self, low_tick: int, high_tick: int):
+        """Ampliar el array para cubrir [low_tick, high_tick]"""
+        if not len(self.volume):
+            self.origin = low_tick
+            self.volume = np.zeros(high_tick - low_tick + 1)
+            return
+        pad_low = max(0, self.origin - low_tick)
+        pad_high = max(0, high_tick - (self.origin + len(self.volume) - 1))
+        if pad_low or pad_high:
+            self.volume = np.concatenate((np.zeros(pad_low), self.volume, np.zeros(pad_high)))
+            self.origin -= pad_low
+
+    def _accumulate(self, low_ticks: np.ndarray, high_ticks: np.ndarray, per_tick: np.ndarray):
+        """Sumar ``per_tick`` en cada tick de [low, high] de cada barra
+
+        En lugar de recorrer cada rango se suma en el tick inicial y se resta tras el final de un
+        array de diferencias, cuya suma acumulada da el perfil: O(barras + niveles de precio).
+        """
+        self._ensure_range(int(low_ticks.min()), int(high_ticks.max()))
+        size = len(self.volume) + 1
+        differences = (np.bincount(low_ticks - self.origin, weights=per_tick, minlength=size)
+                       - np.bincount(high_ticks - self.origin + 1, weights=per_tick, minlength=size))
+        self.volume += np.cumsum(differences)[:-1]
+
+    def add_bars(self, data: pd.DataFrame) -> int:
+        """Añadir las barras nuevas desde la última añadida; devuelve cuántas se han añadido
+
+        Cada barra reparte su volumen a partes iguales entre los ticks de su rango. La última
+        barra añadida pudo estar aún formándose: si vuelve a llegar, se sustituye su aportación.
+        """
+        if data is None or data.empty:
+            return 0
+        if self.last_bar is not None:
+            data = data[data.index >= self.last_bar]
+            if data.empty:
+                return 0
+            if data.index[0] == self.last_bar and self._last_contribution is not None:
+                low_tick, high_tick, per_tick = self._last_contribution
+                self._accumulate(low_tick, high_tick, -per_tick)
+                self.bars -= 1
+            self._last_contribution = None
+
+        volume = data['Volume'].to_numpy(dtype=float)
+        valid = volume > 0
+        self.last_bar = data.index[-1]
+        if not valid.any():
+            return 0
+
+        low_ticks = np.floor(data['Low'].to_numpy(dtype=float)[valid] / self.tick_size).astype(np.int64)
+        high_ticks = np.floor(data['High'].to_numpy(dtype=float)[valid] / self.tick_size).astype(np.int64)
+        high_ticks = np.maximum(high_ticks, low_ticks)
+        per_tick = volume[valid] / (high_ticks - low_ticks + 1)
+        self._accumulate(low_ticks, high_ticks, per_tick)
+
+        if valid[-1]:
+            self._last_contribution = (low_ticks[-1:], high_ticks[-1:], per_tick[-1:])
+        self.bars += int(valid.sum())
+        return int(valid.sum())
+
+    def price_of(self, position: int) -> float:
+        """Precio del tick en la posición ``position`` del array"""
+        return round(float((self.origin + position) * self.tick_size), 2)
+
+    def value_area(self, pct: float = VALUE_AREA_PCT) -> tuple:
+        """(POC, VAL, VAH) como posiciones: se amplía desde el POC hacia el lado con más volumen"""
+        volume = self.volume
+        poc = int(np.argmax(volume))
+        target = volume.sum() * pct
+        low = high = poc
+        accumulated = volume[poc]
+        while accumulated < target and (low > 0 or high < len(volume) - 1):
+            above = volume[high + 1] if high < len(volume) - 1 else -1.0
+            below = volume[low - 1] if low > 0 else -1.0
+            if above >= below:
+                high += 1
+                accumulated += above
+            else:
+                low -= 1
+                accumulated += below
+        return poc, low, high
+
+    def nodes(self, max_nodes: int = MAX_NODES, smoothing: int = NODE_SMOOTHING_TICKS) -> Dict[str, List[float]]:
+        """Nodos de volumen alto (máximos locales) y bajo (mínimos locales) del perfil suavizado"""
+        if len(self.volume) < 3:
+            return {'hvn': [], 'lvn': []}
+        window = max(1, min(smoothing, len(self.volume)))
+        smooth = np.convolve(self.volume, np.ones(window) / window, mode='same')
+        inner = smooth[1:-1]
+        peaks = np.flatnonzero((inner > smooth[:-2]) & (inner >= smooth[2:])) + 1
+        troughs = np.flatnonzero((inner < smooth[:-2]) & (inner <= smooth[2:])) + 1
+        # Los valles en los extremos del perfil solo indican dónde se acaba el rango
+        _, low, high = self.value_area()
+        troughs = troughs[(troughs >= low) & (troughs <= high)]
+
+        hvn = peaks[np.argsort(smooth[peaks])[::-1][:max_nodes]]
+        lvn = troughs[np.argsort(smooth[troughs])[:max_nodes]]
+        return {'hvn': [self.price_of(position) for position in hvn],
+                'lvn': [self.price_of(position) for position in lvn]}
+
+    def summary(self) -> Dict[str, Any]:
+        """POC, área de valor y nodos del perfil"""
+        if not len(self.volume) or self.volume.sum() <= 0:
+            return {}
+        poc, low, high = self.value_area()
+        return {
+            'poc': self.price_of(poc),
+            'vah': self.price_of(high),
+            'val': self.price_of(low),
+            **self.nodes(),
+            'bars': self.bars,
+            'total_volume': float(self.volume.sum()),
+            'last_bar': str(self.last_bar)
+        }
+
+    @classmethod
+    def merge(cls, profiles: Iterable['VolumeProfile']) -> 'VolumeProfile':
+        """Perfil con la suma de varios perfiles del mismo tamaño de tick"""
+        profiles = [profile for profile in profiles if len(profile.volume)]
+        merged = cls(profiles[0].tick_size if profiles else DEFAULT_TICK_SIZE)
+        if not profiles:
+            return merged
+        merged._ensure_range(min(profile.origin for profile in profiles),
+                             max(profile.origin + len(profile.volume) - 1 for profile in profiles))
+        for profile in profiles:
+            start = profile.origin - merged.origin
+            merged.volume[start:start + len(profile.volume)] += profile.volume
+            merged.bars += profile.bars
+        merged.last_bar = max(profile.last_bar for profile in profiles)
+        return merged
+
+
+def session_dates(index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    """Fecha de la sesión de Globex de cada barra"""
+    if index.tz is None:
+        index = index.tz_localize(MARKET_TZ)
+    return (index.tz_convert(MARKET_TZ) + pd.Timedelta(hours=SESSION_SHIFT_HOURS)).normalize()
+
+
+class ProfileBook:
+    """Un perfil por sesión, alimentado de forma incremental con barras de una temporalidad"""
+
+    def __init__(self, tick_size: float = DEFAULT_TICK_SIZE, max_sessions: int = max(ROLLING_SESSIONS)):
+        self.tick_size = tick_size
+        self.max_sessions = max_sessions
+        self.sessions = {}
+
+    def add_bars(self, data: pd.DataFrame) -> int:
+        """Repartir las barras nuevas entre los perfiles de sus sesiones"""
+        if data is None or data.empty:
+            return 0
+        added = 0
+        dates = session_dates(data.index)
+        for session in dates.unique():
+            profile = self.sessions.setdefault(session, VolumeProfile(self.tick_size))
+            added += profile.add_bars(data[dates == session])
+        for session in sorted(self.sessions)[:-self.max_sessions]:
+            del self.sessions[session]
+        return added
+
+    def session(self) -> Dict[str, Any]:
+        """Perfil de la última sesión"""
+        if not self.sessions:
+            return {}
+        latest = max(self.sessions)
+        return {'session': str(latest.date()), **self.sessions[latest].summary()}
+
+    def rolling(self, count: int) -> Dict[str, Any]:
+        """Perfil combinado de las últimas ``count`` sesiones"""
+        sessions = sorted(self.sessions)[-count:]
+        if not sessions:
+            return {}
+        merged = VolumeProfile.merge(self.sessions[session] for session in sessions)
+        return {'sessions': [str(session.date()) for session in sessions], **merged.summary()}
+
+
+def profile_levels(volume_profile: Optional[Dict[str, Any]], price: Optional[float] = None) -> List[float]:
+    """Precios de POC, VAH, VAL y nodos de volumen alto de todos los perfiles de la sección
+
+    Con ``price`` los niveles se trasladan por la diferencia entre ``price`` y el último precio
+    del símbolo del perfil (``reference_price``): el perfil se construye con el futuro y los
+    niveles diarios son del índice, que cotiza con una base distinta.
+    """
+    volume_profile = volume_profile or {}
+    offset = 0.0
+    if price and volume_profile.get('reference_price'):
+        offset = price - volume_profile['reference_price']
+    levels = set()
+    for profile in volume_profile.values():
+        if not isinstance(profile, dict):
+            continue
+        prices = [profile.get(key) for key in ('poc', 'vah', 'val')] + list(profile.get('hvn', []))
+        levels.update(round(float(level) + offset, 2) for level in prices if level)
+    return sorted(levels)